@@ -0,0 +1,558 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from storage import month_of, sqlite_datetime_text, sqlite_round as _round
+from timeseries import MAX_POINTS, TimeRollups
+
+# Пороги из SQL-запросов отчета
+LARGE_AMOUNT = 30000
+TOP_AMOUNT = 40000
+LARGE_MIN_COUNT = 2
+
+TOP_COLUMNS = ['transaction_id', 'user_id', 'amount', 'category', 'merchant', 'transaction_date']
+
+
+def _add(total, part):
+    """Сложение частичных агрегатов с выравниванием по ключам"""
+    if total is None:
+        return part
+    return total.add(part, fill_value=0)
+
+
+def _count_sum(frame, keys):
+    """COUNT(*) и SUM(amount) по ключам"""
+    grouped = frame.groupby(keys, observed=True, sort=False)['amount'].agg(['count', 'sum'])
+    if isinstance(grouped.index, pd.MultiIndex):
+        grouped.index = pd.MultiIndex.from_arrays(
+            [grouped.index.get_level_values(i).astype(object) for i in range(grouped.index.nlevels)],
+            names=grouped.index.names)
+    else:
+        grouped.index = grouped.index.astype(object)
+    return grouped
+
+
+class TransactionAggregates:
+    """Сливаемые частичные агрегаты всех разделов отчета BankTransactionAnalyzer.
+
+    update() добавляет чанк транзакций, merge() объединяет агрегаты,
+    посчитанные по разным частям данных; report() собирает те же таблицы,
+    что и SQL-запросы анализатора.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self.min = None
+        self.user_categories = None
+        self.debit_categories = None
+        self.large_users = None
+        self.top_large = None
+        self.months = None
+        self.aml_users = None
+
+    def update(self, chunk):
+        """Учет чанка транзакций"""
+        if len(chunk) == 0:
+            return self
+        amount = chunk['amount']
+
+        self.count += len(chunk)
+        self.total += float(amount.sum())
+        chunk_max, chunk_min = float(amount.max()), float(amount.min())
+        self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+        self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+
+        self.user_categories = _add(self.user_categories, _count_sum(chunk, ['user_id', 'category']))
+        self.debit_categories = _add(self.debit_categories,
+                                     _count_sum(chunk[chunk['transaction_type'] == 'debit'], 'category'))
+        self.large_users = _add(self.large_users, _count_sum(chunk[amount > LARGE_AMOUNT], 'user_id'))
+        self.months = _add(self.months,
+                           _count_sum(chunk.assign(month=month_of(chunk['transaction_date'])), 'month'))
+
+        suspicious = chunk['is_suspicious'].astype(bool) | (amount > TOP_AMOUNT)
+        self.aml_users = _add(self.aml_users, _count_sum(chunk[suspicious], 'user_id'))
+
+        top = chunk.loc[amount > TOP_AMOUNT, TOP_COLUMNS].nlargest(5, 'amount')
+        if pd.api.types.is_datetime64_any_dtype(top['transaction_date']):
+            # Дата в том же текстовом виде, в каком ее хранит SQLite
+            top = top.assign(transaction_date=sqlite_datetime_text(top['transaction_date']))
+        self._merge_top(top)
+        return self
+
+    def merge(self, other):
+        """Объединение с агрегатами другой части данных"""
+        if other.count == 0:
+            return self
+        self.count += other.count
+        self.total += other.total
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        for name in ('user_categories', 'debit_categories', 'large_users', 'months', 'aml_users'):
+            setattr(self, name, _add(getattr(self, name), getattr(other, name)))
+        self._merge_top(other.top_large)
+        return self
+
+    def _merge_top(self, top):
+        if top is None or len(top) == 0:
+            return
+        if self.top_large is None or len(self.top_large) == 0:
+            self.top_large = top.reset_index(drop=True)
+            return
+        combined = pd.concat([self.top_large, top], ignore_index=True)
+        self.top_large = combined.nlargest(5, 'amount').reset_index(drop=True)
+
+    def report(self):
+        """Таблицы разделов отчета в формате SQL-запросов анализатора"""
+        return {
+            'basic_statistics': {'summary': self._basic_statistics()},
+            'category_analysis': {'categories': self._category_analysis()},
+            'suspicious_activity_detection': self._suspicious_activity_detection(),
+            'user_behavior_analysis': {'top_users': self._user_behavior_analysis()},
+            'monthly_trends': {'months': self._monthly_trends()},
+            'aml_compliance_check': {'summary': self._aml_compliance_check()},
+        }
+
+    def _basic_statistics(self):
+        users = self.user_categories.index.get_level_values(0).nunique() if self.count else 0
+        avg = self.total / self.count if self.count else np.nan
+        return pd.DataFrame({
+            'total_transactions': [self.count],
+            'unique_users': [users],
+            'total_volume': [_round(self.total) if self.count else np.nan],
+            'avg_transaction': [_round(avg)],
+            'max_transaction': [_round(self.max) if self.count else np.nan],
+            'min_transaction': [_round(self.min) if self.count else np.nan],
+        })
+
+    def _category_analysis(self):
+        columns = ['category', 'count', 'total_amount', 'avg_amount', 'percentage']
+        categories = self.debit_categories
+        if categories is None or len(categories) == 0:
+            return pd.DataFrame(columns=columns)
+        result = pd.DataFrame({
+            'category': categories.index,
+            'count': categories['count'].astype('int64').values,
+            'total_amount': _round(categories['sum']).values,
+            'avg_amount': _round(categories['sum'] / categories['count']).values,
+            'percentage': _round(categories['sum'] * 100.0 / categories['sum'].sum()).values,
+        })
+        return result.sort_values('total_amount', ascending=False, kind='stable').reset_index(drop=True)
+
+    def _suspicious_activity_detection(self):
+        large = self.large_users
+        if large is None:
+            large = pd.DataFrame(columns=['count', 'sum'])
+        large = large[large['count'] > LARGE_MIN_COUNT]
+        result_large = pd.DataFrame({
+            'user_id': large.index.astype('int64'),
+            'large_transactions': large['count'].astype('int64').values,
+            'total_large_amount': _round(large['sum']).values,
+        }).sort_values('total_large_amount', ascending=False, kind='stable').reset_index(drop=True)
+
+        top = self.top_large if self.top_large is not None else pd.DataFrame(columns=TOP_COLUMNS)
+        return {'large_users': result_large, 'top_transactions': top[TOP_COLUMNS].reset_index(drop=True)}
+
+    def _user_behavior_analysis(self):
+        columns = ['user_id', 'transaction_count', 'total_volume', 'avg_transaction', 'unique_categories']
+        if self.user_categories is None:
+            return pd.DataFrame(columns=columns)
+        by_user = self.user_categories.groupby(level=0)
+        users = by_user.sum()
+        users['unique_categories'] = by_user.size()
+        users['total_volume'] = _round(users['sum'])
+        top = users.sort_values('total_volume', ascending=False, kind='stable').head(10)
+        return pd.DataFrame({
+            'user_id': top.index.astype('int64'),
+            'transaction_count': top['count'].astype('int64').values,
+            'total_volume': top['total_volume'].values,
+            'avg_transaction': _round(top['sum'] / top['count']).values,
+            'unique_categories': top['unique_categories'].astype('int64').values,
+        })
+
+    def _monthly_trends(self):
+        columns = ['month', 'transaction_count', 'monthly_volume', 'avg_monthly_transaction']
+        if self.months is None:
+            return pd.DataFrame(columns=columns)
+        months = self.months.sort_index()
+        return pd.DataFrame({
+            'month': months.index.astype(str),
+            'transaction_count': months['count'].astype('int64').values,
+            'monthly_volume': _round(months['sum']).values,
+            'avg_monthly_transaction': _round(months['sum'] / months['count']).values,
+        })
+
+    def _aml_compliance_check(self):
+        aml = self.aml_users
+        count = int(aml['count'].sum()) if aml is not None else 0
+        return pd.DataFrame({
+            'total_suspicious': [count],
+            'suspicious_volume': [_round(aml['sum'].sum()) if count else np.nan],
+            'users_involved': [len(aml) if aml is not None else 0],
+        })
+
+
+class QuantileSketch:
+    """Сливаемый скетч квантилей с гарантированной относительной ошибкой (в духе DDSketch).
+
+    Значения раскладываются по логарифмическим корзинам, поэтому память
+    зависит от диапазона значений, а не от их количества.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.buckets = pd.Series(dtype='int64')
+        self.zero_count = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return self
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        self.buckets = self.buckets.add(pd.Series(counts, index=keys), fill_value=0).astype('int64')
+        return self
+
+    def merge(self, other):
+        self.buckets = self.buckets.add(other.buckets, fill_value=0).astype('int64')
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _representatives(self):
+        """Значения-представители положительных корзин"""
+        keys = self.buckets.index.to_numpy()
+        return np.clip(2 * self.gamma ** keys / (self.gamma + 1), self.min, self.max)
+
+    def values(self):
+        """Представители корзин (включая нулевую) и их веса, по возрастанию"""
+        representatives = self._representatives()
+        weights = self.buckets.to_numpy()
+        if self.zero_count:
+            representatives = np.concatenate([[min(self.min, 0.0)], representatives])
+            weights = np.concatenate([[self.zero_count], weights])
+        return representatives, weights
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        representatives, weights = self.values()
+        rank = q * (self.count - 1)
+        return float(representatives[np.searchsorted(np.cumsum(weights), rank, side='right')])
+
+    def below(self, upper):
+        """Скетч значений меньше upper (с точностью до корзины)"""
+        result = QuantileSketch(self.relative_accuracy)
+        representatives = self._representatives()
+        keep = representatives < upper
+        result.buckets = self.buckets[keep]
+        result.zero_count = self.zero_count if upper > 0 else 0
+        result.count = int(result.buckets.sum()) + result.zero_count
+        if result.count:
+            result.min = self.min
+            result.max = float(representatives[keep].max()) if keep.any() else 0.0
+        return result
+
+    def mean(self):
+        representatives, weights = self.values()
+        return float(np.average(representatives, weights=weights)) if self.count else np.nan
+
+    def histogram(self, bins):
+        """Приближенная гистограмма: (counts, edges)"""
+        representatives, weights = self.values()
+        return np.histogram(representatives, bins=bins, range=(self.min, self.max), weights=weights)
+
+    def box_stats(self, label, whis=1.5):
+        """Статистики для Axes.bxp (без выбросов)"""
+        representatives, _ = self.values()
+        q1, med, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        iqr = q3 - q1
+        inside = representatives[(representatives >= q1 - whis * iqr) & (representatives <= q3 + whis * iqr)]
+        return {'label': label, 'med': med, 'q1': q1, 'q3': q3, 'mean': self.mean(),
+                'whislo': float(inside.min()) if len(inside) else q1,
+                'whishi': float(inside.max()) if len(inside) else q3, 'fliers': []}
+
+
+# Признаки матрицы корреляций дашборда
+CORRELATION_COLUMNS = ['amount', 'is_debit', 'is_suspicious_num', 'hour', 'user_id']
+
+
+def suspicious_mask(frame):
+    """Подозрительные операции: флаг из данных или, если его нет, крупная сумма"""
+    if 'is_suspicious' in frame.columns:
+        return frame['is_suspicious'].astype(bool)
+    return frame['amount'] > LARGE_AMOUNT
+
+
+# Ключ корзины скетча для неположительных сумм
+ZERO_BUCKET = np.iinfo(np.int64).min
+
+# Ключи трех кубоидов и функции слияния их мер
+CELL_KEYS = ['date', 'hour', 'category', 'transaction_type', 'is_suspicious']
+CELL_MEASURES = {'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max',
+                 'user_sum': 'sum', 'user_sq': 'sum', 'user_amount': 'sum'}
+USER_KEYS = ['date', 'category', 'transaction_type', 'user_id']
+USER_MEASURES = {'count': 'sum', 'sum': 'sum'}
+BUCKET_KEYS = ['date', 'category', 'transaction_type', 'bucket']
+BUCKET_MEASURES = {'count': 'sum'}
+
+
+def _plain_index(grouped):
+    """Категориальные уровни индекса -> object, чтобы части можно было склеивать"""
+    grouped.index = pd.MultiIndex.from_arrays(
+        [level.astype(object) if isinstance(level.dtype, pd.CategoricalDtype) else level
+         for level in (grouped.index.get_level_values(i) for i in range(grouped.index.nlevels))],
+        names=grouped.index.names)
+    return grouped
+
+
+def _compact(parts, measures):
+    if len(parts) == 1:
+        return parts[0]
+    combined = pd.concat(parts)
+    return combined.groupby(level=list(range(combined.index.nlevels)), sort=False).agg(measures)
+
+
+class AggregateCube:
+    """Предагрегированный куб транзакций, из которого строятся все графики BankDataVisualizer.
+
+    Строится за один векторный проход (update по чанкам, merge частей) и
+    хранит три кубоида с ключами date/category/transaction_type:
+    cells (+ hour, is_suspicious) - счетчики, суммы и моменты для корреляций,
+    users (+ user_id) - объемы пользователей,
+    buckets (+ корзина QuantileSketch) - распределение сумм для квантилей.
+    Графики для любого фильтра по дате, категории и типу считаются без сырых строк.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.fingerprint = None
+        self._parts = {'cells': [], 'users': [], 'buckets': []}
+        self._frames = {}
+
+    def update(self, chunk):
+        """Учет чанка транзакций"""
+        if len(chunk) == 0:
+            return self
+        dates = pd.to_datetime(chunk['transaction_date'])
+        amount = chunk['amount'].to_numpy(dtype=float)
+        user = chunk['user_id'].to_numpy(dtype=float)
+        positive = amount > 0
+        bucket = np.full(len(amount), ZERO_BUCKET, dtype=np.int64)
+        bucket[positive] = np.ceil(np.log(amount[positive]) / np.log(self.gamma)).astype(np.int64)
+
+        frame = pd.DataFrame({
+            'date': dates.dt.normalize().to_numpy(),
+            'hour': dates.dt.hour.to_numpy(),
+            'category': chunk['category'].to_numpy(),
+            'transaction_type': chunk['transaction_type'].to_numpy(),
+            'is_suspicious': suspicious_mask(chunk).to_numpy(),
+            'user_id': chunk['user_id'].to_numpy(),
+            'bucket': bucket,
+            'amount': amount,
+            'amount_sq': amount * amount,
+            'user': user,
+            'user_sq': user * user,
+            'user_amount': user * amount,
+        })
+
+        cells = frame.groupby(CELL_KEYS, sort=False).agg(
+            count=('amount', 'size'), sum=('amount', 'sum'), sumsq=('amount_sq', 'sum'),
+            min=('amount', 'min'), max=('amount', 'max'), user_sum=('user', 'sum'),
+            user_sq=('user_sq', 'sum'), user_amount=('user_amount', 'sum'))
+        users = frame.groupby(USER_KEYS, sort=False).agg(count=('amount', 'size'), sum=('amount', 'sum'))
+        buckets = frame.groupby(BUCKET_KEYS, sort=False).agg(count=('amount', 'size'))
+
+        for name, part in (('cells', cells), ('users', users), ('buckets', buckets)):
+            self._add_part(name, _plain_index(part))
+        return self
+
+    def merge(self, other):
+        """Объединение с кубом другой части данных"""
+        for name in self._parts:
+            if other.frame(name) is not None:
+                self._add_part(name, other.frame(name))
+        return self
+
+    def scale(self, weights):
+        """Домножение счетчиков и сумм на веса weights (Series по category, transaction_type).
+
+        Куб, построенный по стратифицированной выборке, так становится оценкой
+        куба всей совокупности; минимумы, максимумы и корзины скетча не меняются.
+        Счетчики остаются дробными и округляются только в итогах chart_data.
+        """
+        for name, columns in (('cells', ['count', 'sum', 'sumsq', 'user_sum', 'user_sq', 'user_amount']),
+                              ('users', ['count', 'sum']), ('buckets', ['count'])):
+            frame = self.frame(name)
+            if frame is None:
+                continue
+            keys = pd.MultiIndex.from_arrays([frame.index.get_level_values('category'),
+                                              frame.index.get_level_values('transaction_type')])
+            factor = weights.reindex(keys).fillna(0).to_numpy()
+            frame = frame.copy()
+            for column in columns:
+                frame[column] = frame[column] * factor
+            self._frames[name] = frame
+        return self
+
+    def _add_part(self, name, part):
+        parts = self._parts[name]
+        if name in self._frames:
+            parts.append(self._frames.pop(name))
+        parts.append(part)
+        if len(parts) >= 16:
+            self._parts[name] = [_compact(parts, self._measures(name))]
+
+    @staticmethod
+    def _measures(name):
+        return {'cells': CELL_MEASURES, 'users': USER_MEASURES, 'buckets': BUCKET_MEASURES}[name]
+
+    def frame(self, name):
+        """Кубоид name ('cells', 'users', 'buckets') после слияния частей"""
+        if self._parts[name]:
+            self._frames[name] = _compact(self._parts[name], self._measures(name))
+            self._parts[name] = []
+        return self._frames.get(name)
+
+    def save(self, path):
+        for name in self._parts:
+            self.frame(name)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def _select(frame, start=None, end=None, categories=None, transaction_types=None):
+        """Срез кубоида по диапазону дат [start, end], категориям и типам операций"""
+        mask = np.ones(len(frame), dtype=bool)
+        if start is not None or end is not None:
+            dates = frame.index.get_level_values('date')
+            if start is not None:
+                mask &= dates >= pd.Timestamp(start).normalize()
+            if end is not None:
+                mask &= dates <= pd.Timestamp(end)
+        if categories is not None:
+            mask &= frame.index.get_level_values('category').isin(categories)
+        if transaction_types is not None:
+            mask &= frame.index.get_level_values('transaction_type').isin(transaction_types)
+        return frame[mask]
+
+    def _sketch(self, buckets, low, high):
+        """QuantileSketch из корзин среза"""
+        sketch = QuantileSketch(self.relative_accuracy)
+        counts = _round(buckets.groupby(level='bucket')['count'].sum(), 0)
+        sketch.zero_count = int(counts.get(ZERO_BUCKET, 0))
+        sketch.buckets = counts.drop(ZERO_BUCKET, errors='ignore').sort_index().astype('int64')
+        sketch.count = int(counts.sum())
+        sketch.min, sketch.max = float(low), float(high)
+        return sketch
+
+    def _correlation(self, cells):
+        """Матрица корреляций из моментов кубоида cells"""
+        index = cells.index
+        n = cells['count'].to_numpy(dtype=float)
+        s = cells['sum'].to_numpy()
+        u = cells['user_sum'].to_numpy()
+        d = np.asarray(index.get_level_values('transaction_type') == 'debit', dtype=float)
+        f = np.asarray(index.get_level_values('is_suspicious'), dtype=float)
+        h = np.asarray(index.get_level_values('hour'), dtype=float)
+
+        # Суммы значений и попарных произведений признаков CORRELATION_COLUMNS
+        first = np.array([s.sum(), (n * d).sum(), (n * f).sum(), (n * h).sum(), u.sum()])
+        second = np.array([
+            [cells['sumsq'].sum(), (s * d).sum(), (s * f).sum(), (s * h).sum(), cells['user_amount'].sum()],
+            [0, (n * d).sum(), (n * d * f).sum(), (n * d * h).sum(), (u * d).sum()],
+            [0, 0, (n * f).sum(), (n * f * h).sum(), (u * f).sum()],
+            [0, 0, 0, (n * h * h).sum(), (u * h).sum()],
+            [0, 0, 0, 0, cells['user_sq'].sum()],
+        ])
+        second = np.triu(second) + np.triu(second, 1).T
+        total = n.sum()
+        mean = first / total
+        covariance = second / total - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = covariance / np.outer(std, std)
+        return pd.DataFrame(corr, index=CORRELATION_COLUMNS, columns=CORRELATION_COLUMNS)
+
+    def chart_data(self, start=None, end=None, categories=None, transaction_types=None):
+        """Входы всех графиков для среза куба (формат BankDataVisualizer.chart_data)"""
+        selection = dict(start=start, end=end, categories=categories, transaction_types=transaction_types)
+        cells = self._select(self.frame('cells'), **selection)
+        users = self._select(self.frame('users'), **selection)
+        buckets = self._select(self.frame('buckets'), **selection)
+
+        by_category = cells.groupby(level='category')
+        category_counts = _round(by_category['count'].sum(), 0).astype('int64').sort_values(ascending=False)
+        low, high = cells['min'].min(), cells['max'].max()
+
+        amounts = self._sketch(buckets, low, high)
+        threshold = amounts.quantile(0.95)
+        below = amounts.below(threshold)
+        counts, edges = below.histogram(30)
+        all_counts, all_edges = amounts.histogram(50)
+
+        boxes = []
+        category_min, category_max = by_category['min'].min(), by_category['max'].max()
+        for category, category_buckets in buckets.groupby(level='category'):
+            sketch = self._sketch(category_buckets, category_min[category],
+                                  category_max[category]).below(threshold)
+            if sketch.count:
+                boxes.append(sketch.box_stats(category))
+        boxes.sort(key=lambda box: box['label'])
+
+        user_stats = users.groupby(level='user_id').sum()
+        user_stats = user_stats.rename(columns={'sum': 'total_amount', 'count': 'transaction_count'})
+        user_stats = user_stats[['total_amount', 'transaction_count']].apply(_round)
+        user_stats.index = user_stats.index.astype('int64')
+
+        # Ряд динамики: уровень свертки по диапазону дат, не больше MAX_POINTS точек
+        hours = cells.groupby(level=['date', 'hour']).agg(count=('count', 'sum'), sum=('sum', 'sum'),
+                                                          min=('min', 'min'), max=('max', 'max'))
+        hours.index = (pd.DatetimeIndex(hours.index.get_level_values('date'))
+                       + pd.to_timedelta(hours.index.get_level_values('hour'), unit='h'))
+        level, trend = TimeRollups().add_hourly(hours).series(max_points=MAX_POINTS)
+        types = cells.groupby(level='transaction_type')[['sum', 'count']].sum().sort_index()
+        suspicious = cells[cells.index.get_level_values('is_suspicious')]
+        suspicious = _round(suspicious.groupby(level='category')['count'].sum(), 0).astype('int64')
+
+        return {
+            'category_distribution': category_counts,
+            'amount_distribution': {'counts': counts, 'edges': edges,
+                                    'mean': below.mean(), 'median': below.quantile(0.5)},
+            'top_users': user_stats.nlargest(10, 'total_amount'),
+            'temporal_trends': pd.DataFrame({'date': trend.index, 'amount': trend['sum'].values,
+                                             'count': trend['count'].values}),
+            'temporal_level': level,
+            'correlation': self._correlation(cells),
+            'suspicious_activity': suspicious[suspicious > 0].sort_values(ascending=False),
+            'debit_vs_credit': pd.DataFrame({'sum': _round(types['sum']),
+                                             'count': _round(types['count'], 0).astype('int64'),
+                                             'mean': _round(types['sum'] / types['count'])}),
+            'category_boxplot': boxes,
+            'simple_report': {
+                'categories': category_counts,
+                'types': _round(types['count'], 0).astype('int64').sort_values(ascending=False),
+                'top_users': user_stats['total_amount'].nlargest(5),
+                'amounts': {'counts': all_counts, 'edges': all_edges},
+            },
+        }
@@ -0,0 +1,207 @@
+from collections import defaultdict, deque, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from storage import sqlite_round
+
+# Сработавшее правило: время события в секундах Unix, details - пояснение
+Alert = namedtuple('Alert', ['rule', 'user_id', 'transaction_id', 'timestamp', 'amount', 'details'])
+
+
+class _CooldownRule:
+    """Общая часть оконных правил: не чаще одного алерта на пользователя за окно"""
+
+    def __init__(self, window_seconds):
+        self.window = window_seconds
+        self._last_alert = {}
+
+    def _may_alert(self, user_id, timestamp):
+        last = self._last_alert.get(user_id)
+        if last is not None and timestamp - last < self.window:
+            return False
+        self._last_alert[user_id] = timestamp
+        return True
+
+
+class VelocityRule(_CooldownRule):
+    """Скорость: не меньше max_count операций пользователя за window_minutes минут"""
+
+    name = 'velocity'
+
+    def __init__(self, max_count=10, window_minutes=60):
+        super().__init__(window_minutes * 60)
+        self.max_count = max_count
+        self._events = defaultdict(deque)
+
+    def process(self, user_id, timestamp, amount, transaction_type, transaction_id):
+        events = self._events[user_id]
+        while events and timestamp - events[0] > self.window:
+            events.popleft()
+        events.append(timestamp)
+        if len(events) >= self.max_count and self._may_alert(user_id, timestamp):
+            return Alert(self.name, user_id, transaction_id, timestamp, amount,
+                         f'{len(events)} операций за {self.window // 60} мин')
+        return None
+
+
+class StructuringRule(_CooldownRule):
+    """Дробление: не меньше min_count сумм чуть ниже порога (в пределах margin) за window_hours часов"""
+
+    name = 'structuring'
+
+    def __init__(self, threshold=30000, margin=0.1, min_count=3, window_hours=24):
+        super().__init__(window_hours * 3600)
+        self.low = threshold * (1 - margin)
+        self.threshold = threshold
+        self.min_count = min_count
+        self._events = defaultdict(deque)
+
+    def process(self, user_id, timestamp, amount, transaction_type, transaction_id):
+        if not self.low <= amount < self.threshold:
+            return None
+        events = self._events[user_id]
+        while events and timestamp - events[0] > self.window:
+            events.popleft()
+        events.append(timestamp)
+        if len(events) >= self.min_count and self._may_alert(user_id, timestamp):
+            return Alert(self.name, user_id, transaction_id, timestamp, amount,
+                         f'{len(events)} сумм в [{self.low:.0f}, {self.threshold:.0f}) за {self.window // 3600} ч')
+        return None
+
+
+class RapidInOutRule:
+    """Транзит: списание, близкое по сумме (tolerance) к зачислению за последние window_minutes минут.
+
+    Зачисления хранятся в кольцевом буфере на пользователя (max_pending последних).
+    """
+
+    name = 'rapid_in_out'
+
+    def __init__(self, window_minutes=60, tolerance=0.1, min_amount=1000, max_pending=16):
+        self.window = window_minutes * 60
+        self.tolerance = tolerance
+        self.min_amount = min_amount
+        self.max_pending = max_pending
+        self._credits = defaultdict(lambda: deque(maxlen=self.max_pending))
+
+    def process(self, user_id, timestamp, amount, transaction_type, transaction_id):
+        if amount < self.min_amount:
+            return None
+        credits = self._credits[user_id]
+        while credits and timestamp - credits[0][0] > self.window:
+            credits.popleft()
+        if transaction_type == 'credit':
+            credits.append((timestamp, amount))
+            return None
+        for i, (credit_time, credit_amount) in enumerate(credits):
+            if abs(amount - credit_amount) <= self.tolerance * credit_amount:
+                del credits[i]
+                return Alert(self.name, user_id, transaction_id, timestamp, amount,
+                             f'списание через {(timestamp - credit_time) / 60:.0f} мин после зачисления {credit_amount:.2f}')
+        return None
+
+
+class LargeAmountRule:
+    """Частые крупные операции: больше min_count - 1 сумм выше threshold.
+
+    Без окна (window_hours=None) повторяет _suspicious_activity_detection:
+    пользователи с COUNT(*) > 2 операций дороже 30000 за всю историю.
+    """
+
+    name = 'large_amount'
+
+    def __init__(self, threshold=30000, min_count=3, window_hours=None):
+        self.threshold = threshold
+        self.min_count = min_count
+        self.window = None if window_hours is None else window_hours * 3600
+        self._events = defaultdict(deque)
+        self.totals = defaultdict(lambda: [0, 0.0])
+
+    def process(self, user_id, timestamp, amount, transaction_type, transaction_id):
+        if amount <= self.threshold:
+            return None
+        totals = self.totals[user_id]
+        totals[0] += 1
+        totals[1] += amount
+
+        events = self._events[user_id]
+        if self.window is not None:
+            while events and timestamp - events[0] > self.window:
+                events.popleft()
+            events.append(timestamp)
+            count = len(events)
+        else:
+            count = totals[0]
+        if count == self.min_count:
+            return Alert(self.name, user_id, transaction_id, timestamp, amount,
+                         f'{count} операций дороже {self.threshold}')
+        return None
+
+    def report(self):
+        """Таблица в формате запроса крупных транзакций анализатора"""
+        rows = [(user_id, count, sqlite_round(total)) for user_id, (count, total) in self.totals.items()
+                if count >= self.min_count]
+        result = pd.DataFrame(rows, columns=['user_id', 'large_transactions', 'total_large_amount'])
+        return result.sort_values('total_large_amount', ascending=False, kind='stable').reset_index(drop=True)
+
+
+class ThresholdRule:
+    """Порог по одной операции: правило колонки is_suspicious генератора"""
+
+    name = 'threshold'
+
+    def __init__(self, amount=30000, transaction_type='debit', hard_limit=100000):
+        self.amount = amount
+        self.transaction_type = transaction_type
+        self.hard_limit = hard_limit
+
+    def process(self, user_id, timestamp, amount, transaction_type, transaction_id):
+        if (amount > self.amount and transaction_type == self.transaction_type) or amount > self.hard_limit:
+            return Alert(self.name, user_id, transaction_id, timestamp, amount, f'сумма {amount:.2f}')
+        return None
+
+
+def default_rules():
+    return [VelocityRule(), StructuringRule(), RapidInOutRule(), LargeAmountRule(), ThresholdRule()]
+
+
+class StreamingAMLDetector:
+    """Потоковый AML-детектор: события обрабатываются по одному, O(1) амортизированно на правило.
+
+    События должны приходить в порядке времени. Алерты копятся в alerts и
+    передаются в on_alert сразу при срабатывании.
+    """
+
+    def __init__(self, rules=None, on_alert=None):
+        self.rules = default_rules() if rules is None else rules
+        self.on_alert = on_alert
+        self.alerts = []
+        self.processed = 0
+
+    def process(self, user_id, timestamp, amount, transaction_type='debit', transaction_id=None):
+        """Обработка одной операции; timestamp - секунды Unix"""
+        self.processed += 1
+        fired = []
+        for rule in self.rules:
+            alert = rule.process(user_id, timestamp, amount, transaction_type, transaction_id)
+            if alert is not None:
+                fired.append(alert)
+                if self.on_alert is not None:
+                    self.on_alert(alert)
+        self.alerts.extend(fired)
+        return fired
+
+    def process_frame(self, df):
+        """Прогон пачки транзакций (в порядке transaction_date) через правила"""
+        df = df.sort_values('transaction_date', kind='stable')
+        timestamps = pd.to_datetime(df['transaction_date']).to_numpy('datetime64[s]').astype(np.int64)
+        fired = []
+        for args in zip(df['user_id'].tolist(), timestamps.tolist(), df['amount'].tolist(),
+                        df['transaction_type'].astype(str).tolist(), df['transaction_id'].tolist()):
+            fired.extend(self.process(*args))
+        return fired
+
+    def summary(self):
+        """Число алертов по правилам"""
+        return pd.Series([a.rule for a in self.alerts], dtype='object').value_counts()
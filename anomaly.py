@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import TOP_COLUMNS
+from storage import sqlite_round
+
+# Веса компонент в итоговом скоре
+DEFAULT_WEIGHTS = {
+    'user_amount': 1.0,  # сумма относительно собственной истории пользователя
+    'category_amount': 0.5,  # сумма относительно базовой линии категории
+    'combination': 0.25,  # редкость сочетания мерчант/город/час
+    'user_hour': 0.25,  # непривычный для пользователя час
+}
+
+# Масштаб MAD -> стандартное отклонение для нормального распределения
+_MAD_SCALE = 1.4826
+
+# Нижняя граница масштаба: при почти одинаковых суммах отклонения не раздуваются
+MIN_SCALE = 0.05
+
+COMPONENTS = ['user_amount_z', 'category_amount_z', 'combination_rarity', 'user_hour_rarity']
+
+
+def _group_median(values, codes):
+    return pd.Series(values).groupby(codes).median()
+
+
+def _robust_baseline(values, codes):
+    """Медиана и MAD values внутри групп codes"""
+    median = _group_median(values, codes)
+    mad = _group_median(np.abs(values - median.to_numpy()[codes]), codes)
+    return median, mad
+
+
+def _robust_z(values, center, mad):
+    return (values - center) / np.maximum(_MAD_SCALE * mad, MIN_SCALE)
+
+
+def _factorize(values):
+    """Коды и словарь значений колонки (категориальные - через их коды, без строк)"""
+    codes, uniques = pd.factorize(values, sort=False)
+    return codes, pd.Index(np.asarray(uniques))
+
+
+def _lookup(index, values):
+    """Позиции значений values в словаре index (-1 для новых значений)"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        positions = np.append(index.get_indexer(values.cat.categories), -1)
+        return positions[values.cat.codes.to_numpy()]
+    return index.get_indexer(values)
+
+
+class AnomalyScorer:
+    """Векторный скоринг аномальности транзакций.
+
+    fit() строит базовые линии по истории: медиану и MAD логарифма суммы
+    для каждого пользователя и категории, частоты сочетаний
+    мерчант/город/час и часов активности каждого пользователя. score()
+    считает для каждой транзакции робастные z-оценки суммы, редкость
+    сочетания и часа и итоговый anomaly_score (взвешенная сумма
+    положительных частей). Все шаги - операции над массивами, без циклов по строкам.
+    """
+
+    def __init__(self, weights=None, min_history=5, contamination=0.01, threshold=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.min_history = min_history
+        self.contamination = contamination
+        self.threshold = threshold
+        self.fitted = False
+
+    @staticmethod
+    def _prepare(df):
+        """Логарифм суммы и час операции - общие входы fit и score"""
+        values = np.log1p(np.clip(df['amount'].to_numpy(dtype=float), 0, None))
+        hours = pd.to_datetime(df['transaction_date']).dt.hour.to_numpy()
+        return values, hours
+
+    @staticmethod
+    def _combination_columns(df):
+        return [c for c in ('merchant', 'location') if c in df.columns]
+
+    def _combination_keys(self, codes, hours):
+        """Ключ сочетания в смешанной системе счисления по словарям колонок; -1 - новое значение"""
+        key = hours.astype(np.int64)
+        unknown = np.zeros(len(hours), dtype=bool)
+        for column_codes, size in zip(codes, self.combination_sizes):
+            key = key * (size + 1) + column_codes
+            unknown |= column_codes < 0
+        return np.where(unknown, -1, key)
+
+    def fit(self, df, prepared=None):
+        """Базовые линии по истории транзакций df"""
+        values, hours = prepared or self._prepare(df)
+
+        user_codes, self.users = _factorize(df['user_id'])
+        self.user_median, self.user_mad = _robust_baseline(values, user_codes)
+        self.user_count = np.bincount(user_codes, minlength=len(self.users))
+
+        category_codes, self.categories = _factorize(df['category'])
+        self.category_median, self.category_mad = _robust_baseline(values, category_codes)
+        self.global_median = float(np.median(values))
+        self.global_mad = float(np.median(np.abs(values - self.global_median)))
+
+        self.user_hours = np.bincount(user_codes * 24 + hours, minlength=len(self.users) * 24).reshape(-1, 24)
+
+        self.combination = self._combination_columns(df)
+        factorized = [_factorize(df[c]) for c in self.combination]
+        codes = [column_codes for column_codes, _ in factorized]
+        self.combination_values = [dictionary for _, dictionary in factorized]
+        self.combination_sizes = [len(values) for values in self.combination_values]
+        combination_codes, self.combinations = _factorize(self._combination_keys(codes, hours))
+        self.combination_count = np.bincount(combination_codes, minlength=len(self.combinations))
+        self.rows = len(df)
+
+        # Распределение «удивления» сочетаний по истории - для нормировки
+        surprise = self._surprise(self.combination_count[combination_codes])
+        self.surprise_median = float(np.median(surprise))
+        self.surprise_mad = float(np.median(np.abs(surprise - self.surprise_median)))
+        self.calibrated_threshold = None
+        self.fitted = True
+        return self
+
+    def _surprise(self, counts):
+        # Сглаживание Лапласа: несуществовавшее в истории сочетание получает count = 0
+        return -np.log((counts + 1) / (self.rows + len(self.combinations) + 1))
+
+    def score(self, df, prepared=None):
+        """Компоненты и anomaly_score для каждой транзакции df (индекс df сохраняется).
+
+        is_anomalous - скор не ниже threshold; без него - не ниже порога,
+        откалиброванного fit_score по истории (доля contamination), а если
+        калибровки не было - квантиля по самому df.
+        """
+        if not self.fitted:
+            raise ValueError("Сначала нужно вызвать fit()")
+        values, hours = prepared or self._prepare(df)
+
+        category = _lookup(self.categories, df['category'])
+        known_category = category >= 0
+        category_center = np.where(known_category, self.category_median.to_numpy()[category], self.global_median)
+        category_mad = np.where(known_category, self.category_mad.to_numpy()[category], self.global_mad)
+        category_z = _robust_z(values, category_center, category_mad)
+
+        # Пользователь с короткой историей сравнивается с базовой линией категории
+        user = _lookup(self.users, df['user_id'])
+        known_user = user >= 0
+        user_count = np.where(known_user, self.user_count[user], 0)
+        experienced = user_count >= self.min_history
+        user_z = np.where(experienced,
+                          _robust_z(values, self.user_median.to_numpy()[user], self.user_mad.to_numpy()[user]),
+                          category_z)
+
+        # Редкость часа для пользователя: -log(p(час | пользователь) * 24), p сглажена
+        hour_count = np.where(known_user, self.user_hours[user, hours], 0)
+        user_hour = -np.log((hour_count + 1) / (user_count + 24) * 24)
+
+        codes = [_lookup(dictionary, df[c]) for c, dictionary in zip(self.combination, self.combination_values)]
+        combination = self.combinations.get_indexer(self._combination_keys(codes, hours))
+        counts = np.where(combination >= 0, self.combination_count[combination], 0)
+        combination_rarity = _robust_z(self._surprise(counts), self.surprise_median, self.surprise_mad)
+
+        result = pd.DataFrame({
+            'user_amount_z': user_z,
+            'category_amount_z': category_z,
+            'combination_rarity': combination_rarity,
+            'user_hour_rarity': user_hour,
+        }, index=df.index)
+        w = self.weights
+        result['anomaly_score'] = (w['user_amount'] * np.clip(user_z, 0, None)
+                                   + w['category_amount'] * np.clip(category_z, 0, None)
+                                   + w['combination'] * np.clip(combination_rarity, 0, None)
+                                   + w['user_hour'] * np.clip(user_hour, 0, None))
+        threshold = self.threshold if self.threshold is not None else self.calibrated_threshold
+        if threshold is None:
+            threshold = self._quantile_threshold(result['anomaly_score'])
+        result['is_anomalous'] = result['anomaly_score'] >= threshold
+        return result
+
+    def _quantile_threshold(self, scores):
+        return float(np.quantile(scores, 1 - self.contamination)) if len(scores) else np.inf
+
+    def fit_score(self, df):
+        """fit и score по одной истории; порог аномальности калибруется по ее скорам"""
+        prepared = self._prepare(df)
+        self.fit(df, prepared)
+        result = self.score(df, prepared)
+        if self.threshold is None:
+            self.calibrated_threshold = self._quantile_threshold(result['anomaly_score'])
+        return result
+
+
+def scored_transactions(df, scores):
+    """Транзакции с колонками скоринга (для отчетов по рангу)"""
+    columns = [c for c in TOP_COLUMNS if c in df.columns]
+    return pd.concat([df[columns], scores], axis=1)
+
+
+def anomalous_users(scored, limit=20):
+    """Пользователи, ранжированные по сумме скоров их аномальных операций"""
+    flagged = scored[scored['is_anomalous']]
+    result = flagged.groupby('user_id').agg(anomalous_transactions=('anomaly_score', 'size'),
+                                            total_anomalous_amount=('amount', 'sum'),
+                                            total_score=('anomaly_score', 'sum'),
+                                            max_score=('anomaly_score', 'max')).reset_index()
+    result = result.sort_values('total_score', ascending=False, kind='stable').head(limit).reset_index(drop=True)
+    # Деньги и скоры округляются, как ROUND в SQL-разделах
+    return result.assign(total_anomalous_amount=sqlite_round(result['total_anomalous_amount']),
+                         total_score=sqlite_round(result['total_score'], 3),
+                         max_score=sqlite_round(result['max_score'], 3))
+
+
+def top_anomalies(scored, limit=5):
+    """Операции с наибольшим anomaly_score"""
+    top = scored.nlargest(limit, 'anomaly_score').reset_index(drop=True)
+    return top[[c for c in TOP_COLUMNS if c in top.columns]].assign(
+        anomaly_score=sqlite_round(top['anomaly_score'], 3))
+
+
+def anomaly_summary(scored):
+    """Сводка в формате раздела AML compliance check"""
+    flagged = scored[scored['is_anomalous']]
+    return pd.DataFrame([{'total_suspicious': len(flagged),
+                          'suspicious_volume': sqlite_round(flagged['amount'].sum()),
+                          'users_involved': flagged['user_id'].nunique()}])
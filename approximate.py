@@ -0,0 +1,455 @@
+import pickle
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from aggregates import LARGE_AMOUNT, LARGE_MIN_COUNT, TOP_AMOUNT, TOP_COLUMNS, AggregateCube
+from storage import concat_frames, month_of, sqlite_datetime_text, sqlite_round
+from timeseries import _period_start
+
+# Ключи страт выборки: все кубоиды AggregateCube разбиты по этим колонкам
+DEFAULT_STRATA = ['category', 'transaction_type']
+
+# Строк выборки на страту по умолчанию и стартовый размер при последовательном уточнении
+DEFAULT_CAPACITY = 20_000
+INITIAL_PER_STRATUM = 1_000
+
+CONFIDENCE = 0.95
+
+# Итоги (раздел, таблица, колонка), по относительной погрешности которых проверяется target_error;
+# оценки по отдельным пользователям требуют на порядки большей выборки и в проверку не входят
+HEADLINE_COLUMNS = (
+    ('basic_statistics', 'summary', 'total_volume'),
+    ('category_analysis', 'categories', 'total_amount'),
+    ('monthly_trends', 'months', 'monthly_volume'),
+    ('aml_compliance_check', 'summary', 'suspicious_volume'),
+)
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def capacity_for(target_error, confidence=CONFIDENCE, cv=1.0):
+    """Строк на страту, при которых сумма по страте имеет относительную погрешность target_error.
+
+    cv - коэффициент вариации сумм внутри страты (около 1 для сумм транзакций).
+    """
+    return int(np.ceil((_z(confidence) * cv / target_error) ** 2))
+
+
+class HyperLogLog:
+    """Оценка числа различных значений (COUNT DISTINCT) в 2 ** precision регистрах.
+
+    Относительная стандартная ошибка - 1.04 / sqrt(2 ** precision)
+    (1.6% при precision=12); скетчи сливаются поэлементным максимумом.
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def update(self, values):
+        values = np.asarray(values)
+        if len(values) == 0:
+            return self
+        hashes = pd.util.hash_array(values)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes << np.uint64(self.precision)
+        # Ранг - число ведущих нулей остатка + 1; старшие 53 бита переводятся во float без потерь
+        top = (rest >> np.uint64(11)).astype(np.float64)
+        _, bit_length = np.frexp(top)
+        rank = np.where(top > 0, 54 - bit_length, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Поправка для малых множеств: линейный подсчет по пустым регистрам
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def interval(self, confidence=CONFIDENCE):
+        """(оценка, полуширина доверительного интервала)"""
+        estimate = self.count()
+        return estimate, _z(confidence) * self.relative_error * estimate
+
+
+def aml_mask(frame):
+    """Операции раздела AML: флаг подозрительности или сумма выше TOP_AMOUNT (как в SQL-запросе)"""
+    return frame['is_suspicious'].astype(bool) | (frame['amount'] > TOP_AMOUNT)
+
+
+def _variance_factor(n, N):
+    """N² (1 - n/N) / (n (n - 1)) - множитель выборочной дисперсии страты в дисперсии итога"""
+    n = np.asarray(n, dtype=float)
+    N = np.asarray(N, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = N * N * (1 - n / N) / (n * (n - 1))
+    return np.where(n > 1, factor, 0.0)
+
+
+def _stratum_sums(rows, groups, values):
+    """count, s1, s2 значений по группам groups внутри страт"""
+    frame = pd.DataFrame({'_stratum': rows['_stratum'].to_numpy(), 'y': values, 'y2': values * values})
+    for column in groups:
+        frame[column] = rows[column].to_numpy()
+    return frame.groupby(groups + ['_stratum'], observed=True, sort=False).agg(
+        c=('y', 'size'), s1=('y', 'sum'), s2=('y2', 'sum'))
+
+
+class StratifiedSample:
+    """Стратифицированная выборка транзакций с точными размерами страт.
+
+    Внутри каждой страты (DEFAULT_STRATA) хранятся capacity строк с
+    наименьшими случайными ключами (bottom-k): это равномерная выборка без
+    возвращения, ее можно досчитывать по чанкам и сливать, а первые k строк
+    любой страты - тоже равномерная выборка, что позволяет уточнять оценку
+    последовательно. Оценки сумм, средних и количеств - с доверительными
+    интервалами стратифицированного оценивания; число различных
+    пользователей - по HyperLogLog. Максимум, минимум и топ крупных
+    операций считаются точно за тот же проход.
+    """
+
+    def __init__(self, strata=None, capacity=DEFAULT_CAPACITY, seed=0, precision=12, confidence=CONFIDENCE):
+        self.strata = list(strata or DEFAULT_STRATA)
+        self.capacity = capacity
+        self.confidence = confidence
+        self.fingerprint = None
+        self.keys = []
+        self._ids = {}
+        self.population = np.zeros(0, dtype=np.int64)
+        self.rows = None
+        self.users = HyperLogLog(precision)
+        self.suspicious_users = HyperLogLog(precision)
+        self.max = None
+        self.min = None
+        self.top_large = None
+        self._rng = np.random.default_rng(seed)
+
+    def _stratum_codes(self, chunk):
+        grouped = chunk.groupby(self.strata, observed=True, sort=False)
+        local = grouped.ngroup().to_numpy()
+        ids = []
+        for key in grouped.size().index:
+            key = key if isinstance(key, tuple) else (key,)
+            if key not in self._ids:
+                self._ids[key] = len(self.keys)
+                self.keys.append(key)
+            ids.append(self._ids[key])
+        return np.asarray(ids, dtype=np.int64)[local]
+
+    def _thresholds(self):
+        """Ключ, ниже которого строка еще может попасть в выборку своей страты"""
+        thresholds = np.ones(len(self.keys))
+        if self.rows is not None:
+            full = self.rows[self.rows['_rank'] == self.capacity - 1]
+            thresholds[full['_stratum'].to_numpy()] = full['_key'].to_numpy()
+        return thresholds
+
+    def update(self, chunk):
+        """Учет чанка транзакций"""
+        if len(chunk) == 0:
+            return self
+        codes = self._stratum_codes(chunk)
+        self.population = np.pad(self.population, (0, len(self.keys) - len(self.population)))
+        self.population += np.bincount(codes, minlength=len(self.keys))
+
+        amount = chunk['amount'].to_numpy(dtype=float)
+        self.max = float(amount.max()) if self.max is None else max(self.max, float(amount.max()))
+        self.min = float(amount.min()) if self.min is None else min(self.min, float(amount.min()))
+        users = chunk['user_id'].to_numpy()
+        self.users.update(users)
+        self.suspicious_users.update(users[aml_mask(chunk).to_numpy()])
+        self._merge_top(chunk.loc[amount > TOP_AMOUNT, [c for c in TOP_COLUMNS if c in chunk.columns]])
+
+        keys = self._rng.random(len(chunk))
+        candidates = keys < self._thresholds()[codes]
+        if candidates.any():
+            part = chunk[candidates].assign(_stratum=codes[candidates], _key=keys[candidates])
+            self._keep(part if self.rows is None else concat_frames([self.rows.drop(columns='_rank'), part]))
+        return self
+
+    def _keep(self, rows):
+        rows = rows.sort_values(['_stratum', '_key'], kind='stable', ignore_index=True)
+        rank = rows.groupby('_stratum', sort=False).cumcount().to_numpy()
+        self.rows = rows[rank < self.capacity].assign(_rank=rank[rank < self.capacity]).reset_index(drop=True)
+
+    def _merge_top(self, top):
+        if len(top) == 0:
+            return
+        top = top.nlargest(5, 'amount')
+        if pd.api.types.is_datetime64_any_dtype(top['transaction_date']):
+            # Дата в том же текстовом виде, в каком ее хранит SQLite
+            top = top.assign(transaction_date=sqlite_datetime_text(top['transaction_date']))
+        if self.top_large is not None:
+            top = pd.concat([self.top_large, top], ignore_index=True).nlargest(5, 'amount')
+        self.top_large = top.reset_index(drop=True)
+
+    def __len__(self):
+        return 0 if self.rows is None else len(self.rows)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    # --- Оценки ---
+
+    def subsample(self, per_stratum=None):
+        """Первые per_stratum строк каждой страты и фактический размер выборки страт"""
+        rows = self.rows
+        if per_stratum is not None and per_stratum < self.capacity:
+            rows = rows[rows['_rank'] < per_stratum]
+        sizes = np.bincount(rows['_stratum'].to_numpy(), minlength=len(self.keys))
+        return rows, sizes
+
+    def estimate(self, rows, sizes, groups=(), mask=None, value='amount'):
+        """Оценки по группам groups среди строк mask: count, sum, mean и полуширины интервалов (*_ci)"""
+        groups = list(groups)
+        if mask is not None:
+            rows = rows[mask]
+        if not groups:
+            rows = rows.assign(_all=0)
+            groups = ['_all']
+        stats = _stratum_sums(rows, groups, rows[value].to_numpy(dtype=float))
+        h = stats.index.get_level_values('_stratum').to_numpy()
+        n, N = sizes[h], self.population[h]
+        weight = N / n
+        factor = _variance_factor(n, N)
+        c, s1, s2 = stats['c'].to_numpy(float), stats['s1'].to_numpy(), stats['s2'].to_numpy()
+        keys = stats.index.droplevel('_stratum')
+
+        terms = pd.DataFrame({'count': weight * c, 'count_var': factor * (c - c * c / n),
+                              'sum': weight * s1, 'sum_var': factor * (s2 - s1 * s1 / n)}, index=keys)
+        totals = terms.groupby(level=list(range(keys.nlevels)), sort=False).sum()
+        # Среднее - отношение двух итогов; дисперсия линеаризацией по z = (y - R) 1[группа]
+        ratio = (totals['sum'] / totals['count']).reindex(keys).to_numpy()
+        z1 = s1 - ratio * c
+        z2 = s2 - 2 * ratio * s1 + ratio * ratio * c
+        mean_var = pd.Series(factor * (z2 - z1 * z1 / n), index=keys)
+        totals['mean'] = totals['sum'] / totals['count']
+        totals['mean_var'] = mean_var.groupby(level=list(range(keys.nlevels)), sort=False).sum() \
+            / totals['count'] ** 2
+
+        z = _z(self.confidence)
+        result = pd.DataFrame({'count': totals['count'], 'sum': totals['sum'], 'mean': totals['mean']})
+        for column in ('count', 'sum', 'mean'):
+            result[f'{column}_ci'] = z * np.sqrt(totals[f'{column}_var'].clip(lower=0))
+        if groups == ['_all']:
+            result.index = [0]
+        return result
+
+    def shares(self, rows, sizes, group, mask=None, value='amount'):
+        """Доли групп в итоге value среди строк mask (в процентах) и полуширины интервалов"""
+        if mask is not None:
+            rows = rows[mask]
+        y = rows[value].to_numpy(dtype=float)
+        by_group = _stratum_sums(rows, [group], y)
+        s1_gh = by_group['s1'].unstack('_stratum', fill_value=0.0)
+        s2_gh = by_group['s2'].unstack('_stratum', fill_value=0.0)
+        strata = s1_gh.columns.to_numpy()
+        s1_h, s2_h = s1_gh.sum().to_numpy(), s2_gh.sum().to_numpy()
+        n, N = sizes[strata], self.population[strata]
+        weight = N / n
+        factor = _variance_factor(n, N)
+
+        total = float((weight * s1_h).sum())
+        share = (s1_gh.to_numpy() * weight).sum(axis=1) / total
+        p = share[:, None]
+        z1 = s1_gh.to_numpy() - p * s1_h
+        z2 = s2_gh.to_numpy() * (1 - 2 * p) + p * p * s2_h
+        variance = (factor * (z2 - z1 * z1 / n)).sum(axis=1) / total ** 2
+        return pd.DataFrame({'percentage': 100 * share,
+                             'percentage_ci': 100 * _z(self.confidence) * np.sqrt(np.clip(variance, 0, None))},
+                            index=s1_gh.index)
+
+    # --- Разделы отчета ---
+
+    def _basic_statistics(self, rows, sizes):
+        total = self.estimate(rows, sizes).iloc[0]
+        users, users_ci = self.users.interval(self.confidence)
+        return {'summary': pd.DataFrame({
+            'total_transactions': [int(self.population.sum())],
+            'unique_users': [int(sqlite_round(users, 0))], 'unique_users_ci': [int(sqlite_round(users_ci, 0))],
+            'total_volume': [sqlite_round(total['sum'])], 'total_volume_ci': [sqlite_round(total['sum_ci'])],
+            'avg_transaction': [sqlite_round(total['mean'])], 'avg_transaction_ci': [sqlite_round(total['mean_ci'])],
+            'max_transaction': [sqlite_round(self.max)], 'min_transaction': [sqlite_round(self.min)],
+        })}
+
+    def _category_analysis(self, rows, sizes):
+        debit = (rows['transaction_type'] == 'debit').to_numpy()
+        estimates = self.estimate(rows, sizes, ['category'], debit)
+        shares = self.shares(rows, sizes, 'category', debit)
+        result = pd.DataFrame({
+            'category': estimates.index.astype(str),
+            'count': sqlite_round(estimates['count'], 0).astype('int64').values,
+            'count_ci': sqlite_round(estimates['count_ci'], 0).astype('int64').values,
+            'total_amount': sqlite_round(estimates['sum']).values,
+            'total_amount_ci': sqlite_round(estimates['sum_ci']).values,
+            'avg_amount': sqlite_round(estimates['mean']).values,
+            'avg_amount_ci': sqlite_round(estimates['mean_ci']).values,
+            'percentage': sqlite_round(shares['percentage'].reindex(estimates.index)).values,
+            'percentage_ci': sqlite_round(shares['percentage_ci'].reindex(estimates.index)).values,
+        })
+        return {'categories': result.sort_values('total_amount', ascending=False, kind='stable')
+                .reset_index(drop=True)}
+
+    def _suspicious_activity_detection(self, rows, sizes):
+        large = (rows['amount'] > LARGE_AMOUNT).to_numpy()
+        users = self.estimate(rows, sizes, ['user_id'], large)
+        users = users[users['count'] > LARGE_MIN_COUNT]
+        result = pd.DataFrame({
+            'user_id': users.index.astype('int64'),
+            'large_transactions': sqlite_round(users['count'], 0).astype('int64').values,
+            'large_transactions_ci': sqlite_round(users['count_ci'], 0).astype('int64').values,
+            'total_large_amount': sqlite_round(users['sum']).values,
+            'total_large_amount_ci': sqlite_round(users['sum_ci']).values,
+        }).sort_values('total_large_amount', ascending=False, kind='stable').reset_index(drop=True)
+        top = self.top_large if self.top_large is not None else pd.DataFrame(columns=TOP_COLUMNS)
+        return {'large_users': result, 'top_transactions': top.reset_index(drop=True)}
+
+    def _user_behavior_analysis(self, rows, sizes):
+        users = self.estimate(rows, sizes, ['user_id'])
+        top = users.sort_values('sum', ascending=False, kind='stable').head(10)
+        return {'top_users': pd.DataFrame({
+            'user_id': top.index.astype('int64'),
+            'transaction_count': sqlite_round(top['count'], 0).astype('int64').values,
+            'transaction_count_ci': sqlite_round(top['count_ci'], 0).astype('int64').values,
+            'total_volume': sqlite_round(top['sum']).values,
+            'total_volume_ci': sqlite_round(top['sum_ci']).values,
+            'avg_transaction': sqlite_round(top['mean']).values,
+            'avg_transaction_ci': sqlite_round(top['mean_ci']).values,
+        })}
+
+    def _monthly_trends(self, rows, sizes):
+        months = self.estimate(rows.assign(month=month_of(rows['transaction_date'])), sizes, ['month'])
+        months = months.sort_index()
+        return {'months': pd.DataFrame({
+            'month': months.index.astype(str),
+            'transaction_count': sqlite_round(months['count'], 0).astype('int64').values,
+            'transaction_count_ci': sqlite_round(months['count_ci'], 0).astype('int64').values,
+            'monthly_volume': sqlite_round(months['sum']).values,
+            'monthly_volume_ci': sqlite_round(months['sum_ci']).values,
+            'avg_monthly_transaction': sqlite_round(months['mean']).values,
+            'avg_monthly_transaction_ci': sqlite_round(months['mean_ci']).values,
+        })}
+
+    def _aml_compliance_check(self, rows, sizes):
+        mask = aml_mask(rows).to_numpy()
+        users, users_ci = self.suspicious_users.interval(self.confidence)
+        if not mask.any():
+            return {'summary': pd.DataFrame({
+                'total_suspicious': [0], 'total_suspicious_ci': [0],
+                'suspicious_volume': [np.nan], 'suspicious_volume_ci': [np.nan],
+                'users_involved': [0], 'users_involved_ci': [0]})}
+        flagged = self.estimate(rows, sizes, mask=mask).iloc[0]
+        return {'summary': pd.DataFrame({
+            'total_suspicious': [int(sqlite_round(flagged['count'], 0))],
+            'total_suspicious_ci': [int(sqlite_round(flagged['count_ci'], 0))],
+            'suspicious_volume': [sqlite_round(flagged['sum'])],
+            'suspicious_volume_ci': [sqlite_round(flagged['sum_ci'])],
+            'users_involved': [int(sqlite_round(users, 0))], 'users_involved_ci': [int(sqlite_round(users_ci, 0))],
+        })}
+
+    def _sections(self, sections, per_stratum):
+        rows, sizes = self.subsample(per_stratum)
+        return {name: getattr(self, f'_{name}')(rows, sizes) for name in sections}, sizes
+
+    @staticmethod
+    def relative_error(tables):
+        """Наибольшая относительная погрешность итогов HEADLINE_COLUMNS среди разделов tables.
+
+        Для таблицы по группам (категории, месяцы) - средняя погрешность групп,
+        взвешенная по их объему: неполный крайний месяц не определяет ее один.
+        Без итогов HEADLINE_COLUMNS проверяются все оцененные колонки.
+        """
+        columns = [(section, table, column) for section, table, column in HEADLINE_COLUMNS if section in tables]
+        if not columns:
+            columns = [(section, name, column[:-len('_ci')]) for section, result in tables.items()
+                       for name, table in result.items() for column in table.columns if column.endswith('_ci')]
+        errors = []
+        for section, table, column in columns:
+            table = tables[section][table]
+            values = table[column].abs().sum()
+            if len(table) and values > 0:
+                errors.append(float(table[f'{column}_ci'].sum() / values))
+        return max(errors) if errors else 0.0
+
+    def report(self, sections, target_error=None, time_budget=None):
+        """Таблицы разделов sections и сведения о точности.
+
+        Без target_error и time_budget используется вся выборка. Иначе оценка
+        начинается с INITIAL_PER_STRATUM строк на страту и удваивает их, пока
+        относительная погрешность больше target_error и следующий шаг
+        укладывается в time_budget секунд.
+        """
+        if self.rows is None:
+            raise ValueError("Выборка пуста: нет ни одной транзакции")
+        start = time.perf_counter()
+        largest = int(self.rows['_rank'].max()) + 1
+        per_stratum = largest if target_error is None and time_budget is None \
+            else min(INITIAL_PER_STRATUM, largest)
+        while True:
+            step = time.perf_counter()
+            tables, sizes = self._sections(sections, per_stratum)
+            error = self.relative_error(tables)
+            elapsed = time.perf_counter() - start
+            if per_stratum >= largest or (target_error is not None and error <= target_error):
+                break
+            # Следующий шаг примерно вдвое дороже текущего
+            if time_budget is not None and elapsed + 2 * (time.perf_counter() - step) > time_budget:
+                break
+            per_stratum = min(per_stratum * 2, largest)
+        info = {'sample_rows': int(sizes.sum()), 'population': int(self.population.sum()),
+                'per_stratum': per_stratum, 'confidence': self.confidence,
+                'relative_error': round(error, 6), 'seconds': round(time.perf_counter() - start, 6)}
+        return tables, info
+
+    # --- Графики ---
+
+    def cube(self, per_stratum=None):
+        """AggregateCube по выборке, счетчики и суммы которого домножены на веса страт"""
+        if self.strata != DEFAULT_STRATA:
+            raise ValueError(f"Куб графиков разбит по {DEFAULT_STRATA}, а выборка - по {self.strata}")
+        rows, sizes = self.subsample(per_stratum)
+        cube = AggregateCube().update(rows.drop(columns=['_stratum', '_key', '_rank']))
+        present = sizes > 0
+        index = pd.MultiIndex.from_tuples([key for key, ok in zip(self.keys, present) if ok], names=self.strata)
+        return cube.scale(pd.Series(self.population[present] / sizes[present], index=index))
+
+    def chart_data(self, per_stratum=None):
+        """Входы графиков BankDataVisualizer по выборке с интервалами для динамики и топа пользователей"""
+        rows, sizes = self.subsample(per_stratum)
+        chart_data = self.cube(per_stratum).chart_data()
+
+        # Интервалы для точек динамики на том же уровне свертки, что и сам ряд
+        dates = pd.to_datetime(rows['transaction_date'])
+        hours = pd.DatetimeIndex(dates.dt.floor('h'))
+        periods = _period_start(hours, chart_data.get('temporal_level', 'day'))
+        trend = self.estimate(rows.assign(period=periods), sizes, ['period'])
+        chart_data['temporal_ci'] = trend['sum_ci'].reindex(pd.DatetimeIndex(chart_data['temporal_trends']['date'])) \
+            .fillna(0).to_numpy()
+
+        users = self.estimate(rows, sizes, ['user_id'])
+        top = chart_data['top_users']
+        chart_data['top_users_ci'] = users['sum_ci'].reindex(top.index).fillna(0).to_numpy()
+        return chart_data
@@ -0,0 +1,202 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Размеры данных по умолчанию (строк)
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Группы замеров; каждая выполняется в отдельном процессе, чтобы пик RSS не смешивался
+GROUPS = ('generate', 'analyzer', 'visualizer')
+
+# Фикстуры детерминированы: одинаковые данные для сравнения версий
+SEED = 42
+END_DATE = datetime(2025, 3, 1)
+
+# Рост времени относительно базового прогона, который считается регрессией
+REGRESSION_THRESHOLD = 0.10
+
+
+def _peak_rss_mb():
+    """Пиковый RSS текущего процесса в МБ (ru_maxrss: КБ в Linux, байты в macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _fixture_path(fixture_dir, rows):
+    return os.path.join(fixture_dir, f'bank_{rows}.csv')
+
+
+def _generate(rows, path):
+    from generate_data import generate_transactions
+    return generate_transactions(rows, output_file=path, seed=SEED, schema='bank', end_date=END_DATE)
+
+
+def _measure(results, case, rows, repeat, func):
+    """Лучшее из repeat время вызова func и пиковый RSS после него"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results.append({'case': case, 'rows': rows, 'seconds': round(best, 6),
+                    'rows_per_sec': round(rows / best, 1) if best else None,
+                    'peak_rss_mb': round(_peak_rss_mb(), 1)})
+
+
+def _run_group(task):
+    """Замеры одной группы (выполняется в отдельном процессе)"""
+    group, rows, path, repeat = task
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    results = []
+    baseline_rss = _peak_rss_mb()
+
+    if group == 'generate':
+        _measure(results, 'generate', rows, repeat, lambda: _generate(rows, path))
+
+    elif group == 'analyzer':
+        from sql import BankTransactionAnalyzer
+        analyzers = []
+
+        def build_analyzer():
+            if analyzers:
+                analyzers.pop().close()
+            analyzers.append(BankTransactionAnalyzer(path))
+
+        _measure(results, 'analyzer_init', rows, repeat, build_analyzer)
+        analyzer = analyzers[-1]
+        for name in BankTransactionAnalyzer.SECTIONS:
+            _measure(results, f'section.{name}', rows, repeat, getattr(analyzer, f'_query_{name}'))
+        analyzer.close()
+
+    elif group == 'visualizer':
+        from visualization import BankDataVisualizer, _pyplot
+        plt = _pyplot()
+        visualizer = BankDataVisualizer(path)
+
+        def build_chart_data():
+            visualizer._cube = visualizer._chart_data = None
+            visualizer.chart_data()
+
+        _measure(results, 'chart_data', rows, repeat, build_chart_data)
+        for panel in BankDataVisualizer.PANELS:
+            def draw(panel=panel):
+                # Время панели включает растеризацию, а не только создание объектов
+                fig, ax = plt.subplots(figsize=(5, 4))
+                getattr(visualizer, panel)(ax)
+                fig.canvas.draw()
+                plt.close(fig)
+            _measure(results, f'plot.{panel.replace("_plot_", "")}', rows, repeat, draw)
+
+    for result in results:
+        result['group'] = group
+        result['baseline_rss_mb'] = round(baseline_rss, 1)
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment():
+    import numpy
+    import pandas
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'revision': _git_revision(),
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, groups=GROUPS, repeat=1, fixture_dir='data/benchmarks/fixtures',
+                   output=None):
+    """Прогон замеров на всех размерах; результаты сохраняются в JSON и возвращаются.
+
+    Для каждого размера группы generate, analyzer, visualizer выполняются
+    каждая в новом процессе (spawn). По каждому замеру фиксируются время
+    (лучшее из repeat), строк в секунду и пиковый RSS процесса группы.
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for rows in sizes:
+        path = _fixture_path(fixture_dir, rows)
+        if 'generate' not in groups and not os.path.exists(path):
+            _generate(rows, path)
+        for group in groups:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                group_results = pool.submit(_run_group, (group, rows, path, repeat)).result()
+            for result in group_results:
+                print(f" {rows:>10} {result['case']:<40} {result['seconds']:>10.4f} с "
+                      f"{result['rows_per_sec'] or 0:>14.0f} строк/с {result['peak_rss_mb']:>8.1f} МБ")
+            results.extend(group_results)
+
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'repeat': repeat,
+              'environment': _environment(), 'results': results}
+    if output is None:
+        output = os.path.join('data/benchmarks', f"results-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Результаты сохранены: {output}")
+    return report
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Сравнение двух прогонов по (case, rows); возвращает список регрессий"""
+    previous = {(r['case'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    print(f" {'замер':<40} {'строк':>10} {'было, с':>10} {'стало, с':>10} {'x':>6}")
+    for result in current['results']:
+        old = previous.get((result['case'], result['rows']))
+        if old is None or not old['seconds']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        mark = ''
+        if ratio > 1 + threshold:
+            regressions.append((result['case'], result['rows'], ratio))
+            mark = ' РЕГРЕССИЯ'
+        print(f" {result['case']:<40} {result['rows']:>10} {old['seconds']:>10.4f} "
+              f"{result['seconds']:>10.4f} {ratio:>6.2f}{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры генерации, анализа и отрисовки графиков')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--fixtures', default='data/benchmarks/fixtures')
+    parser.add_argument('--output')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.groups, args.repeat, args.fixtures, args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"Регрессий: {len(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Модули, которые импортирует каждая подкоманда; тяжелый стек графиков - только у render
+COMMAND_MODULES = {
+    'generate': ['generate_data'],
+    'analyze': ['sql'],
+    'render': ['visualization', 'matplotlib.pyplot', 'seaborn'],
+    'serve': ['service'],
+}
+
+# Потолок времени импорта для холодного старта analyze, с
+ANALYZE_IMPORT_BUDGET = 1.0
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _unknown(kind, names, known):
+    """Сообщение о неизвестных именах (код возврата 2, как у ошибок argparse)"""
+    unknown = [name for name in names or [] if name not in known]
+    if unknown:
+        print(f"Неизвестные {kind}: {', '.join(unknown)}. Доступны: {', '.join(known)}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def _generate(args):
+    from generate_data import generate_transactions
+    end_date = None
+    if args.end_date:
+        from datetime import datetime
+        end_date = datetime.fromisoformat(args.end_date)
+    generate_transactions(args.rows, output_file=args.output, chunk_size=args.chunk_size, seed=args.seed,
+                          schema=args.schema, end_date=end_date, shards=args.shards, workers=args.workers)
+    return 0
+
+
+def _segment(args):
+    """Условия среза из аргументов --start, --end, --users, --categories, --locations, --merchants, --types"""
+    segment = {'start': args.start, 'end': args.end, 'user_ids': args.users, 'categories': args.categories,
+               'locations': args.locations, 'merchants': args.merchants, 'transaction_types': args.types}
+    return {key: value for key, value in segment.items() if value is not None}
+
+
+def _add_segment_arguments(parser):
+    parser.add_argument('--start', help='начало диапазона дат, YYYY-MM-DD[ HH:MM]')
+    parser.add_argument('--end', help='конец диапазона дат включительно')
+    parser.add_argument('--users', nargs='+', type=int, help='user_id')
+    parser.add_argument('--categories', nargs='+')
+    parser.add_argument('--locations', nargs='+')
+    parser.add_argument('--merchants', nargs='+')
+    parser.add_argument('--types', nargs='+', help='типы операций: debit, credit')
+
+
+def _analyze(args):
+    from sql import BankTransactionAnalyzer
+    if _unknown('разделы', args.sections, BankTransactionAnalyzer.SECTIONS):
+        return 2
+    analyzer = BankTransactionAnalyzer(args.source, db_file=args.db_file, out_of_core=args.out_of_core,
+                                       memory_limit_mb=args.memory_limit_mb)
+    try:
+        if args.mode == 'approximate':
+            from approximate import DEFAULT_CAPACITY
+            analyzer.approximate(args.sample_file, capacity=args.capacity or DEFAULT_CAPACITY,
+                                 target_error=args.target_error, time_budget=args.time_budget)
+        report = analyzer.analyze(args.mode, args.workers, args.sections, _segment(args))
+        if args.format == 'json':
+            payload = report.to_json()
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+            else:
+                print(payload)
+        else:
+            analyzer.render(report)
+            if report.meta and 'sample_rows' in report.meta:
+                print(f" Выборка: {report.meta['sample_rows']} из {report.meta['population']} строк, "
+                      f"относительная погрешность {report.meta['relative_error']:.2%}")
+            if report.meta and 'scan' in report.meta:
+                scan = report.meta['scan']
+                print(f" Партиции: прочитано {scan['scanned']} из {scan['partitions']}, отсечено {scan['pruned']}")
+            if report.timings():
+                print(" Время разделов, с: " + ", ".join(f"{name}={seconds:.3f}"
+                                                        for name, seconds in report.timings().items()))
+    finally:
+        analyzer.close()
+    return 0
+
+
+def _render(args):
+    # Окно не нужно: отрисовка из командной строки всегда в файлы
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    from visualization import BankDataVisualizer
+    if _unknown('графики', args.charts, [panel[len('_plot_'):] for panel in BankDataVisualizer.PANELS]):
+        return 2
+    visualizer = BankDataVisualizer(args.source, out_of_core=args.out_of_core, cube_file=args.cube_file)
+    segment = _segment(args)
+    if segment:
+        visualizer = visualizer.filtered(**segment)
+        if visualizer.scan_stats is not None:
+            print(f"Партиции: прочитано {visualizer.scan_stats['scanned']} из {visualizer.scan_stats['partitions']}")
+
+    if not args.charts:
+        paths = visualizer.create_comprehensive_dashboard(args.output, show=False, formats=args.formats,
+                                                          dpi=args.dpi)
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+        paths = [visualizer.save_panel(chart, os.path.join(args.output_dir, f'{chart}.{fmt}'), dpi=args.dpi)
+                 for chart in args.charts for fmt in args.formats or ['png']]
+    print("Сохраненные файлы:")
+    for path in paths:
+        print(f"   - {path}")
+    return 0
+
+
+def _serve(args):
+    from service import main as serve_main
+    return serve_main(args.args)
+
+
+def _benchmark(args):
+    from benchmark import main as benchmark_main
+    return benchmark_main(args.args)
+
+
+def measure_import_times(commands=None, repeat=3, top=0):
+    """Время импорта модулей каждой подкоманды в новом интерпретаторе (лучшее из repeat).
+
+    import_seconds - импорт cli и модулей подкоманды, process_seconds - запуск
+    интерпретатора целиком; top > 0 - самые тяжелые модули по python -X importtime.
+    """
+    results = []
+    for command in commands or list(COMMAND_MODULES):
+        code = ('import time; start = time.perf_counter(); import cli; '
+                + ''.join(f'import {module}; ' for module in COMMAND_MODULES[command])
+                + 'print(time.perf_counter() - start)')
+        best_import = best_process = None
+        heaviest = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=_ROOT,
+                                       capture_output=True, text=True, check=True,
+                                       env=dict(os.environ, MPLBACKEND='Agg'))
+            process = time.perf_counter() - start
+            imported = float(completed.stdout.strip().splitlines()[-1])
+            if best_import is None or imported < best_import:
+                best_import = imported
+                heaviest = _heaviest_imports(completed.stderr, top)
+            best_process = process if best_process is None else min(best_process, process)
+        results.append({'command': command, 'import_seconds': round(best_import, 4),
+                        'process_seconds': round(best_process, 4), 'heaviest': heaviest})
+    return results
+
+
+def _heaviest_imports(importtime_log, top):
+    """Модули первых двух уровней с наибольшим суммарным временем импорта из лога -X importtime"""
+    if top <= 0:
+        return []
+    modules = []
+    for line in importtime_log.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)', line)
+        # Отступ до двух пробелов - модули подкоманды и то, что они импортируют напрямую
+        if match and len(match.group(2)) <= 2:
+            modules.append((match.group(3), int(match.group(1)) / 1e6))
+    modules.sort(key=lambda item: -item[1])
+    return [{'module': name, 'seconds': round(seconds, 4)} for name, seconds in modules[:top]]
+
+
+def _import_times(args):
+    if _unknown('подкоманды', args.commands, list(COMMAND_MODULES)):
+        return 2
+    results = measure_import_times(args.commands, args.repeat, args.top)
+    print(f" {'команда':<10} {'импорт, с':>10} {'процесс, с':>11}")
+    for result in results:
+        print(f" {result['command']:<10} {result['import_seconds']:>10.3f} {result['process_seconds']:>11.3f}")
+        for module in result['heaviest']:
+            print(f"     {module['module']:<30} {module['seconds']:>8.3f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2, ensure_ascii=False)
+        print(f"Результаты сохранены: {args.output}")
+    slow = [r for r in results if r['command'] == 'analyze' and r['import_seconds'] > ANALYZE_IMPORT_BUDGET]
+    if slow:
+        print(f"Импорт для analyze дольше {ANALYZE_IMPORT_BUDGET} с")
+        return 1
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='Генерация данных, анализ транзакций и графики')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='синтетические транзакции в CSV')
+    generate.add_argument('rows', type=int, nargs='?', default=10000)
+    generate.add_argument('--output', default='data/transactions.csv')
+    generate.add_argument('--schema', choices=['basic', 'bank'], default='basic')
+    generate.add_argument('--seed', type=int)
+    generate.add_argument('--end-date', help='последняя дата, YYYY-MM-DD (по умолчанию - сейчас)')
+    generate.add_argument('--chunk-size', type=int, default=1_000_000)
+    generate.add_argument('--shards', type=int, default=1)
+    generate.add_argument('--workers', type=int, default=1)
+    generate.set_defaults(handler=_generate)
+
+    analyze = commands.add_parser('analyze', help='отчет по разделам (без импорта графиков)')
+    analyze.add_argument('source', nargs='?', default='data/transactions.csv')
+    analyze.add_argument('--sections', nargs='+', help='разделы отчета (по умолчанию все)')
+    analyze.add_argument('--mode', choices=['sql', 'fused', 'incremental', 'approximate'])
+    analyze.add_argument('--target-error', type=float, help='approximate: целевая относительная погрешность, 0.01 = 1%%')
+    analyze.add_argument('--time-budget', type=float, help='approximate: потолок времени уточнения, с')
+    analyze.add_argument('--capacity', type=int,
+                         help='approximate: строк выборки на страту (по умолчанию 20000)')
+    analyze.add_argument('--sample-file', help='approximate: файл сохраненной выборки')
+    analyze.add_argument('--workers', type=int, default=1)
+    analyze.add_argument('--db-file')
+    analyze.add_argument('--out-of-core', action='store_true')
+    analyze.add_argument('--memory-limit-mb', type=int)
+    _add_segment_arguments(analyze)
+    analyze.add_argument('--format', choices=['text', 'json'], default='text')
+    analyze.add_argument('--output', help='файл для --format json (по умолчанию stdout)')
+    analyze.set_defaults(handler=_analyze)
+
+    render = commands.add_parser('render', help='дашборд или отдельные графики в файлы')
+    render.add_argument('source', nargs='?', default='data/transactions.csv')
+    render.add_argument('--charts', nargs='+', help='графики (temporal_trends, ...); без них - весь дашборд')
+    render.add_argument('--output', default='data/banking_dashboard.png', help='файл дашборда')
+    render.add_argument('--output-dir', default='data/charts', help='каталог для --charts')
+    render.add_argument('--formats', nargs='+', help='расширения файлов: png, svg, ...')
+    render.add_argument('--dpi', type=int, default=300)
+    _add_segment_arguments(render)
+    render.add_argument('--out-of-core', action='store_true')
+    render.add_argument('--cube-file')
+    render.set_defaults(handler=_render)
+
+    serve = commands.add_parser('serve', help='сервис отчетов (аргументы service.py)', add_help=False)
+    serve.add_argument('args', nargs=argparse.REMAINDER)
+    serve.set_defaults(handler=_serve)
+
+    benchmark = commands.add_parser('benchmark', help='замеры производительности (аргументы benchmark.py)',
+                                    add_help=False)
+    benchmark.add_argument('args', nargs=argparse.REMAINDER)
+    benchmark.set_defaults(handler=_benchmark)
+
+    import_times = commands.add_parser('import-times', help='время импорта по подкомандам')
+    import_times.add_argument('commands', nargs='*', help=f"подкоманды ({', '.join(COMMAND_MODULES)})")
+    import_times.add_argument('--repeat', type=int, default=3)
+    import_times.add_argument('--top', type=int, default=0)
+    import_times.add_argument('--output')
+    import_times.set_defaults(handler=_import_times)
+    return parser
+
+
+# Подкоманды, все аргументы которых передаются в main своего модуля
+_PASSTHROUGH = {'serve': _serve, 'benchmark': _benchmark}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in _PASSTHROUGH:
+        return _PASSTHROUGH[argv[0]](argparse.Namespace(args=argv[1:]))
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,49 +1,184 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
-
-
-def generate_transactions(num_records=10000):
-    # Списки для генерации данных
-    categories = ['food', 'transport', 'shopping', 'entertainment', 'health', 'transfer', 'salary', 'withdrawal']
-    transaction_types = ['debit', 'credit']
-
-    # Генерация дат за последние 6 месяцев
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=180)
-
-    data = []
-    for i in range(num_records):
-        transaction_date = start_date + timedelta(
-            days=random.randint(0, 180),
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59)
-        )
-
-        amount = round(random.uniform(10, 50000), 2)
-        category = random.choice(categories)
-        transaction_type = random.choice(transaction_types)
-
-        # Подозрительные транзакции (большие суммы)
-        is_suspicious = amount > 30000 and transaction_type == 'debit'
-
-        data.append({
-            'transaction_id': i + 1,
-            'user_id': random.randint(1, 1000),
-            'amount': amount,
-            'transaction_type': transaction_type,
-            'category': category,
-            'transaction_date': transaction_date,
-            'merchant': f'Merchant_{random.randint(1, 100)}',
-            'is_suspicious': is_suspicious
-        })
-
-    df = pd.DataFrame(data)
-    df.to_csv('data/transactions.csv', index=False)
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+# Списки для генерации данных
+CATEGORIES = ['food', 'transport', 'shopping', 'entertainment', 'health', 'transfer', 'salary', 'withdrawal']
+TRANSACTION_TYPES = ['debit', 'credit']
+
+# Мерчанты по категориям (схема sql.py)
+BANK_MERCHANTS = {
+    'food': ['McDonalds', 'KFC', 'Burger King', ' grocery_store', 'Restaurant'],
+    'transport': ['Uber', 'Taxi', 'Metro', 'Bus', 'Gas Station'],
+    'shopping': ['Amazon', 'AliExpress', 'OZON', 'Wildberries', 'MVideo'],
+    'entertainment': ['Cinema', 'Netflix', 'Spotify', 'YouTube Premium', 'Club'],
+    'health': ['Pharmacy', 'Hospital', 'Dental Clinic', 'Fitness Club'],
+    'transfer': ['Bank Transfer', 'Peer-to-Peer', 'Remittance'],
+    'salary': ['Company Inc', 'Freelance', 'Investment'],
+    'withdrawal': ['ATM', 'Bank Branch', 'Cash withdrawal']
+}
+
+# Размер чанка, который генерируется и пишется на диск за один раз
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+_BASIC_MERCHANTS = [f'Merchant_{i}' for i in range(1, 101)]
+_BANK_MERCHANTS = [m for category in CATEGORIES for m in BANK_MERCHANTS[category]]
+_BANK_MERCHANT_SIZES = np.array([len(BANK_MERCHANTS[c]) for c in CATEGORIES])
+_BANK_MERCHANT_OFFSETS = np.concatenate([[0], np.cumsum(_BANK_MERCHANT_SIZES)[:-1]])
+_LOCATIONS = [f'City_{i}' for i in range(1, 11)]
+_SALARY = CATEGORIES.index('salary')
+
+
+def _random_dates(rng, size, start_date, days):
+    """Случайные даты в пределах days дней от start_date"""
+    offsets = (rng.integers(0, days + 1, size) * 86400
+               + rng.integers(0, 24, size) * 3600
+               + rng.integers(0, 60, size) * 60)
+    return np.datetime64(start_date, 'us') + offsets.astype('timedelta64[s]')
+
+
+def _basic_chunk(rng, first_id, size, start_date):
+    """Чанк в схеме generate_data.py"""
+    transaction_date = _random_dates(rng, size, start_date, 180)
+    amount = np.round(rng.uniform(10, 50000, size), 2)
+    category = rng.integers(0, len(CATEGORIES), size)
+    transaction_type = rng.integers(0, len(TRANSACTION_TYPES), size)
+
+    # Подозрительные транзакции (большие суммы)
+    is_suspicious = (amount > 30000) & (transaction_type == 0)
+
+    return pd.DataFrame({
+        'transaction_id': np.arange(first_id, first_id + size),
+        'user_id': rng.integers(1, 1001, size),
+        'amount': amount,
+        'transaction_type': pd.Categorical.from_codes(transaction_type, TRANSACTION_TYPES),
+        'category': pd.Categorical.from_codes(category, CATEGORIES),
+        'transaction_date': transaction_date,
+        'merchant': pd.Categorical.from_codes(rng.integers(0, 100, size), _BASIC_MERCHANTS),
+        'is_suspicious': is_suspicious
+    })
+
+
+def _bank_chunk(rng, first_id, size, start_date):
+    """Чанк в схеме sql.py: мерчанты по категориям, 70/30 суммы, location"""
+    transaction_date = _random_dates(rng, size, start_date, 90)
+
+    # Реалистичное распределение сумм: 70% мелкие, 30% крупные
+    small = rng.random(size) < 0.7
+    amount = np.where(small, rng.uniform(50, 5000, size), rng.uniform(5000, 50000, size))
+    amount = np.round(amount, 2)
+
+    category = rng.integers(0, len(CATEGORIES), size)
+    transaction_type = (category == _SALARY).astype(np.int8)
+    merchant = (_BANK_MERCHANT_OFFSETS[category]
+                + (rng.random(size) * _BANK_MERCHANT_SIZES[category]).astype(np.int64))
+
+    # Подозрительные транзакции
+    is_suspicious = ((amount > 30000) & (transaction_type == 0)) | (amount > 100000)
+
+    return pd.DataFrame({
+        'transaction_id': np.arange(first_id, first_id + size),
+        'user_id': rng.integers(1, 101, size),
+        'amount': amount,
+        'transaction_type': pd.Categorical.from_codes(transaction_type, TRANSACTION_TYPES),
+        'category': pd.Categorical.from_codes(category, CATEGORIES),
+        'transaction_date': transaction_date,
+        'merchant': pd.Categorical.from_codes(merchant, _BANK_MERCHANTS),
+        'is_suspicious': is_suspicious,
+        'location': pd.Categorical.from_codes(rng.integers(0, len(_LOCATIONS), size), _LOCATIONS)
+    })
+
+
+# schema -> (построитель чанка, глубина истории в днях, формат даты в CSV)
+SCHEMAS = {
+    'basic': (_basic_chunk, 180, None),
+    'bank': (_bank_chunk, 90, '%Y-%m-%d %H:%M:%S'),
+}
+
+
+def _write_shard(task):
+    """Генерация одного шарда в собственный файл (выполняется в отдельном процессе)"""
+    schema, seed_sequence, first_id, size, chunk_size, start_date, path = task
+    build_chunk, _, date_format = SCHEMAS[schema]
+    rng = np.random.default_rng(seed_sequence)
+
+    with open(path, 'w', newline='') as f:
+        for offset in range(0, size or 1, chunk_size):
+            chunk = build_chunk(rng, first_id + offset, min(chunk_size, size - offset), start_date)
+            chunk.to_csv(f, index=False, header=offset == 0, date_format=date_format)
+    return path
+
+
+def _shard_path(output_file, index):
+    stem, ext = os.path.splitext(output_file)
+    return f'{stem}.part-{index:05d}{ext}'
+
+
+def _merge_shards(paths, output_file):
+    """Склейка файлов шардов в один CSV (заголовок берется только из первого)"""
+    with open(output_file, 'wb') as out:
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as f:
+                if i > 0:
+                    f.readline()
+                shutil.copyfileobj(f, out)
+            os.remove(path)
+
+
+def generate_transactions(num_records=10000, output_file='data/transactions.csv',
+                          chunk_size=DEFAULT_CHUNK_SIZE, seed=None, schema='basic', end_date=None,
+                          shards=1, workers=1, merge=True):
+    """Векторная генерация транзакций чанками с потоковой записью в CSV.
+
+    В памяти одновременно находится не больше chunk_size строк на процесс.
+    num_records делится на shards непрерывных диапазонов transaction_id, у
+    каждого шарда свой независимый поток случайных чисел от seed, поэтому
+    результат зависит только от seed, end_date и shards, но не от workers.
+    При merge=True шарды склеиваются в output_file, иначе возвращается
+    список файлов шардов.
+    """
+    if schema not in SCHEMAS:
+        raise ValueError(f"Неизвестная схема данных: {schema}")
+    days = SCHEMAS[schema][1]
+
+    # Генерация дат за последние days дней
+    end_date = end_date or datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    seed_sequences = np.random.SeedSequence(seed).spawn(shards)
+    base, extra = divmod(num_records, shards)
+    tasks = []
+    first_id = 1
+    for i in range(shards):
+        size = base + (i < extra)
+        path = output_file if shards == 1 else _shard_path(output_file, i)
+        tasks.append((schema, seed_sequences[i], first_id, size, chunk_size, start_date, path))
+        first_id += size
+
+    if workers > 1 and shards > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            paths = list(pool.map(_write_shard, tasks))
+    else:
+        paths = [_write_shard(task) for task in tasks]
+
     print(f"Сгенерировано {num_records} транзакций")
-    return df
+    if shards == 1:
+        return output_file
+    if merge:
+        _merge_shards(paths, output_file)
+        return output_file
+    return paths
 
 
+# Генерация данных: то же, что python cli.py generate
 if __name__ == "__main__":
-    generate_transactions()
\ No newline at end of file
+    import sys
+    from cli import main
+    sys.exit(main(['generate'] + sys.argv[1:]))
@@ -0,0 +1,209 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+import pandas as pd
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах (вне Linux - пиковый, из getrusage)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Span:
+    """Интервал трассировки: длительность, строки, прирост RSS и атрибуты"""
+
+    __slots__ = ('name', 'category', 'attrs', 'thread', 'parent', 'start', 'duration', 'rows', 'memory_delta')
+
+    def __init__(self, name, category, attrs, thread, parent):
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.thread = thread
+        self.parent = parent
+        self.start = 0.0
+        self.duration = 0.0
+        self.rows = None
+        self.memory_delta = None
+
+    def set(self, rows=None, **attrs):
+        if rows is not None:
+            self.rows = rows
+        self.attrs.update(attrs)
+
+    def path(self):
+        """Имена от корня до интервала: 'analysis;section.basic_statistics;sql'"""
+        names = []
+        span = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return ';'.join(reversed(names))
+
+    def to_dict(self):
+        return {'name': self.name, 'category': self.category, 'path': self.path(), 'thread': self.thread,
+                'start': round(self.start, 6), 'duration': round(self.duration, 6), 'rows': self.rows,
+                'memory_delta': self.memory_delta, 'attrs': self.attrs}
+
+
+class _SpanContext:
+    def __init__(self, tracer, span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self):
+        self.tracer._open(self.span)
+        return self.span
+
+    def __exit__(self, *exc_info):
+        self.tracer._close(self.span)
+        return False
+
+
+class Tracer:
+    """Сбор интервалов работы анализатора и визуализатора.
+
+    explain - сохранять EXPLAIN QUERY PLAN для каждого SQL-запроса,
+    memory - считать прирост RSS за интервал. Интервалы вложены по потокам;
+    экспорт - JSON, Chrome trace (chrome://tracing, Perfetto, speedscope)
+    и свернутые стеки для flamegraph.pl.
+    """
+
+    enabled = True
+
+    def __init__(self, explain=True, memory=True):
+        self.explain = explain
+        self.memory = memory
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def span(self, name, category='', rows=None, **attrs):
+        """Контекстный менеджер интервала; внутри можно дописать span.set(rows=..., ...)"""
+        stack = self._stack()
+        span = Span(name, category, attrs, threading.get_ident(), stack[-1] if stack else None)
+        span.rows = rows
+        return _SpanContext(self, span)
+
+    def _open(self, span):
+        self._stack().append(span)
+        if self.memory:
+            span.memory_delta = current_rss()
+        span.start = time.perf_counter() - self._origin
+
+    def _close(self, span):
+        span.duration = time.perf_counter() - self._origin - span.start
+        if self.memory:
+            span.memory_delta = current_rss() - span.memory_delta
+        self._stack().pop()
+        with self._lock:
+            self.spans.append(span)
+
+    def iterate(self, chunks, name, category='load'):
+        """Итерация по чанкам, где получение каждого чанка - отдельный интервал с числом строк"""
+        iterator = iter(chunks)
+        while True:
+            with self.span(name, category) as span:
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    span.set(rows=0)
+                    return
+                span.set(rows=len(chunk))
+            yield chunk
+
+    def summary(self):
+        """Сводка по именам интервалов: число, суммарное время, строки, прирост памяти"""
+        if not self.spans:
+            return pd.DataFrame(columns=['count', 'seconds', 'rows', 'memory_delta_mb'])
+        frame = pd.DataFrame([{'name': s.name, 'seconds': s.duration, 'rows': s.rows or 0,
+                               'memory_delta_mb': (s.memory_delta or 0) / 2 ** 20} for s in self.spans])
+        result = frame.groupby('name').agg(count=('seconds', 'size'), seconds=('seconds', 'sum'),
+                                           rows=('rows', 'sum'), memory_delta_mb=('memory_delta_mb', 'sum'))
+        return result.sort_values('seconds', ascending=False).round(4)
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({'spans': [s.to_dict() for s in sorted(self.spans, key=lambda s: s.start)]},
+                      f, indent=2, ensure_ascii=False, default=str)
+        return path
+
+    def export_chrome_trace(self, path):
+        """Trace Event Format: полные события ('X') с временем в микросекундах"""
+        pid = os.getpid()
+        events = []
+        for span in sorted(self.spans, key=lambda s: s.start):
+            args = dict(span.attrs, rows=span.rows, memory_delta=span.memory_delta)
+            events.append({'name': span.name, 'cat': span.category or 'default', 'ph': 'X', 'pid': pid,
+                           'tid': span.thread, 'ts': round(span.start * 1e6, 3),
+                           'dur': round(span.duration * 1e6, 3), 'args': args})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False, default=str)
+        return path
+
+    def export_folded(self, path):
+        """Свернутые стеки для flamegraph.pl: 'a;b;c <собственное время, мкс>'"""
+        own = {}
+        for span in self.spans:
+            own[id(span)] = span.duration
+        for span in self.spans:
+            if span.parent is not None and id(span.parent) in own:
+                own[id(span.parent)] -= span.duration
+        totals = {}
+        for span in self.spans:
+            stack = span.path()
+            totals[stack] = totals.get(stack, 0) + max(own[id(span)], 0)
+        with open(path, 'w') as f:
+            for stack, seconds in totals.items():
+                f.write(f'{stack} {int(round(seconds * 1e6))}\n')
+        return path
+
+
+class _NullSpan:
+    def set(self, rows=None, **attrs):
+        pass
+
+
+class _NullContext:
+    def __init__(self):
+        self.span = _NullSpan()
+
+    def __enter__(self):
+        return self.span
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullTracer:
+    """Выключенная трассировка: один общий пустой контекст, ничего не записывается"""
+
+    enabled = False
+    explain = False
+    spans = ()
+    _context = _NullContext()
+
+    def span(self, name, category='', rows=None, **attrs):
+        return self._context
+
+    def iterate(self, chunks, name, category='load'):
+        return chunks
+
+
+NULL_TRACER = NullTracer()
@@ -0,0 +1,193 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from storage import (DEFAULT_CHUNKSIZE, MEMMAP_META, PARTITION_COLUMN, apply_filters, is_memmap_store,
+                     iter_transactions, month_of)
+
+# Ширина колонок при записи; после записи целые и коды сужаются до минимального типа
+_WIDE_INTEGER = np.dtype(np.int64)
+_WIDE_CODES = np.dtype(np.int32)
+
+# Размер блока (строк) при сужении колонок
+_BLOCK_ROWS = 1_000_000
+
+
+def _column_kind(values):
+    if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object \
+            or pd.api.types.is_string_dtype(values):
+        return 'dictionary'
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'datetime'
+    if pd.api.types.is_bool_dtype(values):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(values):
+        return 'integer'
+    return 'float'
+
+
+def _narrowest(low, high):
+    """Минимальный целый тип для значений из [low, high]"""
+    candidates = (np.uint8, np.uint16, np.uint32, np.uint64) if low >= 0 else (np.int8, np.int16, np.int32, np.int64)
+    for dtype in candidates:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError(f"Значения [{low}, {high}] не помещаются в int64")
+
+
+class _ColumnWriter:
+    """Дозапись одной колонки в сырой бинарный файл"""
+
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+        self.low, self.high = 0, 0
+        self.categories = {}
+        if kind == 'dictionary':
+            self.dtype = _WIDE_CODES
+        elif kind == 'integer':
+            self.dtype = _WIDE_INTEGER
+        elif kind == 'datetime':
+            self.dtype = np.dtype('datetime64[us]')
+        elif kind == 'bool':
+            self.dtype = np.dtype(bool)
+        else:
+            self.dtype = np.dtype(np.float64)
+        self.file = open(path, 'wb')
+
+    def write(self, values):
+        if self.kind == 'dictionary':
+            values = values.astype('category')
+            # Коды чанка переводятся в коды общего словаря в порядке первого появления
+            lookup = np.array([self.categories.setdefault(c, len(self.categories))
+                               for c in values.cat.categories] + [-1], dtype=self.dtype)
+            array = lookup[values.cat.codes.to_numpy()]
+        else:
+            array = values.to_numpy(dtype=self.dtype)
+        if self.kind in ('integer', 'dictionary') and len(array):
+            self.low, self.high = min(self.low, int(array.min())), max(self.high, int(array.max()))
+        self.file.write(np.ascontiguousarray(array).tobytes())
+
+    def finish(self, rows):
+        """Закрытие файла и сужение целых колонок; возвращает описание колонки"""
+        self.file.close()
+        spec = {'kind': self.kind, 'dtype': self.dtype.str}
+        if self.kind == 'dictionary':
+            spec['categories'] = list(self.categories)
+            narrow = _narrowest(-1, max(len(self.categories) - 1, 0))
+        elif self.kind == 'integer':
+            narrow = _narrowest(self.low, self.high)
+        else:
+            return spec
+        if narrow != self.dtype and rows:
+            wide = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(rows,))
+            with open(f'{self.path}.tmp', 'wb') as f:
+                for start in range(0, rows, _BLOCK_ROWS):
+                    f.write(wide[start:start + _BLOCK_ROWS].astype(narrow).tobytes())
+            del wide
+            os.replace(f'{self.path}.tmp', self.path)
+        spec['dtype'] = np.dtype(narrow).str
+        return spec
+
+
+def write_memmap_store(source, store_dir, chunksize=DEFAULT_CHUNKSIZE):
+    """Конвертация CSV или Parquet в колоночное хранилище для np.memmap.
+
+    Каждая колонка - отдельный файл фиксированной ширины, строки хранятся
+    кодами словаря. Источник читается чанками, поэтому может быть больше памяти.
+    """
+    if os.path.isdir(store_dir):
+        if not is_memmap_store(store_dir) and os.listdir(store_dir):
+            raise ValueError(f"Каталог {store_dir} не является хранилищем memmap")
+        shutil.rmtree(store_dir)
+    os.makedirs(store_dir)
+
+    writers = {}
+    rows = 0
+    for chunk in iter_transactions(source, chunksize=chunksize):
+        for column in chunk.columns:
+            if column not in writers:
+                if rows:
+                    raise ValueError(f"Колонка {column} появилась не в первом чанке")
+                writers[column] = _ColumnWriter(os.path.join(store_dir, f'{column}.bin'),
+                                                _column_kind(chunk[column]))
+            writers[column].write(chunk[column])
+        rows += len(chunk)
+
+    meta = {'rows': rows, 'columns': {name: writer.finish(rows) for name, writer in writers.items()}}
+    # Метаданные пишутся последними: без них каталог не считается хранилищем
+    with open(os.path.join(store_dir, MEMMAP_META), 'w') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    print(f"Хранилище memmap записано: {store_dir} ({rows} строк)")
+    return store_dir
+
+
+class MemmapStore:
+    """Колоночное хранилище транзакций, отображаемое в память (только чтение).
+
+    Колонки открываются через np.memmap в режиме 'r': процессы, открывшие
+    одно хранилище, делят одну копию страниц в кеше ОС, без разбора файла.
+    Числовые колонки кадров из frame/iter_frames ссылаются на отображение без
+    копирования, словарные собираются из кодов и словаря.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MEMMAP_META)) as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.schema = meta['columns']
+        self.columns = list(self.schema)
+
+    def array(self, name):
+        """Колонка как массив, отображенный в память (для словарных - коды)"""
+        dtype = np.dtype(self.schema[name]['dtype'])
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=dtype, mode='r', shape=(self.rows,))
+
+    def categories(self, name):
+        return self.schema[name].get('categories')
+
+    def _frame(self, arrays, start, stop):
+        data = {}
+        for name, array in arrays.items():
+            values = array[start:stop]
+            if self.schema[name]['kind'] == 'dictionary':
+                values = pd.Categorical.from_codes(values, self.categories(name))
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def iter_frames(self, columns=None, filters=None, chunksize=DEFAULT_CHUNKSIZE):
+        """Кадры по chunksize строк с проекцией columns и фильтрами в формате apply_filters"""
+        columns = self.columns if columns is None else columns
+        filter_columns = [f[0] for f in filters or []]
+        if PARTITION_COLUMN in filter_columns:
+            filter_columns.append('transaction_date')
+        names = [c for c in dict.fromkeys(columns + filter_columns) if c != PARTITION_COLUMN]
+        arrays = {name: self.array(name) for name in names}
+
+        for start in range(0, self.rows, chunksize):
+            chunk = self._frame(arrays, start, start + chunksize)
+            if filters:
+                if PARTITION_COLUMN in filter_columns:
+                    chunk[PARTITION_COLUMN] = month_of(chunk['transaction_date'])
+                chunk = apply_filters(chunk, filters)
+            yield chunk[columns]
+
+    def frame(self, columns=None, filters=None):
+        """Все строки одним кадром"""
+        if not filters:
+            columns = self.columns if columns is None else columns
+            return self._frame({name: self.array(name) for name in columns}, 0, self.rows)
+        chunks = list(self.iter_frames(columns, filters))
+        if not chunks:
+            return self._frame({name: self.array(name) for name in columns or self.columns}, 0, 0)
+        return pd.concat(chunks, ignore_index=True)
+
+
+if __name__ == "__main__":
+    write_memmap_store('data/transactions.csv', 'data/transactions_mmap')
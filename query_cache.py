@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Кеш результатов запросов: LRU в памяти и, опционально, файлы на диске.
+
+    Ключ - текст запроса, параметры и отпечаток данных, поэтому при
+    изменении данных старые записи просто перестают находиться.
+    Файлы на диске ограничены max_disk_mb: сверх него удаляются давно
+    не читанные записи (время последнего чтения - mtime файла).
+    """
+
+    def __init__(self, max_entries=256, cache_dir=None, max_disk_mb=512):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_mb = max_disk_mb
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(query, params, fingerprint):
+        payload = json.dumps([' '.join(query.split()), params, fingerprint], default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def get(self, key):
+        """Результат из кеша или None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.cache_dir and os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                value = pickle.load(f)
+            self._touch(key)
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, value)
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.cache_dir:
+            # Запись через временный файл, чтобы параллельный читатель не увидел половину
+            tmp_path = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            self._evict_disk()
+
+    def _touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            # Запись могли вытеснить между чтением и обновлением времени
+            pass
+
+    def _evict_disk(self):
+        """Удаление давно не читанных файлов, пока кеш на диске больше max_disk_mb"""
+        if self.max_disk_mb is None:
+            return
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        limit = self.max_disk_mb * 1024 * 1024
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self._entries)}
@@ -0,0 +1,199 @@
+import json
+
+import pandas as pd
+
+from storage import _require_pyarrow
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _table_json(value):
+    """JSON таблицы: DataFrame/Series - списком записей, собранных из столбцов, остальное - как есть.
+
+    Числа проходят через float Python, поэтому пишутся кратчайшим точным
+    представлением (685397890.66, а не 685397890.6599999666), пропуски - null.
+    """
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if not isinstance(value, pd.DataFrame):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    columns = []
+    for name in value.columns:
+        values = value[name]
+        if values.isna().any():
+            values = values.astype(object).where(values.notna(), None)
+        columns.append(values.tolist())
+    names = [str(name) for name in value.columns]
+    return json.dumps([dict(zip(names, row)) for row in zip(*columns)], ensure_ascii=False, default=_json_default)
+
+
+def _table(name):
+    return property(lambda self: self.tables[name], doc=f"Таблица '{name}'")
+
+
+class SectionResult:
+    """Результат раздела отчета: именованные таблицы (DataFrame) и время расчета.
+
+    Таблицы не форматируются при создании: печать - отдельный шаг
+    (BankTransactionAnalyzer.render), а to_json/to_arrow сериализуют
+    столбцы напрямую. result['имя'] работает, как со словарем таблиц.
+    """
+
+    name = None
+    TABLES = ()
+
+    def __init__(self, tables, seconds=None):
+        self.tables = dict(tables)
+        self.seconds = seconds
+
+    def __getitem__(self, key):
+        return self.tables[key]
+
+    def __contains__(self, key):
+        return key in self.tables
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def keys(self):
+        return self.tables.keys()
+
+    def items(self):
+        return self.tables.items()
+
+    def __repr__(self):
+        shapes = ', '.join(f'{key}={getattr(value, "shape", None)}' for key, value in self.tables.items())
+        return f'{type(self).__name__}({shapes})'
+
+    def to_dict(self):
+        """Таблицы списками записей"""
+        return {key: value.to_dict(orient='records') if isinstance(value, pd.DataFrame) else value
+                for key, value in self.tables.items()}
+
+    def to_json(self):
+        """JSON {'section', 'seconds', 'tables': {имя: [записи]}}"""
+        tables = ', '.join(f'{json.dumps(key)}: {_table_json(value)}' for key, value in self.tables.items())
+        return f'{{"section": {json.dumps(self.name)}, "seconds": {json.dumps(self.seconds)}, "tables": {{{tables}}}}}'
+
+    def to_arrow(self):
+        """Таблицы как pyarrow.Table; числовые столбцы передаются без копирования"""
+        pa = _require_pyarrow()
+        return {key: pa.Table.from_pandas(value, preserve_index=False) for key, value in self.tables.items()}
+
+
+class BasicStatistics(SectionResult):
+    name = 'basic_statistics'
+    TABLES = ('summary',)
+    summary = _table('summary')
+
+
+class CategoryAnalysis(SectionResult):
+    name = 'category_analysis'
+    TABLES = ('categories',)
+    categories = _table('categories')
+
+
+class SuspiciousActivity(SectionResult):
+    name = 'suspicious_activity_detection'
+    TABLES = ('large_users', 'top_transactions')
+    large_users = _table('large_users')
+    top_transactions = _table('top_transactions')
+
+    @property
+    def ranked_by_score(self):
+        """Пользователи ранжированы по скорам аномальности (anomaly_scores), а не по порогам"""
+        return 'total_score' in self.large_users.columns
+
+
+class UserBehavior(SectionResult):
+    name = 'user_behavior_analysis'
+    TABLES = ('top_users',)
+    top_users = _table('top_users')
+
+
+class MonthlyTrends(SectionResult):
+    name = 'monthly_trends'
+    TABLES = ('months',)
+    months = _table('months')
+
+
+class AmlCompliance(SectionResult):
+    name = 'aml_compliance_check'
+    TABLES = ('summary',)
+    summary = _table('summary')
+
+    @property
+    def total_suspicious(self):
+        return int(self.summary.iloc[0]['total_suspicious']) if len(self.summary) else 0
+
+
+SECTION_TYPES = {cls.name: cls for cls in (BasicStatistics, CategoryAnalysis, SuspiciousActivity,
+                                           UserBehavior, MonthlyTrends, AmlCompliance)}
+
+
+def section_result(name, tables, seconds=None):
+    """Типизированный результат раздела name из словаря таблиц (или готового результата)"""
+    if isinstance(tables, SectionResult):
+        return tables
+    return SECTION_TYPES[name](tables, seconds)
+
+
+class AnalysisReport:
+    """Результаты всех разделов в порядке отчета; report['имя раздела'] - SectionResult.
+
+    meta - сведения о расчете: точность приближенного отчета (размер
+    выборки, достигнутая относительная погрешность), срез данных и
+    отсечение партиций; у полного точного отчета - None.
+    """
+
+    def __init__(self, sections, mode=None, seconds=None, meta=None):
+        self.sections = {name: section_result(name, tables) for name, tables in sections.items()}
+        self.mode = mode
+        self.seconds = seconds
+        self.meta = meta
+
+    def __getitem__(self, name):
+        return self.sections[name]
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def __len__(self):
+        return len(self.sections)
+
+    def keys(self):
+        return self.sections.keys()
+
+    def items(self):
+        return self.sections.items()
+
+    def values(self):
+        return self.sections.values()
+
+    def __repr__(self):
+        return f'AnalysisReport(mode={self.mode!r}, sections={list(self.sections)})'
+
+    def timings(self):
+        return {name: result.seconds for name, result in self.sections.items() if result.seconds is not None}
+
+    def to_dict(self):
+        return {'mode': self.mode, 'seconds': self.seconds, 'meta': self.meta,
+                'sections': {name: result.to_dict() for name, result in self.sections.items()}}
+
+    def to_json(self):
+        sections = ', '.join(result.to_json() for result in self.sections.values())
+        return (f'{{"mode": {json.dumps(self.mode)}, "seconds": {json.dumps(self.seconds)}, '
+                f'"meta": {json.dumps(self.meta)}, "sections": [{sections}]}}')
+
+    def to_arrow(self):
+        """{раздел: {таблица: pyarrow.Table}}"""
+        return {name: result.to_arrow() for name, result in self.sections.items()}
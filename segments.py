@@ -0,0 +1,113 @@
+import json
+
+import pandas as pd
+
+from storage import apply_filters, sqlite_datetime_text
+
+# Списковые условия среза и колонки, к которым они относятся
+LIST_FIELDS = {
+    'user_ids': 'user_id',
+    'categories': 'category',
+    'locations': 'location',
+    'merchants': 'merchant',
+    'transaction_types': 'transaction_type',
+}
+
+# Условия, которые AggregateCube умеет применять без сырых строк
+CUBE_FIELDS = ('start', 'end', 'categories', 'transaction_types')
+
+
+def _values(values):
+    if values is None:
+        return None
+    if isinstance(values, (str, int)):
+        values = [values]
+    return tuple(values)
+
+
+class Segment:
+    """Срез транзакций: диапазон дат [start, end] и наборы пользователей, категорий, городов,
+    мерчантов и типов операций.
+
+    end без времени включает весь день. Срез переводится в условие WHERE
+    для SQLite (sql), фильтры storage (filters) - по ним Parquet-датасет
+    отсекает партиции-месяцы - или маску кадра (apply).
+    """
+
+    def __init__(self, start=None, end=None, user_ids=None, categories=None, locations=None, merchants=None,
+                 transaction_types=None):
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.end = pd.Timestamp(end) if end is not None else None
+        self.user_ids = _values(user_ids)
+        if self.user_ids is not None:
+            self.user_ids = tuple(int(user) for user in self.user_ids)
+        self.categories = _values(categories)
+        self.locations = _values(locations)
+        self.merchants = _values(merchants)
+        self.transaction_types = _values(transaction_types)
+
+    @classmethod
+    def of(cls, segment=None, **filters):
+        """Срез из Segment, словаря условий или именованных аргументов"""
+        if isinstance(segment, Segment):
+            return segment
+        return cls(**dict(segment or {}, **filters))
+
+    def to_dict(self):
+        """Заданные условия среза (даты - строками)"""
+        result = {}
+        for name in ('start', 'end') + tuple(LIST_FIELDS):
+            value = getattr(self, name)
+            if value is not None:
+                result[name] = str(value) if name in ('start', 'end') else list(value)
+        return result
+
+    def key(self):
+        """Строковый ключ среза для кешей и объединения одинаковых запросов"""
+        return json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False)
+
+    def __bool__(self):
+        return bool(self.to_dict())
+
+    def __repr__(self):
+        return f'Segment({self.to_dict()})'
+
+    @property
+    def cube_only(self):
+        """Срез применим к кубу графиков: только даты, категории и типы операций"""
+        return all(name in CUBE_FIELDS for name in self.to_dict())
+
+    def _upper(self):
+        """Верхняя граница дат: (оператор, значение); дата без времени - до конца дня"""
+        if self.end == self.end.normalize():
+            return '<', self.end + pd.Timedelta(days=1)
+        return '<=', self.end
+
+    def filters(self):
+        """Фильтры в формате storage.apply_filters / pyarrow"""
+        filters = []
+        if self.start is not None:
+            filters.append(('transaction_date', '>=', self.start))
+        if self.end is not None:
+            filters.append(('transaction_date',) + self._upper())
+        for name, column in LIST_FIELDS.items():
+            values = getattr(self, name)
+            if values is not None:
+                filters.append((column, 'in', list(values)))
+        return filters
+
+    def apply(self, frame):
+        """Строки кадра, попадающие в срез"""
+        return apply_filters(frame, self.filters()) if self else frame
+
+    def sql(self):
+        """Условие для WHERE и его параметры; границы дат - текстом в формате хранимых строк"""
+        conditions, params = [], []
+        for column, op, value in self.filters():
+            if op == 'in':
+                conditions.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                conditions.append(f'{column} {op} ?')
+                params.append(sqlite_datetime_text(value))
+        return ' AND '.join(conditions), params
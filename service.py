@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from segments import Segment
+from sql import BankTransactionAnalyzer
+
+_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+# Разрешение PNG по умолчанию: для веб-интерфейса достаточно экранного
+DEFAULT_DPI = 100
+
+
+class NotFound(KeyError):
+    """Неизвестный адрес, раздел или график: единственная ошибка, которая отдается как 404.
+
+    Наследует KeyError, чтобы вызывающий код, ловивший KeyError, работал как раньше;
+    прочие KeyError внутри вычислений - это ошибки сервиса (500).
+    """
+
+
+class ReportService:
+    """Долгоживущий сервис отчетов: данные загружаются один раз.
+
+    Разделы отчета и графики отдаются как JSON и PNG; тяжелые запросы и
+    отрисовка выполняются в исполнителях, не блокируя цикл событий.
+    Одинаковые запросы, пришедшие во время вычисления, ждут один общий
+    результат, а не запускают вычисление заново.
+    """
+
+    def __init__(self, csv_file='data/transactions.csv', db_file=None, workers=4, cube_file=None, **analyzer_kwargs):
+        self.source = csv_file
+        self.cube_file = cube_file
+        self.analyzer = BankTransactionAnalyzer(csv_file, db_file=db_file, **analyzer_kwargs)
+        # С файловой базой разделы идут параллельно на read-only соединениях,
+        # с базой в памяти - по очереди через одно соединение анализатора
+        self.workers = workers if db_file is not None else 1
+        self._queries = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-query')
+        # Отчет целиком (fused, incremental, approximate) меняет состояние анализатора:
+        # section_timings, scan_stats, поддерживаемые агрегаты и выборку - такие отчеты по очереди
+        self._reports = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-full')
+        # pyplot не потокобезопасен: вся отрисовка - в одном потоке
+        self._renders = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-render')
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._visualizer = None
+        self._inflight = {}
+        self.computations = 0
+        self.coalesced = 0
+
+    async def _coalesced(self, key, executor, func, *args):
+        """Результат func(*args) в executor; одинаковые одновременные запросы (key) ждут одно вычисление"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.computations += 1
+        else:
+            self.coalesced += 1
+        # Отмена одного ожидающего не отменяет общее вычисление
+        return await asyncio.shield(future)
+
+    def _connection(self):
+        if self.analyzer.db_file is None:
+            return None
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = self.analyzer._read_only_connection()
+            with self._lock:
+                self._connections.append(self._local.conn)
+        return self._local.conn
+
+    def _compute_section(self, name, segment):
+        return self.analyzer.section(name, self._connection(), segment).to_json()
+
+    def _compute_report(self, mode, segment):
+        if mode == 'sql':
+            raise ValueError("Режим 'sql' собирается из отдельных разделов")
+        return self.analyzer.analyze(mode, segment=segment).to_json()
+
+    async def section(self, name, segment=None):
+        """JSON раздела отчета name (из BankTransactionAnalyzer.SECTIONS) для среза segment"""
+        if name not in BankTransactionAnalyzer.SECTIONS:
+            raise NotFound(f"Неизвестный раздел: {name}")
+        if self.analyzer.conn is None:
+            raise ValueError("Без базы разделы доступны только в отчете целиком (mode='fused')")
+        segment = Segment.of(segment)
+        return await self._coalesced(('section', name, segment.key()), self._queries, self._compute_section,
+                                     name, segment)
+
+    async def report(self, mode=None, segment=None):
+        """JSON всех разделов; в режиме 'sql' разделы считаются параллельно и делятся с section()"""
+        mode = mode or ('fused' if self.analyzer.conn is None else 'sql')
+        segment = Segment.of(segment)
+        if mode != 'sql':
+            return await self._coalesced(('report', mode, segment.key()), self._reports, self._compute_report,
+                                         mode, segment)
+        sections = await asyncio.gather(*(self.section(name, segment) for name in BankTransactionAnalyzer.SECTIONS))
+        return f'{{"mode": "sql", "sections": [{", ".join(sections)}]}}'
+
+    def visualizer(self):
+        """Визуализатор строится при первом графике: нужен только куб агрегатов, без сырых строк"""
+        if self._visualizer is None:
+            from visualization import BankDataVisualizer
+            self._visualizer = BankDataVisualizer(self.source, columns=self.analyzer.columns,
+                                                  filters=self.analyzer.filters, out_of_core=True,
+                                                  chunksize=self.analyzer.chunksize, cube_file=self.cube_file,
+                                                  tracer=self.analyzer.tracer)
+        return self._visualizer
+
+    @staticmethod
+    def _panels():
+        from visualization import BankDataVisualizer
+        return [panel[len('_plot_'):] for panel in BankDataVisualizer.PANELS]
+
+    def _render_chart(self, panel, filters, dpi):
+        if panel not in self._panels():
+            raise NotFound(f"Неизвестный график: {panel}")
+        visualizer = self.visualizer()
+        if filters:
+            visualizer = visualizer.filtered(**filters)
+        buffer = io.BytesIO()
+        visualizer.save_panel(panel, buffer, dpi=dpi, format='png')
+        return buffer.getvalue()
+
+    def _render_dashboard(self, dpi):
+        buffer = io.BytesIO()
+        self.visualizer().create_comprehensive_dashboard(buffer, show=False, dpi=dpi)
+        return buffer.getvalue()
+
+    async def chart(self, panel, segment=None, dpi=DEFAULT_DPI):
+        """PNG панели дашборда panel ('temporal_trends', ...) для среза данных segment.
+
+        matplotlib и визуализатор импортируются в потоке отрисовки, а не в цикле событий.
+        """
+        segment = Segment.of(segment)
+        filters = segment.to_dict()
+        key = ('chart', panel, segment.key(), dpi)
+        return await self._coalesced(key, self._renders, self._render_chart, panel, filters, dpi)
+
+    async def dashboard(self, dpi=DEFAULT_DPI):
+        """PNG полного дашборда"""
+        return await self._coalesced(('dashboard', dpi), self._renders, self._render_dashboard, dpi)
+
+    def stats(self):
+        return {'source': self.source, 'workers': self.workers, 'computations': self.computations,
+                'coalesced': self.coalesced, 'inflight': len(self._inflight)}
+
+    async def dispatch(self, method, target):
+        """Маршрутизация HTTP-запроса: (статус, Content-Type, тело)"""
+        if method != 'GET':
+            return 405, 'application/json', json.dumps({'error': 'Поддерживается только GET'})
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+
+        def param(name, default=None):
+            return query[name][-1] if name in query else default
+
+        def param_list(name):
+            if name not in query:
+                return None
+            return [item for value in query[name] for item in value.split(',') if item]
+
+        if parts == ['health']:
+            return 200, 'application/json', json.dumps({'status': 'ok'})
+        if parts == ['stats']:
+            return 200, 'application/json', json.dumps(self.stats(), ensure_ascii=False)
+        if parts == ['sections']:
+            return 200, 'application/json', json.dumps(list(BankTransactionAnalyzer.SECTIONS))
+        # Срез: ?start=&end=&user=&category=&location=&merchant=&type= (списки - через запятую)
+        segment = {'start': param('start'), 'end': param('end'), 'categories': param_list('category'),
+                   'locations': param_list('location'), 'merchants': param_list('merchant'),
+                   'transaction_types': param_list('type'),
+                   'user_ids': [int(user) for user in param_list('user')] if 'user' in query else None}
+        segment = {key: value for key, value in segment.items() if value is not None}
+
+        if len(parts) == 2 and parts[0] == 'sections':
+            return 200, 'application/json', await self.section(parts[1], segment)
+        if parts == ['report']:
+            return 200, 'application/json', await self.report(param('mode'), segment)
+        if parts == ['charts']:
+            panels = await asyncio.get_running_loop().run_in_executor(self._renders, self._panels)
+            return 200, 'application/json', json.dumps(panels)
+        if len(parts) == 2 and parts[0] == 'charts' and parts[1].endswith('.png'):
+            image = await self.chart(parts[1][:-len('.png')], segment, dpi=int(param('dpi', DEFAULT_DPI)))
+            return 200, 'image/png', image
+        if parts == ['dashboard.png']:
+            return 200, 'image/png', await self.dashboard(int(param('dpi', DEFAULT_DPI)))
+        raise NotFound(f"Неизвестный адрес: {url.path}")
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            try:
+                method, target = request_line.split()[:2]
+                status, content_type, body = await self.dispatch(method, target)
+            except NotFound as e:
+                status, content_type, body = 404, 'application/json', json.dumps({'error': e.args[0]},
+                                                                                 ensure_ascii=False)
+            except ValueError as e:
+                status, content_type, body = 400, 'application/json', json.dumps({'error': str(e)},
+                                                                                 ensure_ascii=False)
+            except Exception as e:
+                status, content_type, body = 500, 'application/json', json.dumps({'error': repr(e)},
+                                                                                 ensure_ascii=False)
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+                content_type += '; charset=utf-8'
+            head = (f'HTTP/1.1 {status} {_STATUS[status]}\r\nContent-Type: {content_type}\r\n'
+                    f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n')
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """Запуск HTTP-сервера в текущем цикле событий"""
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await self.start(host, port)
+        print(f"Сервис отчетов запущен: http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._queries.shutdown(wait=True)
+        self._reports.shutdown(wait=True)
+        self._renders.shutdown(wait=True)
+        for conn in self._connections:
+            conn.close()
+        self.analyzer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Локальный сервис отчетов и графиков')
+    parser.add_argument('csv_file', nargs='?', default='data/transactions.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db-file')
+    parser.add_argument('--cube-file')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    service = ReportService(args.csv_file, db_file=args.db_file, workers=args.workers, cube_file=args.cube_file)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,109 +1,699 @@
 import pandas as pd
 import sqlite3
 import os
-from datetime import datetime, timedelta
-import random
-
-
-def generate_transactions(num_records=1000):
+import json
+import hashlib
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aggregates import TransactionAggregates
+from approximate import DEFAULT_CAPACITY, StratifiedSample
+from aml_stream import StreamingAMLDetector
+from anomaly import AnomalyScorer, anomalous_users, anomaly_summary, scored_transactions, top_anomalies
+from instrumentation import NULL_TRACER
+from results import AnalysisReport, section_result
+from segments import Segment
+from timeseries import TimeRollups
+from user_features import UserFeatureStore
+from generate_data import DEFAULT_CHUNK_SIZE, generate_transactions as _generate_transactions
+from storage import (DEFAULT_CHUNKSIZE, chunksize_for_memory, compact_frame, concat_frames, is_csv, iter_transactions,
+                     memory_footprint, month_of, read_transactions, scan_plan,
+                     source_fingerprint)
+
+# Настройки файловой базы: WAL, отображение в память и большой кеш страниц
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=1073741824',
+    'PRAGMA cache_size=-262144',
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Индексы под запросы отчета; дополнительные колонки делают их покрывающими
+SQLITE_INDEXES = {
+    'idx_transactions_user': 'user_id, amount, category',
+    'idx_transactions_amount': 'amount',
+    'idx_transactions_type_category': 'transaction_type, category, amount',
+    'idx_transactions_month': 'month, amount',
+    # Вторичные индексы для срезов (segments.Segment). Индекс по дате покрывает колонки всех
+    # разделов: срез по времени читает только свой диапазон индекса, без обращений к таблице
+    'idx_transactions_date': 'transaction_date, amount, user_id, category, transaction_type, is_suspicious, month',
+    'idx_transactions_location': 'location, transaction_date',
+    'idx_transactions_merchant': 'merchant, transaction_date',
+    'idx_transactions_category': 'category, transaction_date',
+}
+
+# Размер блока, по хешу которого проверяется, что CSV только дописывался
+_HASH_BLOCK = 65536
+
+
+def generate_transactions(num_records=1000, output_file='data/transactions.csv', seed=None,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
 
 
     """Генерация реалистичных банковских транзакций"""
     print(" Генерация данных...")
 
-    # Создаем папку data если её нет
-    os.makedirs('data', exist_ok=True)
-
-    categories = ['food', 'transport', 'shopping', 'entertainment', 'health', 'transfer', 'salary', 'withdrawal']
-    merchants = {
-        'food': ['McDonalds', 'KFC', 'Burger King', ' grocery_store', 'Restaurant'],
-        'transport': ['Uber', 'Taxi', 'Metro', 'Bus', 'Gas Station'],
-        'shopping': ['Amazon', 'AliExpress', 'OZON', 'Wildberries', 'MVideo'],
-        'entertainment': ['Cinema', 'Netflix', 'Spotify', 'YouTube Premium', 'Club'],
-        'health': ['Pharmacy', 'Hospital', 'Dental Clinic', 'Fitness Club'],
-        'transfer': ['Bank Transfer', 'Peer-to-Peer', 'Remittance'],
-        'salary': ['Company Inc', 'Freelance', 'Investment'],
-        'withdrawal': ['ATM', 'Bank Branch', 'Cash withdrawal']
-    }
-
-    # Генерация дат за последние 3 месяца
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=90)
-
-    data = []
-    for i in range(num_records):
-        transaction_date = start_date + timedelta(
-            days=random.randint(0, 90),
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59)
-        )
-
-        # Реалистичное распределение сумм
-        if random.random() < 0.7:  # 70% мелкие транзакции
-            amount = round(random.uniform(50, 5000), 2)
-        else:  # 30% крупные транзакции
-            amount = round(random.uniform(5000, 50000), 2)
-
-        category = random.choice(categories)
-        transaction_type = 'debit' if category != 'salary' else 'credit'
-        merchant = random.choice(merchants[category])
-
-        # Подозрительные транзакции
-        is_suspicious = (amount > 30000 and transaction_type == 'debit') or (amount > 100000)
-
-        data.append({
-            'transaction_id': i + 1,
-            'user_id': random.randint(1, 100),
-            'amount': amount,
-            'transaction_type': transaction_type,
-            'category': category,
-            'transaction_date': transaction_date.strftime('%Y-%m-%d %H:%M:%S'),
-            'merchant': merchant,
-            'is_suspicious': is_suspicious,
-            'location': f'City_{random.randint(1, 10)}'
-        })
-
-    df = pd.DataFrame(data)
-    df.to_csv('data/transactions.csv', index=False)
-    print(f"Сгенерировано {num_records} транзакций")
-    return df
+    # Мерчанты по категориям, распределение сумм 70/30 и location - схема 'bank'
+    return _generate_transactions(num_records, output_file=output_file, chunk_size=chunk_size,
+                                  seed=seed, schema='bank')
 
 
 class BankTransactionAnalyzer:
-    def __init__(self, csv_file='data/transactions.csv'):
-
-
-
-        """Инициализация анализатора"""
+    def __init__(self, csv_file='data/transactions.csv', columns=None, filters=None, db_file=None,
+                 chunksize=DEFAULT_CHUNKSIZE, out_of_core=False, memory_limit_mb=None, cache=None,
+                 tracer=None):
+
+
+
+        """Инициализация анализатора
+
+        csv_file - CSV, Parquet-датасет (см. storage.write_parquet_dataset) или
+        хранилище memmap (см. memmap_store.write_memmap_store),
+        columns/filters - проекция колонок и предикаты для чтения.
+        db_file - файловая база SQLite: строится один раз и при изменении
+        источника обновляется (дописанные в CSV строки догружаются инкрементально).
+        Без db_file данные, как и раньше, грузятся в базу в памяти.
+        out_of_core - данные не загружаются в память целиком: отчет считается
+        потоково по чанкам (mode='fused'), memory_limit_mb задает потолок памяти,
+        из которого выводится размер чанка.
+        cache - QueryCache для результатов запросов разделов.
+        tracer - instrumentation.Tracer: интервалы загрузки, запросов (с планом) и
+        разделов; по умолчанию трассировка выключена.
+        """
         if not os.path.exists(csv_file):
             print("Файл с данными не найден.")
-            generate_transactions(2000)
-
-        self.df = pd.read_csv(csv_file)
-        self.conn = sqlite3.connect(':memory:')
-        self.df.to_sql('transactions', self.conn, index=False, if_exists='replace')
-        print("База данных загружена")
-
-    def run_comprehensive_analysis(self):
-
-
-
-        """Полный анализ транзакций"""
+            generate_transactions(2000, output_file=csv_file)
+
+        self.source = csv_file
+        self.columns = columns
+        self.filters = filters
+        self.chunksize = chunksize_for_memory(csv_file, memory_limit_mb) if memory_limit_mb else chunksize
+        self.db_file = db_file
+        self.out_of_core = out_of_core
+        # Поддерживаемые агрегаты для инкрементального режима и строки, добавленные через append()
+        self.aggregates = None
+        self._pending = []
+        self.section_timings = {}
+        self.cache = cache
+        self.tracer = tracer or NULL_TRACER
+        # Хранилище признаков пользователей (см. user_features), включается user_features()
+        self.features = None
+        # Скоринг аномальности (см. anomaly_scores): скоры всех транзакций истории
+        self.scorer = None
+        self.scores = None
+        # Временные свертки (см. time_rollups): месячные тренды без прохода по строкам
+        self.rollups = None
+        self._rollups_path = None
+        # Стратифицированная выборка (см. approximate): приближенный отчет с доверительными интервалами
+        self.sample = None
+        self._sample_path = None
+        self._approximate_options = {}
+        # Отсечение партиций при последнем потоковом проходе по срезу (см. storage.scan_plan)
+        self.scan_stats = None
+        # База в памяти индексируется при первом запросе по срезу
+        self._indexed = False
+        # Версия строк из append(): цепочка хешей содержимого пачек (см. _data_fingerprint)
+        self._appended = ''
+
+        if db_file is None and out_of_core:
+            # Без файловой базы SQL-режим недоступен: база в памяти держала бы все данные
+            self._df = None
+            self.conn = None
+            print("Потоковый режим: данные читаются чанками")
+        elif db_file is None:
+            with self.tracer.span('load.read', 'load', source=csv_file) as span:
+                self._df = read_transactions(csv_file, columns=columns, filters=filters)
+                span.set(rows=len(self._df))
+            # Соединение можно передать в поток исполнителя (см. service), обращения к нему последовательны
+            self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+            with self.tracer.span('load.to_sql', 'load', rows=len(self._df)):
+                self._with_month(self._df).to_sql('transactions', self.conn, index=False, if_exists='replace')
+            print(f"База данных загружена: {len(self._df)} строк, {memory_footprint(self._df):.1f} МБ в памяти")
+        else:
+            # DataFrame в этом режиме не нужен для отчета и читается лениво
+            self._df = None
+            self.conn = sqlite3.connect(db_file, check_same_thread=False)
+            for pragma in SQLITE_PRAGMAS:
+                self.conn.execute(pragma)
+            with self.tracer.span('load.sync_database', 'load', db_file=db_file):
+                self._sync_database()
+            self._appended = dict(self.conn.execute('SELECT key, value FROM _source')).get('appended', '')
+        self._fingerprint = self._data_fingerprint()
+
+    @property
+    def df(self):
+        """Транзакции в виде DataFrame (в режиме db_file загружаются из базы при первом обращении)"""
+        if self._df is None:
+            with self.tracer.span('load.read', 'load', source=self.db_file or self.source) as span:
+                if self.db_file is not None:
+                    # Строки из append() есть только в базе, поэтому история читается из таблицы
+                    self._df = self._table_frame(pd.read_sql_query('SELECT * FROM transactions', self.conn))
+                else:
+                    self._df = read_transactions(self.source, columns=self.columns, filters=self.filters)
+                span.set(rows=len(self._df))
+        if self._pending:
+            self._df = concat_frames([self._df, *self._pending])
+            self._pending = []
+        return self._df
+
+    @staticmethod
+    def _table_frame(frame):
+        """Строки таблицы transactions в схеме источника: без колонки месяца, с компактными типами"""
+        return compact_frame(frame.drop(columns='month', errors='ignore'))
+
+    def _table_chunks(self, segment=None):
+        """Таблица transactions (или срез segment) чанками"""
+        where, params = self._where(segment)
+        chunks = pd.read_sql_query(f'SELECT * FROM transactions {where}', self.conn, params=params,
+                                   chunksize=self.chunksize)
+        for chunk in self.tracer.iterate(chunks, 'load.read_chunk'):
+            yield self._table_frame(chunk)
+
+    def _data_fingerprint(self):
+        """Отпечаток данных таблицы: путь к базе или источнику, состояние источника,
+        параметры загрузки и версия строк из append().
+
+        Отпечаток входит в ключ кеша запросов, поэтому разные базы одного источника
+        и разные дописанные пачки дают разные ключи, в том числе между процессами.
+        """
+        if self.db_file is not None:
+            return json.dumps([os.path.realpath(self.db_file),
+                               sorted(self.conn.execute('SELECT key, value FROM _source'))])
+        size, mtime = source_fingerprint(self.source)
+        return json.dumps([os.path.realpath(self.source), size, mtime, self.columns, self.filters,
+                           self._appended], default=str)
+
+    def _append_version(self, batch):
+        """Версия после дописывания batch: хеш предыдущей версии и строк пачки"""
+        digest = hashlib.sha1(self._appended.encode())
+        digest.update(pd.util.hash_pandas_object(batch, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _with_month(df):
+        """Предвычисленная колонка месяца для _monthly_trends"""
+        if 'transaction_date' not in df.columns:
+            return df
+        return df.assign(month=month_of(df['transaction_date']))
+
+    def _load_chunks(self, chunks):
+        for chunk in self.tracer.iterate(chunks, 'load.read_chunk'):
+            with self.tracer.span('load.to_sql', 'load', rows=len(chunk)):
+                self._with_month(chunk).to_sql('transactions', self.conn, index=False, if_exists='append')
+
+    def _block_hash(self, start, end):
+        with open(self.source, 'rb') as f:
+            f.seek(start)
+            return hashlib.sha1(f.read(end - start)).hexdigest()
+
+    def _source_state(self, size):
+        """Хеши начала файла и блока перед его концом"""
+        return {
+            'head': self._block_hash(0, min(size, _HASH_BLOCK)),
+            'tail': self._block_hash(max(0, size - _HASH_BLOCK), size),
+        }
+
+    def _is_append(self, stored, size):
+        """Источник - тот же CSV, в конец которого только дописали строки"""
+        if not is_csv(self.source) or 'size' not in stored:
+            return False
+        loaded = int(stored['size'])
+        if size <= loaded:
+            return False
+        state = self._source_state(loaded)
+        return stored.get('head') == state['head'] and stored.get('tail') == state['tail']
+
+    def _sync_database(self):
+        """Построение или инкрементальное обновление файловой базы"""
+        self.conn.execute('CREATE TABLE IF NOT EXISTS _source (key TEXT PRIMARY KEY, value TEXT)')
+        stored = dict(self.conn.execute('SELECT key, value FROM _source'))
+        size, mtime = source_fingerprint(self.source)
+        params = json.dumps([os.path.abspath(self.source), self.columns, self.filters], default=str)
+
+        if stored.get('params') == params and stored.get('size') == str(size) \
+                and stored.get('mtime') == str(mtime):
+            print("База данных актуальна")
+            self._ensure_indexes()
+            return
+
+        if stored.get('params') == params and self._is_append(stored, size):
+            self._load_chunks(iter_transactions(self.source, self.columns, self.filters,
+                                                self.chunksize, offset=int(stored['size'])))
+            print("База данных дополнена новыми транзакциями")
+        else:
+            self.conn.execute('DROP TABLE IF EXISTS transactions')
+            self.conn.execute("DELETE FROM _source WHERE key = 'appended'")
+            self._load_chunks(iter_transactions(self.source, self.columns, self.filters, self.chunksize))
+            print("База данных построена")
+        # Индексы, добавленные после построения базы, догоняются и у существующих баз
+        self._ensure_indexes()
+
+        state = {'params': params, 'size': size, 'mtime': mtime}
+        if is_csv(self.source):
+            state.update(self._source_state(size))
+        self.conn.executemany('INSERT OR REPLACE INTO _source (key, value) VALUES (?, ?)',
+                              [(key, str(value)) for key, value in state.items()])
+        self.conn.commit()
+
+    def _ensure_indexes(self):
+        """Создание недостающих индексов SQLITE_INDEXES по колонкам, которые есть в таблице"""
+        existing = {row[1] for row in self.conn.execute('PRAGMA table_info(transactions)')}
+        indexes = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        missing = {name: columns for name, columns in SQLITE_INDEXES.items()
+                   if name not in indexes and existing.issuperset(c.strip() for c in columns.split(','))}
+        if missing:
+            with self.tracer.span('load.index', 'load', indexes=list(missing)):
+                for name, columns in missing.items():
+                    self.conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON transactions ({columns})')
+                self.conn.execute('ANALYZE')
+            self.conn.commit()
+        self._indexed = True
+
+    # Разделы отчета в порядке вывода
+    SECTIONS = ('basic_statistics', 'category_analysis', 'suspicious_activity_detection',
+                'user_behavior_analysis', 'monthly_trends', 'aml_compliance_check')
+
+    def run_comprehensive_analysis(self, mode=None, workers=1, segment=None):
+
+
+
+        """Полный анализ транзакций с выводом отчета
+
+        mode='sql' - отдельный запрос к базе на каждый раздел,
+        mode='fused' - все разделы за один потоковый проход по данным,
+        mode='incremental' - из поддерживаемых агрегатов (см. append), без прохода по истории,
+        mode='approximate' - оценки по стратифицированной выборке с интервалами (см. approximate).
+        По умолчанию 'sql', а в потоковом режиме без базы - 'fused'.
+        workers > 1 - разделы в режиме 'sql' выполняются параллельно на пуле
+        read-only соединений к файловой базе; вывод остается в порядке SECTIONS.
+        Время каждого раздела сохраняется в section_timings.
+        segment - срез данных (см. analyze).
+        Возвращает results.AnalysisReport (см. analyze).
+        """
         print("\n" + "=" * 60)
         print("=" * 60)
 
-        self._basic_statistics()
-        self._category_analysis()
-        self._suspicious_activity_detection()
-        self._user_behavior_analysis()
-        self._monthly_trends()
-        self._aml_compliance_check()
+        report = self.analyze(mode, workers, segment=segment)
+        self.render(report)
+        if report.meta and 'sample_rows' in report.meta:
+            print(f" Выборка: {report.meta['sample_rows']} из {report.meta['population']} строк, "
+                  f"относительная погрешность {report.meta['relative_error']:.2%} "
+                  f"(доверие {report.meta['confidence']:.0%})")
+        if self.section_timings:
+            print(" Время разделов, с: " + ", ".join(f"{name}={seconds:.3f}"
+                                                    for name, seconds in self.section_timings.items()))
+        return report
+
+    def analyze(self, mode=None, workers=1, sections=None, segment=None):
+        """Результаты разделов без печати: results.AnalysisReport с таблицами по разделам.
+
+        sections - имена разделов из SECTIONS (по умолчанию все); в режиме 'sql'
+        запросы выполняются только для них.
+        segment - срез (segments.Segment или словарь его условий: start, end,
+        user_ids, categories, locations, merchants, transaction_types).
+        В режиме 'sql' срез становится условием WHERE по индексам, в режиме
+        'fused' - фильтрами чтения, по которым Parquet-датасет отсекает
+        партиции-месяцы (статистика - в scan_stats).
+        """
+        sections = self._sections(sections)
+        segment = Segment.of(segment)
+        if mode is None:
+            mode = 'fused' if self.conn is None else 'sql'
+        if segment and mode in ('incremental', 'approximate'):
+            raise ValueError(f"Режим '{mode}' считается по всей истории; для среза - 'sql' или 'fused'")
+        if mode == 'sql':
+            self._require_database()
+        self.section_timings = {}
+        self.scan_stats = None
+        meta = None
+        start = time.perf_counter()
+        with self.tracer.span('analysis', 'analysis', mode=mode, workers=workers, segment=segment.to_dict()):
+            if mode == 'fused':
+                results = self.fused_aggregates(segment).report()
+            elif mode == 'incremental':
+                results = self.maintain_aggregates().report()
+            elif mode == 'sql':
+                results = self._run_sections(workers, sections, segment)
+            elif mode == 'approximate':
+                sample = self.sample or self.approximate()
+                with self.tracer.span('approximate.report', 'analysis') as span:
+                    results, meta = sample.report(sections, **self._approximate_options)
+                    span.set(**meta)
+            else:
+                raise ValueError(f"Неизвестный режим анализа: {mode}")
+        if segment:
+            meta = dict(meta or {}, segment=segment.to_dict())
+            if self.scan_stats is not None:
+                meta['scan'] = self.scan_stats
+        return AnalysisReport({name: results[name] for name in sections}, mode,
+                              time.perf_counter() - start, meta=meta)
+
+    def _sections(self, sections):
+        """Имена разделов в порядке отчета; неизвестное имя - KeyError"""
+        if sections is None:
+            return list(self.SECTIONS)
+        unknown = [name for name in sections if name not in self.SECTIONS]
+        if unknown:
+            raise KeyError(f"Неизвестный раздел: {', '.join(unknown)}")
+        return [name for name in self.SECTIONS if name in sections]
+
+    def section(self, name, conn=None, segment=None):
+        """Результат одного раздела (режим 'sql') как results.SectionResult, без печати; segment - срез"""
+        self._sections([name])
+        if conn is None:
+            self._require_database()
+        return self._timed_section(name, conn, Segment.of(segment))[0]
+
+    def _require_database(self):
+        """Запросы разделов требуют базы; в потоковом режиме без db_file ее нет"""
+        if self.conn is None:
+            raise ValueError("Потоковый режим без db_file: SQL-разделы недоступны, отчет - в mode='fused'")
+
+    def _where(self, segment, *conditions):
+        """WHERE из условий раздела и среза segment: (текст, параметры)"""
+        params = []
+        conditions = list(conditions)
+        if segment:
+            if not self._indexed and self.db_file is None:
+                self._ensure_indexes()
+            clause, params = segment.sql()
+            conditions.append(clause)
+        return ('WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def render(self, report):
+        """Текстовый вывод результатов разделов (AnalysisReport или {раздел: таблицы})"""
+        for name in self.SECTIONS:
+            if name in report:
+                getattr(self, f'_render_{name}')(report[name])
+
+    def _read_sql(self, query, conn=None, params=None):
+        """Выполнение запроса раздела (через кеш результатов, если он задан)"""
+        conn = conn or self.conn
+        with self.tracer.span('sql', 'sql', query=' '.join(query.split())) as span:
+            if self.tracer.explain:
+                span.set(plan=self._query_plan(query, conn, params))
+            if self.cache is None:
+                result = pd.read_sql_query(query, conn, params=params)
+                span.set(rows=len(result))
+                return result
+
+            key = self.cache.key(query, params, self._fingerprint)
+            result = self.cache.get(key)
+            span.set(cached=result is not None)
+            if result is None:
+                result = pd.read_sql_query(query, conn, params=params)
+                self.cache.put(key, result)
+            span.set(rows=len(result))
+            return result.copy()
+
+    @staticmethod
+    def _query_plan(query, conn, params=None):
+        """Строки EXPLAIN QUERY PLAN запроса"""
+        rows = conn.execute(f'EXPLAIN QUERY PLAN {query}', params or ()).fetchall()
+        return [row[-1] for row in rows]
+
+    def _timed_section(self, name, conn=None, segment=None):
+        with self.tracer.span(f'section.{name}', 'section'):
+            start = time.perf_counter()
+            tables = getattr(self, f'_query_{name}')(conn, segment)
+            seconds = time.perf_counter() - start
+            return section_result(name, tables, seconds), seconds
+
+    def _run_sections(self, workers=1, sections=None, segment=None):
+        """Запросы разделов (по умолчанию всех), последовательно или на пуле соединений"""
+        sections = self.SECTIONS if sections is None else sections
+        if workers > 1 and self.db_file is None:
+            print(" Параллельный режим требует db_file, разделы выполняются последовательно")
+            workers = 1
+
+        if workers <= 1:
+            timed = {name: self._timed_section(name, segment=segment) for name in sections}
+        else:
+            local = threading.local()
+            connections = []
+            lock = threading.Lock()
+
+            def run(name):
+                # У каждого потока свое read-only соединение к общей файловой базе
+                if not hasattr(local, 'conn'):
+                    local.conn = self._read_only_connection()
+                    with lock:
+                        connections.append(local.conn)
+                return self._timed_section(name, local.conn, segment)
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {name: pool.submit(run, name) for name in sections}
+                timed = {name: future.result() for name, future in futures.items()}
+            for conn in connections:
+                conn.close()
+
+        self.section_timings = {name: seconds for name, (_, seconds) in timed.items()}
+        return {name: result for name, (result, _) in timed.items()}
+
+    def _read_only_connection(self):
+        conn = sqlite3.connect(f'file:{os.path.abspath(self.db_file)}?mode=ro', uri=True,
+                               check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            if 'journal_mode' not in pragma and 'synchronous' not in pragma:
+                conn.execute(pragma)
+        return conn
+
+    def fused_aggregates(self, segment=None):
+        """Все агрегаты отчета за один проход по данным (чанками, без SQL); segment - срез"""
+        aggregates = TransactionAggregates()
+        with self.tracer.span('fused_aggregates', 'analysis') as span:
+            for chunk in self._history_chunks(segment):
+                with self.tracer.span('aggregate.update', 'analysis', rows=len(chunk)):
+                    aggregates.update(chunk)
+            span.set(rows=aggregates.count)
+        return aggregates
+
+    def _history_chunks(self, segment=None):
+        """Вся история (или срез segment) чанками: загруженный DataFrame, таблица файловой базы
+        или поток из источника плюс append().
+
+        Фильтры среза проталкиваются в чтение; отсечение партиций - в scan_stats.
+        """
+        if self._df is not None:
+            yield segment.apply(self.df) if segment else self.df
+            return
+        if self.db_file is not None:
+            # Файловая база переживает перезапуск вместе с дописанными строками, CSV их не содержит
+            yield from self._table_chunks(segment)
+            return
+        filters = (self.filters or []) + (segment.filters() if segment else [])
+        if segment:
+            with self.tracer.span('load.prune', 'load') as span:
+                plan = scan_plan(self.source, filters)
+                self.scan_stats = {key: plan[key] for key in ('partitions', 'scanned', 'pruned')}
+                span.set(**self.scan_stats)
+        chunks = iter_transactions(self.source, self.columns, filters or None, self.chunksize)
+        yield from self.tracer.iterate(chunks, 'load.read_chunk')
+        for batch in self._pending:
+            yield segment.apply(batch) if segment else batch
+
+    def maintain_aggregates(self):
+        """Включение инкрементального режима: агрегаты по истории считаются один раз"""
+        if self.aggregates is None:
+            self.aggregates = self.fused_aggregates()
+        return self.aggregates
+
+    def user_features(self, path=':memory:'):
+        """Включение хранилища признаков пользователей (UserFeatureStore в path).
+
+        Хранилище из файла используется повторно, если оно построено по тем же
+        данным, иначе перестраивается за один проход. Дальше append() обновляет
+        его инкрементально, а раздел поведения пользователей берет топ из его индекса.
+        """
+        if self.features is not None and self.features.path == path:
+            return self.features
+        store = UserFeatureStore(path)
+        if store.get_meta('fingerprint') != self._fingerprint:
+            store.clear()
+            with self.tracer.span('features.build', 'analysis') as span:
+                rows = 0
+                for chunk in self._history_chunks():
+                    store.update(chunk)
+                    rows += len(chunk)
+                span.set(rows=rows)
+            store.set_meta('fingerprint', self._fingerprint)
+        if self.features is not None:
+            self.features.close()
+        self.features = store
+        return store
+
+    def time_rollups(self, path=None):
+        """Включение иерархических временных сверток (timeseries.TimeRollups).
+
+        Свертки по часам, дням, неделям и месяцам строятся за один проход и
+        при path сохраняются в файл; сохраненные используются повторно, если
+        построены по тем же данным. Дальше append() обновляет их, а раздел
+        месячных трендов берется из месячной свертки.
+        """
+        rollups = None
+        if path is not None and os.path.exists(path):
+            rollups = TimeRollups.load(path)
+            if rollups.fingerprint != self._fingerprint:
+                rollups = None
+        if rollups is None:
+            rollups = TimeRollups()
+            with self.tracer.span('rollups.build', 'analysis') as span:
+                rows = 0
+                for chunk in self._history_chunks():
+                    rollups.update(chunk)
+                    rows += len(chunk)
+                span.set(rows=rows)
+            rollups.fingerprint = self._fingerprint
+            if path is not None:
+                rollups.save(path)
+        self.rollups = rollups
+        self._rollups_path = path
+        return rollups
+
+    def approximate(self, path=None, capacity=DEFAULT_CAPACITY, target_error=None, time_budget=None, seed=0):
+        """Включение приближенного режима (approximate.StratifiedSample).
+
+        Выборка до capacity строк на каждую пару категория/тип операции
+        строится за один проход и при path сохраняется в файл; сохраненная
+        используется повторно, если построена по тем же данным и с тем же
+        capacity. analyze(mode='approximate') уточняет оценки, пока
+        относительная погрешность больше target_error и хватает time_budget
+        секунд; append() дополняет выборку.
+        """
+        sample = None
+        if path is not None and os.path.exists(path):
+            sample = StratifiedSample.load(path)
+            if sample.fingerprint != self._fingerprint or sample.capacity != capacity:
+                sample = None
+        if sample is None:
+            sample = StratifiedSample(capacity=capacity, seed=seed)
+            with self.tracer.span('sample.build', 'analysis') as span:
+                rows = 0
+                for chunk in self._history_chunks():
+                    sample.update(chunk)
+                    rows += len(chunk)
+                span.set(rows=rows, sample_rows=len(sample))
+            sample.fingerprint = self._fingerprint
+            if path is not None:
+                sample.save(path)
+        self.sample = sample
+        self._sample_path = path
+        self._approximate_options = {'target_error': target_error, 'time_budget': time_budget}
+        return sample
+
+    def anomaly_scores(self, scorer=None):
+        """Включение ранжирования AML-разделов по скорам аномальности (anomaly.AnomalyScorer).
+
+        История скорится векторно целиком в памяти. После этого разделы
+        подозрительной активности и AML compliance в режиме 'sql' ранжируют
+        операции по anomaly_score вместо фиксированных порогов; пачки из
+        append() скорятся по уже построенным базовым линиям.
+        """
+        self.scorer = scorer or AnomalyScorer()
+        df = self.df
+        with self.tracer.span('anomaly.score', 'analysis', rows=len(df)):
+            self.scores = scored_transactions(df, self.scorer.fit_score(df))
+        return self.scores
+
+    def append(self, batch):
+        """Добавление пачки новых транзакций.
+
+        Строки дописываются в базу, а поддерживаемые агрегаты обновляются
+        за время, пропорциональное размеру пачки.
+        """
+        batch = compact_frame(pd.DataFrame(batch))
+        if len(batch) == 0:
+            return
+        aggregates = self.maintain_aggregates()
+
+        self._appended = self._append_version(batch)
+        if self.conn is not None:
+            with self.tracer.span('load.to_sql', 'load', rows=len(batch)):
+                self._with_month(batch).to_sql('transactions', self.conn, index=False, if_exists='append')
+            if self.db_file is not None:
+                # Версия хранится в базе, чтобы дисковый кеш и сохраненные свертки видели дописанные строки
+                self.conn.execute("INSERT OR REPLACE INTO _source (key, value) VALUES ('appended', ?)",
+                                  (self._appended,))
+            self.conn.commit()
+        self._fingerprint = self._data_fingerprint()
+        with self.tracer.span('aggregate.update', 'analysis', rows=len(batch)):
+            aggregates.update(batch)
+        if self.scores is not None:
+            with self.tracer.span('anomaly.score', 'analysis', rows=len(batch)):
+                self.scores = concat_frames([self.scores,
+                                             scored_transactions(batch, self.scorer.score(batch))])
+        if self.rollups is not None:
+            with self.tracer.span('rollups.update', 'analysis', rows=len(batch)):
+                self.rollups.update(batch)
+            self.rollups.fingerprint = self._fingerprint
+            if self._rollups_path is not None:
+                self.rollups.save(self._rollups_path)
+        if self.sample is not None:
+            with self.tracer.span('sample.update', 'analysis', rows=len(batch)):
+                self.sample.update(batch)
+            self.sample.fingerprint = self._fingerprint
+            if self._sample_path is not None:
+                self.sample.save(self._sample_path)
+        if self.features is not None:
+            with self.tracer.span('features.update', 'analysis', rows=len(batch)):
+                self.features.update(batch)
+            self.features.set_meta('fingerprint', self._fingerprint)
+        if self.db_file is None or self._df is not None:
+            # В режиме db_file незагруженный DataFrame прочитает пачку из таблицы
+            self._pending.append(batch)
+
+    def stream_aml(self, detector=None):
+        """Прогон истории через потоковый AML-детектор в порядке времени"""
+        detector = detector or StreamingAMLDetector()
+        columns = 'user_id, transaction_date, amount, transaction_type, transaction_id'
+        with self.tracer.span('stream_aml', 'analysis') as span:
+            if self.conn is not None:
+                query = f'SELECT {columns} FROM transactions ORDER BY transaction_date'
+                chunks = pd.read_sql_query(query, self.conn, chunksize=self.chunksize)
+                for chunk in self.tracer.iterate(chunks, 'load.read_chunk'):
+                    detector.process_frame(chunk)
+            else:
+                # Потоковый режим без базы: порядок по времени требует полной сортировки
+                detector.process_frame(read_transactions(self.source, columns=[c.strip() for c in columns.split(',')],
+                                                         filters=self.filters))
+                for batch in self._pending:
+                    detector.process_frame(batch)
+            span.set(rows=detector.processed, alerts=len(detector.alerts))
+        print(f" AML-детектор: обработано {detector.processed} операций, алертов: {len(detector.alerts)}")
+        return detector
+
+    def save_checkpoint(self, path):
+        """Сохранение состояния поддерживаемых агрегатов вместе с источником и отпечатком данных"""
+        with open(path, 'wb') as f:
+            pickle.dump({'source': os.path.abspath(self.source), 'fingerprint': self._fingerprint,
+                         'aggregates': self.maintain_aggregates()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_checkpoint(self, path):
+        """Восстановление агрегатов из контрольной точки вместо пересчета по истории.
+
+        Контрольная точка другого источника или других данных не загружается (ValueError).
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('source') != os.path.abspath(self.source):
+            raise ValueError(f"Контрольная точка построена по другому источнику: {state.get('source')}")
+        if state.get('fingerprint') != self._fingerprint:
+            raise ValueError("Контрольная точка построена по другим данным, агрегаты нужно пересчитать")
+        self.aggregates = state['aggregates']
+        return self.aggregates
 
     def _basic_statistics(self):
         """Базовая статистика"""
-        print(" 1. ОСНОВНАЯ СТАТИСТИКА")
+        result = self.section('basic_statistics')
+        self._render_basic_statistics(result)
+        return result
 
-        query = """
+    def _query_basic_statistics(self, conn=None, segment=None):
+        where, params = self._where(segment)
+        query = f"""
         SELECT 
             COUNT(*) as total_transactions,
             COUNT(DISTINCT user_id) as unique_users,
@@ -111,73 +701,105 @@ class BankTransactionAnalyzer:
             ROUND(AVG(amount), 2) as avg_transaction,
             ROUND(MAX(amount), 2) as max_transaction,
             ROUND(MIN(amount), 2) as min_transaction
-        FROM transactions;
+        FROM transactions {where};
         """
-        result = pd.read_sql_query(query, self.conn)
-        print(result.to_string(index=False))
+        return {'summary': self._read_sql(query, conn, params)}
+
+    def _render_basic_statistics(self, result):
+        print(" 1. ОСНОВНАЯ СТАТИСТИКА")
+        print(result['summary'].to_string(index=False))
 
     def _category_analysis(self):
 
 
         """Анализ по категориям"""
-        print("  2. АНАЛИЗ ПО КАТЕГОРИЯМ")
+        result = self.section('category_analysis')
+        self._render_category_analysis(result)
+        return result
 
+    def _query_category_analysis(self, conn=None, segment=None):
+        where, params = self._where(segment, "transaction_type = 'debit'")
         # Расходы по категориям
-        query = """
+        query = f"""
         SELECT 
             category,
             COUNT(*) as count,
             ROUND(SUM(amount), 2) as total_amount,
             ROUND(AVG(amount), 2) as avg_amount,
-            ROUND(SUM(amount) * 100.0 / (SELECT SUM(amount) FROM transactions WHERE transaction_type = 'debit'), 2) as percentage
+            ROUND(SUM(amount) * 100.0 / (SELECT SUM(amount) FROM transactions {where}), 2) as percentage
         FROM transactions 
-        WHERE transaction_type = 'debit'
+        {where}
         GROUP BY category
         ORDER BY total_amount DESC;
         """
-        result = pd.read_sql_query(query, self.conn)
+        return {'categories': self._read_sql(query, conn, params * 2)}
+
+    def _render_category_analysis(self, result):
+        print("  2. АНАЛИЗ ПО КАТЕГОРИЯМ")
         print(" Расходы по категориям:")
-        print(result.to_string(index=False))
+        print(result['categories'].to_string(index=False))
 
     def _suspicious_activity_detection(self):
 
 
 
         """Обнаружение подозрительной активности"""
-        print(" 3. ДЕТЕКЦИЯ ПОДОЗРИТЕЛЬНОЙ АКТИВНОСТИ (AML)")
+        result = self.section('suspicious_activity_detection')
+        self._render_suspicious_activity_detection(result)
+        return result
+
+    def _query_suspicious_activity_detection(self, conn=None, segment=None):
+        if self.scores is not None and not segment:
+            return {'large_users': anomalous_users(self.scores), 'top_transactions': top_anomalies(self.scores)}
 
+        where_large, params = self._where(segment, 'amount > 30000')
+        where_top, _ = self._where(segment, 'amount > 40000')
         # Крупные транзакции
-        query_large = """
+        query_large = f"""
         SELECT 
             user_id,
             COUNT(*) as large_transactions,
             ROUND(SUM(amount), 2) as total_large_amount
         FROM transactions 
-        WHERE amount > 30000 
+        {where_large}
         GROUP BY user_id
         HAVING COUNT(*) > 2
         ORDER BY total_large_amount DESC;
         """
-        result_large = pd.read_sql_query(query_large, self.conn)
-
-        if len(result_large) > 0:
-            print("Пользователи с частыми крупными транзакциями:")
-            print(result_large.to_string(index=False))
-        else:
-            print("Подозрительных паттернов не обнаружено, все хорошо")
 
         # Самые крупные транзакции
-        query_top = """
+        query_top = f"""
         SELECT 
             transaction_id, user_id, amount, category, merchant, transaction_date
         FROM transactions 
-        WHERE amount > 40000
+        {where_top}
         ORDER BY amount DESC
         LIMIT 5;
         """
-        result_top = pd.read_sql_query(query_top, self.conn)
+        return {
+            'large_users': self._read_sql(query_large, conn, params),
+            'top_transactions': self._read_sql(query_top, conn, params),
+        }
+
+    def _render_suspicious_activity_detection(self, result):
+        print(" 3. ДЕТЕКЦИЯ ПОДОЗРИТЕЛЬНОЙ АКТИВНОСТИ (AML)")
+
+        result_large = result['large_users']
+        if len(result_large) > 0:
+            if 'total_score' in result_large.columns:
+                print("Пользователи с наибольшим суммарным скором аномальности:")
+            else:
+                print("Пользователи с частыми крупными транзакциями:")
+            print(result_large.to_string(index=False))
+        else:
+            print("Подозрительных паттернов не обнаружено, все хорошо")
+
+        result_top = result['top_transactions']
         if len(result_top) > 0:
-            print(" Топ-5 самых крупных транзакций:")
+            if 'anomaly_score' in result_top.columns:
+                print(" Топ-5 транзакций по скору аномальности:")
+            else:
+                print(" Топ-5 самых крупных транзакций:")
             print(result_top.to_string(index=False))
 
     def _user_behavior_analysis(self):
@@ -185,10 +807,20 @@ class BankTransactionAnalyzer:
 
 
         """Анализ поведения пользователей"""
-        print(" 4. АНАЛИЗ ПОВЕДЕНИЯ ПОЛЬЗОВАТЕЛЕЙ")
-
+        result = self.section('user_behavior_analysis')
+        self._render_user_behavior_analysis(result)
+        return result
+
+    def _query_user_behavior_analysis(self, conn=None, segment=None):
+        if self.features is not None and not segment:
+            with self.tracer.span('features.top_users', 'sql') as span:
+                result = self.features.top_users(10)
+                span.set(rows=len(result))
+            return {'top_users': result}
+
+        where, params = self._where(segment)
         # Самые активные пользователи
-        query_active = """
+        query_active = f"""
         SELECT 
             user_id,
             COUNT(*) as transaction_count,
@@ -196,68 +828,97 @@ class BankTransactionAnalyzer:
             ROUND(AVG(amount), 2) as avg_transaction,
             COUNT(DISTINCT category) as unique_categories
         FROM transactions
+        {where}
         GROUP BY user_id
         ORDER BY total_volume DESC
         LIMIT 10;
         """
-        result_active = pd.read_sql_query(query_active, self.conn)
+        return {'top_users': self._read_sql(query_active, conn, params)}
+
+    def _render_user_behavior_analysis(self, result):
+        print(" 4. АНАЛИЗ ПОВЕДЕНИЯ ПОЛЬЗОВАТЕЛЕЙ")
         print("самые активных пользователи:")
-        print(result_active.to_string(index=False))
+        print(result['top_users'].to_string(index=False))
 
     def _monthly_trends(self):
 
 
 
         """Анализ месячных трендов"""
-        print(" 5.ТРЕНДЫ")
-
-        query = """
+        result = self.section('monthly_trends')
+        self._render_monthly_trends(result)
+        return result
+
+    def _query_monthly_trends(self, conn=None, segment=None):
+        if self.rollups is not None and not segment:
+            with self.tracer.span('rollups.monthly', 'sql') as span:
+                result = self.rollups.monthly_trends()
+                span.set(rows=len(result))
+            return {'months': result}
+
+        where, params = self._where(segment)
+        query = f"""
         SELECT 
-            strftime('%Y-%m', transaction_date) as month,
+            month,
             COUNT(*) as transaction_count,
             ROUND(SUM(amount), 2) as monthly_volume,
             ROUND(AVG(amount), 2) as avg_monthly_transaction
         FROM transactions
+        {where}
         GROUP BY month
         ORDER BY month;
         """
-        result = pd.read_sql_query(query, self.conn)
+        return {'months': self._read_sql(query, conn, params)}
+
+    def _render_monthly_trends(self, result):
+        print(" 5.ТРЕНДЫ")
         print(" Динамика по месяцам:")
-        print(result.to_string(index=False))
+        print(result['months'].to_string(index=False))
 
     def _aml_compliance_check(self):
 
 
         """Проверка соответствия AML требованиям"""
-        print("  6. AML COMPLIANCE CHECK")
+        result = self.section('aml_compliance_check')
+        self._render_aml_compliance_check(result)
+        return result
 
-        query = """
+    def _query_aml_compliance_check(self, conn=None, segment=None):
+        if self.scores is not None and not segment:
+            return {'summary': anomaly_summary(self.scores)}
+
+        where, params = self._where(segment, '(is_suspicious = 1 OR amount > 40000)')
+        query = f"""
         SELECT 
             COUNT(*) as total_suspicious,
             ROUND(SUM(amount), 2) as suspicious_volume,
             COUNT(DISTINCT user_id) as users_involved
         FROM transactions 
-        WHERE is_suspicious = 1 OR amount > 40000;
+        {where};
         """
-        result = pd.read_sql_query(query, self.conn)
+        return {'summary': self._read_sql(query, conn, params)}
+
+    def _render_aml_compliance_check(self, result):
+        print("  6. AML COMPLIANCE CHECK")
         print(" Статистика подозрительной активности")
-        print(result.to_string(index=False))
+        print(result['summary'].to_string(index=False))
 
         # Рекомендации по AML
-        if result.iloc[0]['total_suspicious'] > 10:
+        if result['summary'].iloc[0]['total_suspicious'] > 10:
             print("  ВНИМАНИЕ: Обнаружено значительное количество подозрительных операций!")
 
 
     def close(self):
 
         """Закрытие соединения"""
-        self.conn.close()
+        if self.conn is not None:
+            self.conn.close()
+        if self.features is not None:
+            self.features.close()
 
 
-# Запуск анализа
+# Запуск анализа: то же, что python cli.py analyze
 if __name__ == "__main__":
-    print("запуск анализа")
-    analyzer = BankTransactionAnalyzer()
-    analyzer.run_comprehensive_analysis()
-    analyzer.close()
-    print("")
\ No newline at end of file
+    import sys
+    from cli import main
+    sys.exit(main(['analyze'] + sys.argv[1:]))
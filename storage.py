@@ -0,0 +1,387 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Строковые колонки, которые хранятся словарным кодированием
+DICTIONARY_COLUMNS = ['transaction_type', 'category', 'merchant', 'location']
+
+# Колонка партиционирования колоночного датасета
+PARTITION_COLUMN = 'month'
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+# Целые колонки, которые уменьшаются до минимального подходящего типа
+INTEGER_COLUMNS = ['transaction_id', 'user_id']
+
+# Типы колонок при чтении CSV: словарные колонки сразу читаются как category.
+# Схемы generate_data.py и sql.py отличаются набором колонок (location есть
+# только во второй) и форматом дат, поэтому отсутствующие колонки пропускаются
+CSV_DTYPES = {column: 'category' for column in DICTIONARY_COLUMNS}
+
+# Файл метаданных хранилища memmap (см. memmap_store.py)
+MEMMAP_META = 'store.json'
+
+# Точность сумм (знаков после запятой), при которой допустим float32
+AMOUNT_DECIMALS = 2
+
+_OPERATORS = {
+    '==': lambda s, v: s == v,
+    '=': lambda s, v: s == v,
+    '!=': lambda s, v: s != v,
+    '<': lambda s, v: s < v,
+    '<=': lambda s, v: s <= v,
+    '>': lambda s, v: s > v,
+    '>=': lambda s, v: s >= v,
+    'in': lambda s, v: s.isin(v),
+    'not in': lambda s, v: ~s.isin(v),
+}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Для работы с Parquet нужен pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def is_memmap_store(path):
+    """Каталог колоночного хранилища memmap"""
+    return os.path.isfile(os.path.join(path, MEMMAP_META))
+
+
+def is_parquet(path):
+    """Parquet-файл или каталог партиционированного датасета"""
+    return (os.path.isdir(path) and not is_memmap_store(path)) or path.endswith('.parquet')
+
+
+def is_csv(path):
+    return not os.path.isdir(path) and not path.endswith('.parquet')
+
+
+def month_of(dates):
+    """Месяц 'YYYY-MM' для колонки дат (datetime или текст из CSV)"""
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        # Номер месяца от эпохи вместо strftime по каждой строке: форматируются только различные месяцы
+        months = dates.to_numpy().astype('datetime64[M]')
+        valid = ~np.isnat(months)
+        if not valid.any():
+            return pd.Series(None, index=dates.index, dtype=object)
+        numbers = months.astype(np.int64)
+        first = numbers[valid].min()
+        labels = np.arange(first, numbers[valid].max() + 1).astype('datetime64[M]').astype(str).astype(object)
+        labels = np.append(labels, None)
+        return pd.Series(labels[np.where(valid, numbers - first, -1)], index=dates.index)
+    return dates.astype(str).str[:7]
+
+
+def sqlite_datetime_text(dates):
+    """Даты текстом в том виде, в каком их хранит SQLite после to_sql: 'YYYY-MM-DD HH:MM:SS[.ffffff]'.
+
+    Дробная часть секунд пишется только ненулевой, как у datetime.isoformat(' ');
+    для колонки возвращается колонка строк, для одной даты - строка.
+    """
+    if not isinstance(dates, pd.Series):
+        return sqlite_datetime_text(pd.Series([pd.Timestamp(dates)])).iloc[0]
+    text = dates.dt.strftime('%Y-%m-%d %H:%M:%S')
+    microseconds = dates.dt.microsecond
+    return text.where(microseconds == 0, text + '.' + microseconds.astype(str).str.zfill(6))
+
+
+def sqlite_round(values, digits=2):
+    """Округление, как ROUND(x, digits) в SQLite: половина - от нуля, а не к четному, как в numpy.
+
+    Половина распознается с точностью до ошибки представления double (17525.505 - это
+    17525.50499999..., но SQLite округляет его до 17525.51). Все разделы отчета, считаемые
+    без SQL, округляют деньги так, чтобы совпадать с запросами. Колонка - в колонку, число - в число.
+    """
+    array = np.asarray(values, dtype=float)
+    scale = 10.0 ** digits
+    scaled = np.abs(array) * scale
+    whole = np.floor(scaled)
+    half = 0.5 - np.maximum(scaled, 1) * 4 * np.finfo(float).eps
+    rounded = np.copysign((whole + (scaled - whole >= half)) / scale, array)
+    if isinstance(values, pd.Series):
+        return pd.Series(rounded, index=values.index, name=values.name)
+    return rounded if rounded.ndim else float(rounded)
+
+
+def _to_columnar(chunk):
+    """Типизация чанка перед записью в колоночный формат"""
+    chunk['transaction_date'] = pd.to_datetime(chunk['transaction_date'])
+    for column in DICTIONARY_COLUMNS:
+        if column in chunk.columns:
+            chunk[column] = chunk[column].astype('category')
+    chunk['is_suspicious'] = chunk['is_suspicious'].astype(bool)
+    chunk[PARTITION_COLUMN] = month_of(chunk['transaction_date'])
+    return chunk
+
+
+def write_parquet_dataset(csv_file, dataset_dir, chunksize=DEFAULT_CHUNKSIZE):
+    """Конвертация CSV в Parquet-датасет, партиционированный по месяцам.
+
+    CSV читается чанками, поэтому файл может быть больше памяти.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    for i, chunk in enumerate(pd.read_csv(csv_file, chunksize=chunksize)):
+        table = pa.Table.from_pandas(_to_columnar(chunk), preserve_index=False)
+        pq.write_to_dataset(table, dataset_dir, partition_cols=[PARTITION_COLUMN],
+                            basename_template=f'part-{i:05d}-{{i}}.parquet',
+                            existing_data_behavior='overwrite_or_ignore')
+    print(f"Parquet-датасет записан: {dataset_dir}")
+    return dataset_dir
+
+
+def _to_bool(values):
+    if values.dtype == bool:
+        return values
+    text = values.astype(str).str.strip().str.lower()
+    return text.isin(['true', '1', 'yes'])
+
+
+def compact_frame(df, float32=False):
+    """Приведение кадра транзакций к компактной схеме.
+
+    Словарные колонки - category, transaction_id/user_id - минимальный
+    целый тип, transaction_date - datetime, is_suspicious - bool.
+    float32=True переводит amount во float32, только если все суммы
+    восстанавливаются из него до копейки; по умолчанию amount остается
+    float64, чтобы суммы совпадали с SQL-разделами до копейки.
+    """
+    for column in df.columns.intersection(DICTIONARY_COLUMNS):
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    for column in df.columns.intersection(INTEGER_COLUMNS):
+        values = df[column]
+        if pd.api.types.is_integer_dtype(values) and len(values):
+            downcast = 'unsigned' if values.min() >= 0 else 'integer'
+            df[column] = pd.to_numeric(values, downcast=downcast)
+    if 'transaction_date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['transaction_date']):
+        df['transaction_date'] = pd.to_datetime(df['transaction_date'])
+    if 'is_suspicious' in df.columns:
+        df['is_suspicious'] = _to_bool(df['is_suspicious'])
+    if float32 and 'amount' in df.columns and df['amount'].dtype == np.float64:
+        amount = df['amount'].to_numpy()
+        narrow = amount.astype(np.float32)
+        if np.array_equal(np.round(narrow.astype(np.float64), AMOUNT_DECIMALS), amount):
+            df['amount'] = narrow
+    return df
+
+
+def concat_frames(frames):
+    """Склейка кадров транзакций с объединением словарей категориальных колонок"""
+    frames = list(frames)
+    for column in DICTIONARY_COLUMNS:
+        present = [f[column] for f in frames if column in f.columns]
+        if len(present) > 1 and all(isinstance(v.dtype, pd.CategoricalDtype) for v in present):
+            categories = present[0].cat.categories
+            for values in present[1:]:
+                categories = categories.union(values.cat.categories, sort=False)
+            frames = [f.assign(**{column: f[column].cat.set_categories(categories)})
+                      if column in f.columns else f for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_footprint(df):
+    """Память, занимаемая кадром, в МБ (с учетом строк и словарей категорий)"""
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def apply_filters(df, filters):
+    """Применение фильтров в формате pyarrow [(колонка, оператор, значение), ...]"""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        mask &= _OPERATORS[op](df[column], value)
+    return df[mask]
+
+
+def _month_bounds(filters):
+    """Диапазон месяцев [first, last], которым ограничивают строки filters (None - без границы)"""
+    first = last = None
+    for column, op, value in filters or []:
+        if column == PARTITION_COLUMN:
+            if op in ('==', '='):
+                low = high = str(value)
+            elif op == 'in':
+                low, high = min(map(str, value)), max(map(str, value))
+            else:
+                low = str(value) if op in ('>', '>=') else None
+                high = str(value) if op in ('<', '<=') else None
+        elif column == 'transaction_date' and op in ('>', '>=', '<', '<=', '==', '='):
+            month = pd.Timestamp(value).strftime('%Y-%m')
+            low = month if op in ('>', '>=', '==', '=') else None
+            high = month if op in ('<', '<=', '==', '=') else None
+            if op == '<' and pd.Timestamp(value) == pd.Timestamp(month):
+                # Строгая граница на начале месяца: сам месяц не нужен
+                high = (pd.Timestamp(month) - pd.Timedelta(days=1)).strftime('%Y-%m')
+        else:
+            continue
+        if low is not None:
+            first = low if first is None else max(first, low)
+        if high is not None:
+            last = high if last is None else min(last, high)
+    return first, last
+
+
+def scan_plan(path, filters=None):
+    """Файлы источника, которые нужно прочитать под filters, и статистика отсечения партиций.
+
+    Parquet-датасет партиционирован по месяцам (см. write_parquet_dataset):
+    партиции вне диапазона дат из filters не читаются. CSV, одиночный
+    Parquet-файл и хранилище memmap - одна партиция, которая читается всегда.
+    """
+    partitions = []
+    if is_parquet(path) and os.path.isdir(path):
+        prefix = f'{PARTITION_COLUMN}='
+        partitions = sorted(name for name in os.listdir(path)
+                            if name.startswith(prefix) and os.path.isdir(os.path.join(path, name)))
+    if not partitions:
+        return {'files': [path], 'partitions': 1, 'scanned': 1, 'pruned': 0}
+
+    first, last = _month_bounds(filters)
+    selected = [name for name in partitions
+                if (first is None or name[len(prefix):] >= first) and (last is None or name[len(prefix):] <= last)]
+    files = [os.path.join(path, name, file) for name in selected
+             for file in sorted(os.listdir(os.path.join(path, name))) if file.endswith('.parquet')]
+    return {'files': files, 'partitions': len(partitions), 'scanned': len(selected),
+            'pruned': len(partitions) - len(selected)}
+
+
+def read_transactions(path, columns=None, filters=None, float32=False):
+    """Загрузка транзакций из CSV или Parquet в компактной схеме (см. compact_frame).
+
+    columns - проекция колонок, filters - предикаты вида
+    [('category', '==', 'food')]. Для Parquet они проталкиваются в чтение:
+    с диска читаются только нужные колонки и партиции.
+    Из хранилища memmap числовые колонки берутся без копирования.
+    """
+    if is_memmap_store(path):
+        from memmap_store import MemmapStore
+        return MemmapStore(path).frame(columns, filters)
+
+    if is_parquet(path):
+        _require_pyarrow()
+        filter_columns = [f[0] for f in filters or []]
+        read_columns = None if columns is None else list(dict.fromkeys(columns + filter_columns))
+        df = pd.read_parquet(path, engine='pyarrow', columns=read_columns, filters=filters or None)
+        if columns is None:
+            df = df.drop(columns=PARTITION_COLUMN, errors='ignore')
+        else:
+            df = df[columns]
+        return compact_frame(df, float32)
+
+    filter_columns = [f[0] for f in filters or []]
+    if PARTITION_COLUMN in filter_columns:
+        # В CSV месяца нет - вычисляем его из даты
+        filter_columns.append('transaction_date')
+    usecols = None if columns is None else [c for c in dict.fromkeys(columns + filter_columns)
+                                            if c != PARTITION_COLUMN]
+    df = compact_frame(pd.read_csv(path, usecols=usecols, dtype=CSV_DTYPES), float32)
+    if PARTITION_COLUMN in filter_columns:
+        df[PARTITION_COLUMN] = month_of(df['transaction_date'])
+    df = apply_filters(df, filters)
+    if columns is not None:
+        df = df[columns]
+    return df.drop(columns=PARTITION_COLUMN, errors='ignore') if columns is None else df
+
+
+def iter_transactions(path, columns=None, filters=None, chunksize=DEFAULT_CHUNKSIZE, offset=0, float32=False):
+    """Потоковое чтение транзакций чанками до chunksize строк (CSV или Parquet) в компактной схеме.
+
+    offset - байтовое смещение в CSV, с которого читать (для дописанных строк).
+    """
+    if is_memmap_store(path):
+        from memmap_store import MemmapStore
+        yield from MemmapStore(path).iter_frames(columns, filters, chunksize)
+        return
+
+    filter_columns = [f[0] for f in filters or []]
+
+    if is_parquet(path):
+        _require_pyarrow()
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        plan = scan_plan(path, filters)
+        if not plan['files']:
+            return
+        if plan['files'] == [path]:
+            dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        else:
+            # Только партиции-месяцы, пересекающиеся с диапазоном дат фильтров
+            dataset = ds.dataset(plan['files'], format='parquet', partitioning='hive', partition_base_dir=path)
+        expression = pq.filters_to_expression(filters) if filters else None
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=chunksize):
+            chunk = batch.to_pandas()
+            if columns is None:
+                chunk = chunk.drop(columns=PARTITION_COLUMN, errors='ignore')
+            yield compact_frame(chunk, float32)
+        return
+
+    if PARTITION_COLUMN in filter_columns:
+        filter_columns.append('transaction_date')
+    usecols = None if columns is None else [c for c in dict.fromkeys(columns + filter_columns)
+                                            if c != PARTITION_COLUMN]
+    with open(path, newline='') as f:
+        if offset:
+            names = f.readline().rstrip('\r\n').split(',')
+            f.seek(offset)
+            reader = pd.read_csv(f, names=names, header=None, usecols=usecols, chunksize=chunksize,
+                                 dtype=CSV_DTYPES)
+        else:
+            reader = pd.read_csv(f, usecols=usecols, chunksize=chunksize, dtype=CSV_DTYPES)
+        yield from _filtered_chunks(reader, columns, filters, filter_columns, float32)
+
+
+def _filtered_chunks(reader, columns, filters, filter_columns, float32=False):
+    for chunk in reader:
+        chunk = compact_frame(chunk, float32)
+        if PARTITION_COLUMN in filter_columns:
+            chunk[PARTITION_COLUMN] = month_of(chunk['transaction_date'])
+        chunk = apply_filters(chunk, filters)
+        if columns is not None:
+            chunk = chunk[columns]
+        elif PARTITION_COLUMN in chunk.columns:
+            chunk = chunk.drop(columns=PARTITION_COLUMN)
+        yield chunk
+
+
+def chunksize_for_memory(path, memory_limit_mb, overhead=4):
+    """Размер чанка, при котором обработка укладывается в memory_limit_mb.
+
+    Размер строки оценивается по первым строкам источника, overhead -
+    запас на временные объекты группировок.
+    """
+    chunks = iter_transactions(path, chunksize=1000)
+    sample = next(chunks, None)
+    chunks.close()
+    if sample is None or len(sample) == 0:
+        return DEFAULT_CHUNKSIZE
+    row_bytes = sample.memory_usage(deep=True).sum() / len(sample)
+    return max(1000, int(memory_limit_mb * 2 ** 20 / (row_bytes * overhead)))
+
+
+def source_fingerprint(path):
+    """Размер и время изменения источника (файла или каталога датасета)"""
+    if os.path.isdir(path):
+        size, mtime = 0, 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                size += stat.st_size
+                mtime = max(mtime, stat.st_mtime_ns)
+        return size, mtime
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+if __name__ == "__main__":
+    write_parquet_dataset('data/transactions.csv', 'data/transactions_parquet')
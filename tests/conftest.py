@@ -0,0 +1,76 @@
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Модули проекта лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import generate_transactions  # noqa: E402
+
+# Фиксированный конец периода: данные и срезы не зависят от даты запуска; дробные секунды
+# попадают в даты схемы basic, как в CSV из generate_data.py
+END_DATE = datetime(2026, 10, 1, 12, 0, 0, 143451)
+
+
+@pytest.fixture(scope='session')
+def make_csv(tmp_path_factory):
+    """Фабрика синтетических CSV схемы generate_data (файлы общие на всю сессию)"""
+    files = {}
+
+    def make(schema, num_records=20000, seed=7):
+        key = (schema, num_records, seed)
+        if key not in files:
+            path = tmp_path_factory.mktemp(schema) / 'transactions.csv'
+            generate_transactions(num_records, output_file=str(path), seed=seed, schema=schema,
+                                  end_date=END_DATE)
+            files[key] = str(path)
+        return files[key]
+
+    return make
+
+
+def _table(value):
+    """Таблица для сравнения: без индекса, пропуски SQL (None) - как NaN"""
+    frame = pd.DataFrame(value).reset_index(drop=True)
+    return frame.astype(object).where(frame.notna(), np.nan)
+
+
+def assert_tables_equal(left, right, obj='table'):
+    """Таблицы совпадают по значениям точно, без учета типов колонок"""
+    pd.testing.assert_frame_equal(_table(left), _table(right), check_dtype=False, check_exact=True, obj=obj)
+
+
+def assert_reports_equal(left, right):
+    """Отчеты совпадают таблица в таблицу, числа - точно (до копейки после ROUND)"""
+    assert list(left) == list(right)
+    for name in right:
+        assert list(left[name]) == list(right[name]), name
+        for table, expected in right[name].items():
+            assert_tables_equal(left[name][table], expected, f'{name}.{table}')
+
+
+def assert_chart_data_equal(left, right, rtol=1e-9, path='chart_data'):
+    """Входы графиков совпадают: таблицы, словари и списки - поэлементно, числа - до rtol.
+
+    Суммы, слитые из чанков, отличаются от суммы за один проход только порядком сложения
+    """
+    if isinstance(right, pd.DataFrame):
+        pd.testing.assert_frame_equal(left, right, check_exact=False, rtol=rtol, obj=path)
+    elif isinstance(right, pd.Series):
+        pd.testing.assert_series_equal(left, right, check_exact=False, rtol=rtol, obj=path)
+    elif isinstance(right, dict):
+        assert list(left) == list(right), path
+        for key in right:
+            assert_chart_data_equal(left[key], right[key], rtol, f'{path}.{key}')
+    elif isinstance(right, (list, tuple, np.ndarray)) and not isinstance(right, str):
+        assert len(left) == len(right), path
+        for i, (a, b) in enumerate(zip(left, right)):
+            assert_chart_data_equal(a, b, rtol, f'{path}[{i}]')
+    elif isinstance(right, (float, np.floating)):
+        assert left == pytest.approx(right, rel=rtol, nan_ok=True), path
+    else:
+        assert left == right, path
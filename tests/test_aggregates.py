@@ -0,0 +1,89 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import AggregateCube, QuantileSketch, _round
+from conftest import assert_chart_data_equal
+from storage import read_transactions
+from visualization import BankDataVisualizer
+
+
+@pytest.fixture(scope='module')
+def transactions(make_csv):
+    return read_transactions(make_csv('bank'))
+
+
+def test_quantile_sketch_relative_error():
+    values = np.random.default_rng(0).lognormal(8, 1.5, 50000)
+    whole = QuantileSketch(0.01).update(values)
+    merged = QuantileSketch(0.01)
+    for part in np.array_split(values, 5):
+        merged.merge(QuantileSketch(0.01).update(part))
+    pd.testing.assert_series_equal(merged.buckets, whole.buckets)
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+
+    for q in np.linspace(0.01, 0.99, 25):
+        exact = np.quantile(values, q, method='lower')
+        assert abs(merged.quantile(q) - exact) <= 0.01 * exact * (1 + 1e-9), q
+
+
+def test_cube_matches_exact_aggregates(transactions):
+    data = AggregateCube().update(transactions).chart_data()
+    pd.testing.assert_series_equal(data['category_distribution'].sort_index(),
+                                   transactions['category'].astype(str).value_counts().sort_index(),
+                                   check_names=False, check_index_type=False)
+    users = transactions.groupby('user_id')['amount'].agg(['sum', 'size'])
+    top = data['top_users']
+    assert list(top.index) == list(users['sum'].nlargest(10).index)
+    np.testing.assert_array_equal(top['total_amount'], _round(users['sum'].reindex(top.index)))
+    np.testing.assert_array_equal(top['transaction_count'], users['size'].reindex(top.index))
+    types = transactions.groupby('transaction_type', observed=True)['amount'].agg(['sum', 'size'])
+    np.testing.assert_array_equal(data['debit_vs_credit']['count'], types['size'].sort_index())
+    np.testing.assert_allclose(data['debit_vs_credit']['sum'], _round(types['sum'].sort_index()))
+
+
+def test_cube_slice_matches_filtered_rows(transactions):
+    cube = AggregateCube().update(transactions)
+    selection = dict(start='2026-08-01', end='2026-08-31', categories=['food', 'transport'])
+    data = cube.chart_data(**selection)
+    dates = transactions['transaction_date'].dt.normalize()
+    rows = transactions[(dates >= '2026-08-01') & (dates <= '2026-08-31')
+                        & transactions['category'].isin(selection['categories'])]
+    assert dict(data['category_distribution']) == dict(rows['category'].astype(str).value_counts())
+    # Срез куба - то же, что куб по отфильтрованным строкам
+    assert_chart_data_equal(data, AggregateCube().update(rows).chart_data())
+
+
+def test_cube_merge_equals_single_pass(transactions):
+    merged = AggregateCube()
+    for part in np.array_split(np.arange(len(transactions)), 4):
+        merged.merge(AggregateCube().update(transactions.iloc[part]))
+    assert_chart_data_equal(merged.chart_data(), AggregateCube().update(transactions).chart_data())
+
+
+def test_cube_scale_multiplies_counts_and_sums(transactions):
+    base = AggregateCube().update(transactions).chart_data()
+    keys = pd.MultiIndex.from_product([transactions['category'].cat.categories,
+                                       transactions['transaction_type'].cat.categories])
+    scaled = AggregateCube().update(transactions).scale(pd.Series(2.0, index=keys)).chart_data()
+    pd.testing.assert_series_equal(scaled['category_distribution'], 2 * base['category_distribution'])
+    np.testing.assert_array_equal(scaled['debit_vs_credit']['count'], 2 * base['debit_vs_credit']['count'])
+    np.testing.assert_allclose(scaled['debit_vs_credit']['sum'], 2 * base['debit_vs_credit']['sum'])
+    # Распределение сумм от весов не зависит
+    assert scaled['amount_distribution']['median'] == base['amount_distribution']['median']
+    assert_chart_data_equal(scaled['correlation'], base['correlation'])
+
+
+def test_visualizer_charts_come_from_cube(make_csv, transactions):
+    visualizer = BankDataVisualizer(make_csv('bank'))
+    expected = AggregateCube().update(transactions).chart_data()
+    assert_chart_data_equal(visualizer.chart_data(), expected)
+    # Визуализатор без данных рисует по входам из куба те же панели
+    restored = BankDataVisualizer.from_chart_data(expected)
+    for panel in BankDataVisualizer.PANELS:
+        left, right = io.BytesIO(), io.BytesIO()
+        visualizer.save_panel(panel, left, dpi=30, format='png')
+        restored.save_panel(panel, right, dpi=30, format='png')
+        assert left.getvalue() == right.getvalue(), panel
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from aml_stream import LargeAmountRule, RapidInOutRule, StreamingAMLDetector, StructuringRule, VelocityRule
+from sql import BankTransactionAnalyzer
+
+HOUR = 3600
+
+
+@pytest.mark.parametrize('schema', ['bank', 'basic'])
+def test_large_amount_rule_reproduces_batch_section(make_csv, schema):
+    csv_file = make_csv(schema)
+    detector = StreamingAMLDetector()
+    detector.process_frame(pd.read_csv(csv_file))
+    rule = next(rule for rule in detector.rules if isinstance(rule, LargeAmountRule))
+
+    analyzer = BankTransactionAnalyzer(csv_file)
+    expected = analyzer.section('suspicious_activity_detection')['large_users']
+    analyzer.conn.close()
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(rule.report(), expected, check_dtype=False, check_exact=True)
+    # Алерт - ровно один на пользователя, на третьей крупной операции
+    alerted = {alert.user_id for alert in detector.alerts if alert.rule == 'large_amount'}
+    assert alerted == set(expected['user_id'])
+
+
+def test_stream_aml_processes_history_in_time_order(make_csv):
+    analyzer = BankTransactionAnalyzer(make_csv('bank'))
+    detector = analyzer.stream_aml()
+    analyzer.conn.close()
+    assert detector.processed == len(analyzer.df)
+    timestamps = [alert.timestamp for alert in detector.alerts]
+    assert timestamps == sorted(timestamps)
+
+
+def test_velocity_fires_once_per_window():
+    detector = StreamingAMLDetector([VelocityRule(max_count=3, window_minutes=60)])
+    fired = [bool(detector.process(1, minute * 60, 100.0)) for minute in (0, 10, 20, 30, 40)]
+    assert fired == [False, False, True, False, False]
+    # Операции другого пользователя и операции вне окна не считаются
+    assert not detector.process(2, 50 * 60, 100.0)
+    assert not detector.process(1, 5 * HOUR, 100.0)
+
+
+def test_structuring_counts_amounts_just_below_threshold():
+    rule = StructuringRule(threshold=30000, margin=0.1, min_count=3, window_hours=24)
+    amounts = [28000, 29999.99, 35000, 1000, 27500]
+    fired = [rule.process(1, i * HOUR, amount, 'debit', i) for i, amount in enumerate(amounts)]
+    assert [alert is not None for alert in fired] == [False, False, False, False, True]
+    # Те же суммы, разнесенные дальше окна, не срабатывают
+    rule = StructuringRule(window_hours=24)
+    assert all(rule.process(2, i * 25 * HOUR, 28000, 'debit', i) is None for i in range(3))
+
+
+def test_rapid_in_out_matches_close_debit_after_credit():
+    rule = RapidInOutRule(window_minutes=60, tolerance=0.1, min_amount=1000)
+    assert rule.process(1, 0, 50000, 'credit', 1) is None
+    assert rule.process(1, 20 * 60, 10000, 'debit', 2) is None
+    alert = rule.process(1, 30 * 60, 48000, 'debit', 3)
+    assert alert is not None and alert.transaction_id == 3
+    # Зачисление уже сопоставлено, а новое - старше окна к моменту списания
+    assert rule.process(1, 40 * 60, 48000, 'debit', 4) is None
+    rule.process(1, HOUR, 20000, 'credit', 5)
+    assert rule.process(1, 3 * HOUR, 20000, 'debit', 6) is None
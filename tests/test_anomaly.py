@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly import AnomalyScorer, anomalous_users
+from sql import BankTransactionAnalyzer
+from storage import compact_frame, sqlite_round
+
+OUTLIER_USER = 100000
+
+
+@pytest.fixture(scope='module')
+def history(make_csv):
+    """История схемы bank плюс пользователь с 30 мелкими дневными покупками и одной ночной крупной"""
+    df = compact_frame(pd.read_csv(make_csv('bank')))
+    template = df[df['category'] == 'food'].head(31)
+    dates = pd.date_range('2026-08-01 13:00', periods=31, freq='D')
+    outlier = template.assign(user_id=OUTLIER_USER, transaction_id=np.arange(31) + 10 ** 7,
+                              amount=[150.0 + i for i in range(30)] + [45000.0],
+                              transaction_date=dates.where(np.arange(31) < 30, pd.Timestamp('2026-09-01 03:17')))
+    return pd.concat([df, outlier], ignore_index=True)
+
+
+def test_outlier_user_flagged_and_normal_user_not(history):
+    scores = AnomalyScorer().fit_score(history)
+    outlier = history['user_id'] == OUTLIER_USER
+    big = outlier & (history['amount'] == 45000.0)
+    assert scores.loc[big, 'is_anomalous'].all()
+    assert not scores.loc[outlier & ~big, 'is_anomalous'].any()
+    # Самая типичная операция обычного пользователя (сумма у его медианы) не аномальна
+    user = history.loc[~outlier, 'user_id'].iloc[0]
+    own = history[history['user_id'] == user]
+    typical = (own['amount'] - own['amount'].median()).abs().idxmin()
+    assert not scores.loc[typical, 'is_anomalous']
+    assert scores.loc[big, 'user_amount_z'].iloc[0] > 10
+
+
+def test_threshold_calibrated_on_history(history):
+    scorer = AnomalyScorer(contamination=0.02)
+    scores = scorer.fit_score(history)
+    assert scores['is_anomalous'].mean() == pytest.approx(0.02, abs=1 / len(history) + 1e-3)
+    assert scorer.calibrated_threshold == pytest.approx(np.quantile(scores['anomaly_score'], 0.98))
+    # Новая пачка судится по порогу истории, а не по квантилю самой пачки
+    typical = history[scores['anomaly_score'] < np.quantile(scores['anomaly_score'], 0.5)].head(200)
+    assert not scorer.score(typical)['is_anomalous'].any()
+    # Явный порог важнее калиброванного
+    strict = AnomalyScorer(threshold=np.inf)
+    assert not strict.fit_score(history)['is_anomalous'].any()
+
+
+def test_score_requires_fit(history):
+    with pytest.raises(ValueError):
+        AnomalyScorer().score(history)
+
+
+def test_sections_rank_by_score(make_csv):
+    analyzer = BankTransactionAnalyzer(make_csv('bank'))
+    scores = analyzer.anomaly_scores()
+    suspicious = analyzer.section('suspicious_activity_detection')
+    summary = analyzer.section('aml_compliance_check')['summary']
+    flagged = scores[scores['is_anomalous']]
+
+    assert list(suspicious['large_users']['user_id']) == list(anomalous_users(scores)['user_id'])
+    assert suspicious['large_users']['total_score'].is_monotonic_decreasing
+    assert list(suspicious['top_transactions']['transaction_id']) == \
+        list(scores.nlargest(5, 'anomaly_score')['transaction_id'])
+    assert summary['total_suspicious'][0] == len(flagged)
+    assert summary['suspicious_volume'][0] == sqlite_round(flagged['amount'].sum())
+    amounts = flagged.groupby('user_id')['amount'].sum()
+    users = suspicious['large_users'].set_index('user_id')['total_anomalous_amount']
+    assert (users == sqlite_round(amounts.loc[users.index])).all()
+
+    # append() скорит пачку по базовым линиям истории
+    batch = pd.read_csv(make_csv('bank')).head(50)
+    analyzer.append(batch)
+    assert len(analyzer.scores) == len(scores) + 50
+    analyzer.conn.close()
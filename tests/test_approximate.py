@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from approximate import HyperLogLog, StratifiedSample, capacity_for
+from storage import read_transactions
+
+TRIALS = 40
+
+
+@pytest.fixture(scope='module')
+def transactions(make_csv):
+    return read_transactions(make_csv('bank'))
+
+
+@pytest.mark.parametrize('distinct', [100, 5000, 200000])
+def test_hyperloglog_error_within_bound(distinct):
+    values = np.random.default_rng(distinct).permutation(np.arange(distinct) * 7919)
+    sketch = HyperLogLog().update(np.concatenate([values, values[:distinct // 2]]))
+    estimate, half_width = sketch.interval()
+    assert abs(estimate - distinct) <= 3 * sketch.relative_error * distinct
+    assert half_width == pytest.approx(1.96 * sketch.relative_error * estimate, rel=1e-3)
+    # Слияние скетчей частей - скетч объединения
+    left, right = HyperLogLog().update(values[::2]), HyperLogLog().update(values[1::2])
+    np.testing.assert_array_equal(left.merge(right).registers, HyperLogLog().update(values).registers)
+
+
+def test_confidence_intervals_cover_exact_totals(transactions):
+    total = transactions['amount'].sum()
+    by_category = transactions.groupby('category', observed=True)['amount'].sum()
+    covered, category_covered = 0, 0
+    for seed in range(TRIALS):
+        sample = StratifiedSample(capacity=100, seed=seed).update(transactions)
+        tables, info = sample.report(['basic_statistics', 'category_analysis'])
+        assert info['sample_rows'] < info['population'] == len(transactions)
+        summary = tables['basic_statistics']['summary'].iloc[0]
+        covered += abs(summary['total_volume'] - total) <= summary['total_volume_ci']
+        categories = tables['category_analysis']['categories'].set_index('category')
+        errors = (categories['total_amount'] - by_category.reindex(categories.index)).abs()
+        category_covered += (errors <= categories['total_amount_ci']).mean()
+    # Номинальное покрытие 95%; запас на разброс 40 испытаний
+    assert covered / TRIALS >= 0.85
+    assert category_covered / TRIALS >= 0.85
+
+
+def test_exact_parts_of_sample_report(transactions):
+    sample = StratifiedSample(capacity=100).update(transactions)
+    summary = sample.report(['basic_statistics'])[0]['basic_statistics']['summary'].iloc[0]
+    assert summary['total_transactions'] == len(transactions)
+    assert summary['max_transaction'] == transactions['amount'].max()
+    assert summary['min_transaction'] == transactions['amount'].min()
+    assert abs(summary['unique_users'] - transactions['user_id'].nunique()) <= summary['unique_users_ci']
+    # Выборка по чанкам - та же, что за один проход
+    chunked = StratifiedSample(capacity=100)
+    for part in np.array_split(np.arange(len(transactions)), 5):
+        chunked.update(transactions.iloc[part])
+    assert np.array_equal(chunked.population, sample.population)
+    assert len(chunked) == len(sample) == 100 * len(sample.keys)
+
+
+def test_refinement_stops_at_target_error(transactions):
+    sample = StratifiedSample(capacity=1200).update(transactions)
+    loose = sample.report(['basic_statistics', 'monthly_trends'], target_error=0.5)[1]
+    tight = sample.report(['basic_statistics', 'monthly_trends'], target_error=0.001)[1]
+    assert loose['per_stratum'] < tight['per_stratum'] == 1200
+    assert loose['relative_error'] <= 0.5 and tight['relative_error'] < loose['relative_error']
+    assert capacity_for(0.01) == 38415
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from benchmark import compare, main, run_benchmarks
+from sql import BankTransactionAnalyzer
+
+
+def _report(**seconds):
+    return {'results': [{'case': case, 'rows': 1000, 'seconds': value} for case, value in seconds.items()]}
+
+
+def test_compare_flags_only_slowdowns_above_threshold():
+    baseline = _report(fast=1.0, edge=1.0, slow=1.0, zero=0.0)
+    current = _report(fast=0.5, edge=1.09, slow=1.5, zero=1.0, new=2.0)
+    assert compare(baseline, current) == [('slow', 1000, 1.5)]
+    assert [case for case, _, _ in compare(baseline, current, threshold=0.05)] == ['edge', 'slow']
+    # Тот же замер на другом размере данных не сравнивается
+    assert compare(baseline, {'results': [{'case': 'slow', 'rows': 10, 'seconds': 9.0}]}) == []
+
+
+@pytest.fixture(scope='module')
+def analyzer_run(tmp_path_factory):
+    root = tmp_path_factory.mktemp('benchmarks')
+    output = str(root / 'results.json')
+    report = run_benchmarks([2000], ('analyzer',), fixture_dir=str(root / 'fixtures'), output=output)
+    return root, output, report
+
+
+def test_run_benchmarks_measures_each_section(analyzer_run):
+    _, output, report = analyzer_run
+    with open(output) as f:
+        assert json.load(f) == report
+    cases = [result['case'] for result in report['results']]
+    assert cases == ['analyzer_init'] + [f'section.{name}' for name in BankTransactionAnalyzer.SECTIONS]
+    for result in report['results']:
+        assert result['rows'] == 2000 and result['group'] == 'analyzer'
+        assert result['seconds'] > 0 and result['peak_rss_mb'] >= result['baseline_rss_mb'] > 0
+
+
+def test_main_exit_code_reports_regressions(analyzer_run):
+    root, output, report = analyzer_run
+    args = ['--sizes', '2000', '--groups', 'analyzer', '--fixtures', str(root / 'fixtures'),
+            '--output', str(root / 'rerun.json'), '--compare']
+    faster, slower = str(root / 'faster.json'), str(root / 'slower.json')
+    for path, factor in ((faster, 1e-3), (slower, 1e3)):
+        with open(path, 'w') as f:
+            json.dump({'results': [dict(result, seconds=result['seconds'] * factor)
+                                   for result in report['results']]}, f)
+    assert main(args + [faster]) == 1
+    assert main(args + [slower]) == 0
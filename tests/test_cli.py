@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+from cli import main, measure_import_times
+from conftest import END_DATE, assert_tables_equal
+from generate_data import generate_transactions
+from sql import BankTransactionAnalyzer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_generate_matches_library(tmp_path):
+    output = str(tmp_path / 'cli.csv')
+    assert main(['generate', '500', '--output', output, '--schema', 'bank', '--seed', '3',
+                 '--end-date', END_DATE.isoformat()]) == 0
+    expected = str(tmp_path / 'library.csv')
+    generate_transactions(500, output_file=expected, seed=3, schema='bank', end_date=END_DATE)
+    with open(output) as left, open(expected) as right:
+        assert left.read() == right.read()
+
+
+def test_analyze_json_matches_report(make_csv, tmp_path):
+    csv_file, output = make_csv('bank'), str(tmp_path / 'report.json')
+    assert main(['analyze', csv_file, '--mode', 'sql', '--format', 'json', '--output', output,
+                 '--sections', 'category_analysis', 'monthly_trends', '--start', '2026-08-01',
+                 '--types', 'debit']) == 0
+    with open(output) as f:
+        data = json.load(f)
+    assert data['meta']['segment'] == {'start': '2026-08-01 00:00:00', 'transaction_types': ['debit']}
+
+    analyzer = BankTransactionAnalyzer(csv_file)
+    expected = analyzer.analyze('sql', sections=['category_analysis', 'monthly_trends'],
+                                segment={'start': '2026-08-01', 'transaction_types': ['debit']})
+    analyzer.close()
+    assert [section['section'] for section in data['sections']] == list(expected)
+    for section in data['sections']:
+        for name, records in section['tables'].items():
+            assert_tables_equal(records, expected[section['section']][name], name)
+
+
+def test_analyze_text_and_unknown_sections(make_csv, capsys):
+    assert main(['analyze', make_csv('bank'), '--sections', 'aml_compliance_check']) == 0
+    out = capsys.readouterr().out
+    assert 'Время разделов, с: aml_compliance_check=' in out
+    assert main(['analyze', make_csv('bank'), '--sections', 'no_such_section']) == 2
+    assert 'Неизвестные разделы: no_such_section' in capsys.readouterr().err
+
+
+def test_analyze_does_not_import_plotting(make_csv):
+    code = ("import sys, cli; cli.main(['analyze', sys.argv[1], '--format', 'json', "
+            "'--sections', 'basic_statistics']); print(sorted({'matplotlib', 'seaborn', 'visualization'} "
+            "& set(sys.modules)))")
+    completed = subprocess.run([sys.executable, '-c', code, make_csv('bank')], cwd=ROOT, capture_output=True,
+                               text=True, check=True)
+    assert completed.stdout.splitlines()[-1] == '[]'
+
+
+def test_render_selected_charts(make_csv, tmp_path, capsys):
+    output_dir = str(tmp_path / 'charts')
+    assert main(['render', make_csv('bank'), '--charts', 'temporal_trends', 'top_users', '--formats', 'png',
+                 'svg', '--output-dir', output_dir, '--dpi', '20', '--categories', 'food']) == 0
+    assert sorted(os.listdir(output_dir)) == ['temporal_trends.png', 'temporal_trends.svg',
+                                              'top_users.png', 'top_users.svg']
+    assert main(['render', make_csv('bank'), '--charts', 'pie']) == 2
+    assert 'Неизвестные графики: pie' in capsys.readouterr().err
+
+
+def test_benchmark_arguments_pass_through(tmp_path):
+    output = str(tmp_path / 'results.json')
+    assert main(['benchmark', '--sizes', '1000', '--groups', 'analyzer', '--fixtures', str(tmp_path),
+                 '--output', output]) == 0
+    with open(output) as f:
+        assert json.load(f)['results'][0]['case'] == 'analyzer_init'
+
+
+def test_import_times_of_analyze():
+    result, = measure_import_times(['analyze'], repeat=1, top=3)
+    assert result['command'] == 'analyze'
+    assert 0 < result['import_seconds'] < result['process_seconds']
+    assert len(result['heaviest']) == 3
+    assert result['heaviest'][0]['seconds'] >= result['heaviest'][-1]['seconds']
@@ -0,0 +1,61 @@
+import shutil
+
+from conftest import assert_reports_equal
+from sql import SQLITE_INDEXES, BankTransactionAnalyzer
+
+
+def _sql_report(csv_file, **kwargs):
+    analyzer = BankTransactionAnalyzer(csv_file, **kwargs)
+    try:
+        return analyzer.analyze('sql')
+    finally:
+        analyzer.close()
+
+
+def _append_csv(target, source):
+    """Дописывание строк source (без заголовка) в конец target"""
+    with open(source) as f:
+        rows = f.readlines()[1:]
+    with open(target, 'a') as f:
+        f.writelines(rows)
+
+
+def test_database_file_is_built_once_and_extended(make_csv, tmp_path, capsys):
+    csv_file, db_file = str(tmp_path / 'transactions.csv'), str(tmp_path / 'transactions.db')
+    shutil.copy(make_csv('bank', num_records=5000), csv_file)
+
+    analyzer = BankTransactionAnalyzer(csv_file, db_file=db_file)
+    assert "База данных построена" in capsys.readouterr().out
+    indexes = {row[0] for row in analyzer.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert indexes.issuperset(SQLITE_INDEXES)
+    assert_reports_equal(analyzer.analyze('sql'), _sql_report(csv_file))
+    analyzer.close()
+
+    # Повторное открытие при неизменном источнике ничего не перезагружает
+    reopened = BankTransactionAnalyzer(csv_file, db_file=db_file)
+    assert "База данных актуальна" in capsys.readouterr().out
+    assert reopened.conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 5000
+    reopened.close()
+
+    # Дописанные в CSV строки догружаются инкрементально
+    _append_csv(csv_file, make_csv('bank', num_records=1000, seed=8))
+    extended = BankTransactionAnalyzer(csv_file, db_file=db_file)
+    assert "База данных дополнена новыми транзакциями" in capsys.readouterr().out
+    assert extended.conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 6000
+    assert_reports_equal(extended.analyze('sql'), _sql_report(csv_file))
+    extended.close()
+
+
+def test_database_file_is_rebuilt_for_new_source(make_csv, tmp_path, capsys):
+    csv_file, db_file = str(tmp_path / 'transactions.csv'), str(tmp_path / 'transactions.db')
+    shutil.copy(make_csv('bank', num_records=5000), csv_file)
+    BankTransactionAnalyzer(csv_file, db_file=db_file).close()
+
+    # Источник переписан целиком: база строится заново, а не дополняется
+    shutil.copy(make_csv('bank', num_records=1000, seed=8), csv_file)
+    capsys.readouterr()
+    analyzer = BankTransactionAnalyzer(csv_file, db_file=db_file)
+    assert "База данных построена" in capsys.readouterr().out
+    assert analyzer.conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 1000
+    assert_reports_equal(analyzer.analyze('sql'), _sql_report(csv_file))
+    analyzer.close()
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from conftest import END_DATE
+from generate_data import generate_transactions
+
+
+def _generate(path, **kwargs):
+    return generate_transactions(5000, output_file=str(path), end_date=END_DATE, chunk_size=700, **kwargs)
+
+
+@pytest.mark.parametrize('schema', ['basic', 'bank'])
+def test_output_does_not_depend_on_workers(tmp_path, schema):
+    serial = _generate(tmp_path / 'serial.csv', seed=11, schema=schema, shards=4, workers=1)
+    parallel = _generate(tmp_path / 'parallel.csv', seed=11, schema=schema, shards=4, workers=2)
+    with open(serial, 'rb') as a, open(parallel, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_shards_cover_ids_once(tmp_path):
+    paths = _generate(tmp_path / 'sharded.csv', seed=3, shards=3, workers=2, merge=False)
+    assert len(paths) == 3
+    frames = [pd.read_csv(path) for path in paths]
+    assert [len(frame) for frame in frames] == [1667, 1667, 1666]
+    ids = pd.concat(frames)['transaction_id']
+    assert ids.tolist() == list(range(1, 5001))
+    # Слитый файл - шарды по порядку с одним заголовком
+    merged = pd.read_csv(_generate(tmp_path / 'merged.csv', seed=3, shards=3, workers=2))
+    pd.testing.assert_frame_equal(merged, pd.concat(frames, ignore_index=True))
+
+
+def test_seed_changes_output_and_none_is_fresh_entropy(tmp_path):
+    first = pd.read_csv(_generate(tmp_path / 'a.csv', seed=1))
+    again = pd.read_csv(_generate(tmp_path / 'b.csv', seed=1))
+    other = pd.read_csv(_generate(tmp_path / 'c.csv', seed=2))
+    pd.testing.assert_frame_equal(first, again)
+    assert not first['amount'].equals(other['amount'])
+
+    # Без seed каждый запуск берет новую энтропию: файлы корректны, но различны
+    unseeded = [pd.read_csv(_generate(tmp_path / f'none{i}.csv', seed=None, shards=2, workers=2)) for i in range(2)]
+    assert [len(frame) for frame in unseeded] == [5000, 5000]
+    assert unseeded[0]['transaction_id'].tolist() == list(range(1, 5001))
+    assert not unseeded[0]['amount'].equals(unseeded[1]['amount'])
+
+
+def test_unknown_schema(tmp_path):
+    with pytest.raises(ValueError):
+        _generate(tmp_path / 'x.csv', schema='unknown')
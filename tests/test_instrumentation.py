@@ -0,0 +1,70 @@
+import json
+import threading
+
+from instrumentation import NULL_TRACER, Tracer
+from sql import BankTransactionAnalyzer
+
+
+def _nested():
+    """Трассировка outer(3 мс) -> inner(1 мс), inner(0.5 мс) с заданными длительностями"""
+    tracer = Tracer(memory=False)
+    with tracer.span('outer', 'analysis', source='test') as outer:
+        with tracer.span('inner', 'sql') as first:
+            first.set(rows=10, plan=['SCAN transactions'])
+        with tracer.span('inner', 'sql') as second:
+            pass
+    outer.start, outer.duration = 0.0, 0.003
+    first.start, first.duration = 0.0005, 0.001
+    second.start, second.duration = 0.002, 0.0005
+    return tracer
+
+
+def test_folded_stacks_hold_self_time(tmp_path):
+    with open(_nested().export_folded(str(tmp_path / 'trace.folded'))) as f:
+        assert f.read().splitlines() == ['outer;inner 1500', 'outer 1500']
+
+
+def test_chrome_trace_events(tmp_path):
+    with open(_nested().export_chrome_trace(str(tmp_path / 'trace.json'))) as f:
+        trace = json.load(f)
+    events = trace['traceEvents']
+    assert [(e['name'], e['cat'], e['ph'], e['ts'], e['dur']) for e in events] == [
+        ('outer', 'analysis', 'X', 0.0, 3000.0), ('inner', 'sql', 'X', 500.0, 1000.0),
+        ('inner', 'sql', 'X', 2000.0, 500.0)]
+    assert events[0]['args']['source'] == 'test'
+    assert events[1]['args']['rows'] == 10 and events[1]['args']['plan'] == ['SCAN transactions']
+    assert {e['tid'] for e in events} == {threading.get_ident()}
+
+
+def test_json_export_and_summary(tmp_path):
+    tracer = _nested()
+    with open(tracer.export_json(str(tmp_path / 'spans.json'))) as f:
+        spans = json.load(f)['spans']
+    assert [s['path'] for s in spans] == ['outer', 'outer;inner', 'outer;inner']
+    summary = tracer.summary()
+    assert list(summary.index) == ['outer', 'inner']
+    assert summary.loc['inner', 'count'] == 2 and summary.loc['inner', 'rows'] == 10
+    assert summary.loc['inner', 'seconds'] == 0.0015
+
+
+def test_iterate_traces_each_chunk():
+    tracer = Tracer(memory=False)
+    assert list(tracer.iterate([[1, 2], [3]], 'load.read_chunk')) == [[1, 2], [3]]
+    assert [span.rows for span in tracer.spans] == [2, 1, 0]
+    assert NULL_TRACER.span('ignored').__enter__().set(rows=1) is None
+    assert NULL_TRACER.spans == ()
+
+
+def test_analyzer_spans_nest_sections_and_queries(make_csv):
+    tracer = Tracer()
+    analyzer = BankTransactionAnalyzer(make_csv('bank'), tracer=tracer)
+    analyzer.analyze('sql')
+    analyzer.close()
+    paths = {span.path() for span in tracer.spans}
+    assert {'load.read', 'load.to_sql', 'analysis'} <= paths
+    for name in BankTransactionAnalyzer.SECTIONS:
+        assert f'analysis;section.{name};sql' in paths
+    queries = [span for span in tracer.spans if span.name == 'sql']
+    # Каждый запрос несет свой план и число строк результата
+    assert all(span.attrs['plan'] and span.rows is not None for span in queries)
+    assert all(span.memory_delta is not None for span in tracer.spans)
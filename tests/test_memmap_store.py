@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import assert_reports_equal, assert_tables_equal
+from memmap_store import MemmapStore, write_memmap_store
+from sql import BankTransactionAnalyzer
+from storage import read_transactions
+
+
+@pytest.fixture(scope='module')
+def store(make_csv, tmp_path_factory):
+    """CSV схемы bank и тот же CSV в хранилище memmap"""
+    csv_file = make_csv('bank')
+    return csv_file, write_memmap_store(csv_file, str(tmp_path_factory.mktemp('memmap') / 'store'), chunksize=3000)
+
+
+def test_memmap_store_round_trip(store):
+    csv_file, path = store
+    assert_tables_equal(read_transactions(path), read_transactions(csv_file))
+
+    mapped = MemmapStore(path)
+    assert mapped.rows == 20000
+    # Целые и коды словаря сужены после записи всех чанков
+    assert mapped.array('transaction_id').dtype == np.uint16
+    assert mapped.array('user_id').dtype == np.uint8
+    assert mapped.array('category').dtype == np.int8
+    assert sorted(mapped.categories('category')) == sorted(read_transactions(csv_file)['category'].cat.categories)
+
+
+def _mapped(values):
+    """Массив - представление отображенного в память файла, а не копия"""
+    while values is not None and not isinstance(values, np.memmap):
+        values = getattr(values, 'base', None)
+    return values is not None
+
+
+def test_memmap_frame_does_not_copy_numbers(store):
+    _, path = store
+    frame = MemmapStore(path).frame(['amount', 'user_id'])
+    assert _mapped(frame['amount'].to_numpy())
+    assert _mapped(frame['user_id'].to_numpy())
+
+
+def test_memmap_projection_and_filters(store):
+    csv_file, path = store
+    columns = ['transaction_id', 'amount', 'merchant']
+    filters = [('month', '==', '2026-09'), ('amount', '>', 10000)]
+    chunks = list(MemmapStore(path).iter_frames(columns, filters, chunksize=4000))
+    assert all(list(chunk.columns) == columns for chunk in chunks)
+    assert_tables_equal(read_transactions(path, columns, filters), read_transactions(csv_file, columns, filters))
+
+
+def test_memmap_store_feeds_analyzer(store):
+    csv_file, path = store
+    reports = []
+    for source in (path, csv_file):
+        analyzer = BankTransactionAnalyzer(source)
+        reports.append(analyzer.analyze('sql'))
+        analyzer.close()
+    assert_reports_equal(*reports)
+
+
+def test_memmap_store_keeps_foreign_directory(store, tmp_path):
+    csv_file, _ = store
+    (tmp_path / 'notes.txt').write_text('')
+    with pytest.raises(ValueError):
+        write_memmap_store(csv_file, str(tmp_path))
+    assert os.listdir(tmp_path) == ['notes.txt']
@@ -0,0 +1,38 @@
+import pytest
+
+from conftest import assert_chart_data_equal, assert_reports_equal
+from sql import BankTransactionAnalyzer
+from storage import chunksize_for_memory
+from visualization import BankDataVisualizer
+
+
+def test_chunksize_follows_memory_limit(make_csv):
+    csv_file = make_csv('bank')
+    small, large = chunksize_for_memory(csv_file, 1), chunksize_for_memory(csv_file, 16)
+    assert 1000 <= small < large
+    assert large == pytest.approx(16 * small, rel=0.01)
+    # Нижняя граница - тысяча строк даже при ничтожном лимите
+    assert chunksize_for_memory(csv_file, 0.001) == 1000
+
+
+def test_out_of_core_report_matches_sql(make_csv):
+    csv_file = make_csv('bank')
+    streaming = BankTransactionAnalyzer(csv_file, out_of_core=True, chunksize=3000)
+    assert streaming.conn is None and streaming._df is None
+    report = streaming.analyze()
+    assert report.mode == 'fused'
+    # Данные так и не загружены целиком
+    assert streaming._df is None
+
+    sql = BankTransactionAnalyzer(csv_file)
+    try:
+        assert_reports_equal(report, sql.analyze('sql'))
+    finally:
+        sql.close()
+
+
+def test_out_of_core_chart_data_matches_in_memory(make_csv):
+    csv_file = make_csv('bank')
+    streaming = BankDataVisualizer(csv_file, out_of_core=True, chunksize=3000)
+    assert streaming.df is None
+    assert_chart_data_equal(streaming.chart_data(), BankDataVisualizer(csv_file).chart_data())
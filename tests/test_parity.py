@@ -0,0 +1,92 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import _round
+from conftest import assert_reports_equal, assert_tables_equal
+from sql import BankTransactionAnalyzer
+
+SEGMENTS = [
+    None,
+    {'end': '2026-08-01'},
+    {'start': '2026-08-10', 'end': '2026-08-16'},
+    # День: у пользователей по 1-3 операции, средние вида x.xx5 проверяют округление половины
+    {'start': '2026-08-11', 'end': '2026-08-11'},
+    {'start': '2026-09-01 10:30:00', 'categories': ['food', 'shopping']},
+    {'user_ids': [7, 41, 76], 'transaction_types': 'debit'},
+]
+
+
+@pytest.fixture(scope='module', params=['bank', 'basic'])
+def analyzer(request, make_csv):
+    analyzer = BankTransactionAnalyzer(make_csv(request.param))
+    yield analyzer
+    analyzer.conn.close()
+
+
+@pytest.mark.parametrize('segment', SEGMENTS)
+def test_fused_matches_sql(analyzer, segment):
+    assert_reports_equal(analyzer.analyze('fused', segment=segment), analyzer.analyze('sql', segment=segment))
+
+
+def test_incremental_matches_sql_after_append(make_csv, tmp_path):
+    source = pd.read_csv(make_csv('basic'))
+    csv_file = tmp_path / 'history.csv'
+    source.iloc[:15000].to_csv(csv_file, index=False)
+    analyzer = BankTransactionAnalyzer(str(csv_file))
+    analyzer.maintain_aggregates()
+    analyzer.append(source.iloc[15000:])
+    assert_reports_equal(analyzer.analyze('incremental'), analyzer.analyze('sql'))
+
+
+def test_db_file_history_keeps_appended_rows(make_csv, tmp_path):
+    source = pd.read_csv(make_csv('bank'))
+    csv_file, db_file = tmp_path / 'history.csv', str(tmp_path / 'history.db')
+    source.iloc[:15000].to_csv(csv_file, index=False)
+    writer = BankTransactionAnalyzer(str(csv_file), db_file=db_file)
+    writer.append(source.iloc[15000:])
+    writer.conn.close()
+
+    analyzer = BankTransactionAnalyzer(str(csv_file), db_file=db_file)
+    assert len(analyzer.df) == len(source)
+    analyzer._df = None
+    assert_reports_equal(analyzer.analyze('fused'), analyzer.analyze('sql'))
+    assert analyzer.analyze('fused')['basic_statistics']['summary']['total_transactions'][0] == len(source)
+
+
+def test_round_matches_sqlite():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.integers(-10 ** 9, 10 ** 9, 20000) / 1000, rng.integers(0, 10 ** 6, 20000) / 200,
+                             rng.random(20000) * 1e6, [17525.505, 2.675, -2.675, 0.125, 1.005]])
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE t (x REAL)')
+    conn.executemany('INSERT INTO t VALUES (?)', [(float(x),) for x in values])
+    expected = np.array([row[0] for row in conn.execute('SELECT ROUND(x, 2) FROM t ORDER BY rowid')])
+    np.testing.assert_array_equal(_round(values), expected)
+    assert _round(17525.505) == 17525.51
+
+
+def test_sql_mode_requires_database(make_csv):
+    analyzer = BankTransactionAnalyzer(make_csv('bank'), out_of_core=True)
+    with pytest.raises(ValueError, match='db_file'):
+        analyzer.analyze('sql')
+    with pytest.raises(ValueError, match='db_file'):
+        analyzer.section('basic_statistics')
+    # Режим по умолчанию без базы - fused
+    assert analyzer.analyze().mode == 'fused'
+
+
+def test_approximate_with_full_sample_matches_sql(make_csv):
+    # Выборка вмещает все строки: оценки точны, и округление то же, что у SQL.
+    # Число пользователей оценивает HyperLogLog - оно приближенное при любой выборке
+    analyzer = BankTransactionAnalyzer(make_csv('basic'))
+    analyzer.approximate(capacity=10 ** 6)
+    approximate, sql = analyzer.analyze('approximate'), analyzer.analyze('sql')
+    analyzer.conn.close()
+    for name in sql:
+        for table, expected in sql[name].items():
+            columns = [column for column in expected.columns if column in approximate[name][table].columns
+                       and column not in ('unique_users', 'users_involved')]
+            assert_tables_equal(approximate[name][table][columns], expected[columns], f'{name}.{table}')
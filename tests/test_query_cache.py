@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from query_cache import QueryCache
+from sql import BankTransactionAnalyzer
+
+
+def test_fingerprint_separates_databases_and_appended_batches(make_csv, tmp_path):
+    csv_file = make_csv('bank')
+    batch = pd.read_csv(csv_file).head(5)
+    first = BankTransactionAnalyzer(csv_file, db_file=str(tmp_path / 'first.db'))
+    second = BankTransactionAnalyzer(csv_file, db_file=str(tmp_path / 'second.db'))
+    assert first._fingerprint != second._fingerprint
+
+    memory, other = BankTransactionAnalyzer(csv_file), BankTransactionAnalyzer(csv_file)
+    assert memory._fingerprint == other._fingerprint
+    memory.append(batch)
+    other.append(batch.assign(amount=batch['amount'] + 1))
+    assert memory._fingerprint != other._fingerprint
+
+    # Версия дописанных строк хранится в файловой базе и переживает переоткрытие
+    first.append(batch)
+    fingerprint = first._fingerprint
+    first.conn.close()
+    assert BankTransactionAnalyzer(csv_file, db_file=str(tmp_path / 'first.db'))._fingerprint == fingerprint
+
+
+def test_disk_cache_evicts_least_recently_read(tmp_path):
+    cache = QueryCache(max_entries=1, cache_dir=str(tmp_path), max_disk_mb=1)
+    value = np.zeros(30000)  # ~240 КБ: на диске помещаются четыре записи
+    for i in range(5):
+        cache.put(f'key{i}', value)
+        os.utime(cache._path(f'key{i}'), (i, i))
+    # Чтение с диска продлевает жизнь записи
+    assert cache.get('key1') is not None
+    cache.put('key5', value)
+    assert sorted(os.listdir(tmp_path)) == ['key1.pkl', 'key3.pkl', 'key4.pkl', 'key5.pkl']
+    assert cache.stats()['evictions'] == 2
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import assert_tables_equal
+from results import AmlCompliance, BasicStatistics, section_result
+from sql import BankTransactionAnalyzer
+
+
+@pytest.fixture(scope='module')
+def report(make_csv):
+    analyzer = BankTransactionAnalyzer(make_csv('bank'))
+    yield analyzer.analyze('sql')
+    analyzer.close()
+
+
+def test_report_json_round_trip(report):
+    data = json.loads(report.to_json())
+    assert data['mode'] == 'sql' and data['meta'] is None
+    assert [section['section'] for section in data['sections']] == list(BankTransactionAnalyzer.SECTIONS)
+    for section in data['sections']:
+        result = report[section['section']]
+        assert section['seconds'] == result.seconds
+        assert list(section['tables']) == list(result)
+        for name, records in section['tables'].items():
+            table = result[name]
+            assert_tables_equal(pd.DataFrame(records, columns=table.columns), table, f"{section['section']}.{name}")
+
+
+def test_json_writes_shortest_floats_and_nulls():
+    result = BasicStatistics({'summary': pd.DataFrame({'total_volume': [685397890.66, np.nan],
+                                                       'month': ['2026-09', None]})}, seconds=0.5)
+    assert result.to_json() == ('{"section": "basic_statistics", "seconds": 0.5, "tables": {"summary": '
+                                '[{"total_volume": 685397890.66, "month": "2026-09"}, '
+                                '{"total_volume": null, "month": null}]}}')
+
+
+def test_report_arrow_tables(report):
+    tables = report.to_arrow()
+    assert list(tables) == list(report)
+    for name, result in report.items():
+        for table, frame in result.items():
+            arrow = tables[name][table]
+            assert arrow.column_names == [str(column) for column in frame.columns]
+            assert_tables_equal(arrow.to_pandas(), frame, f'{name}.{table}')
+    # Числовой столбец без пропусков передается в Arrow без копирования
+    months = report['monthly_trends'].months
+    volume = tables['monthly_trends']['months'].column('monthly_volume').chunk(0)
+    assert volume.buffers()[1].address == months['monthly_volume'].to_numpy().ctypes.data
+
+
+def test_typed_section_accessors(report):
+    aml = report['aml_compliance_check']
+    assert isinstance(aml, AmlCompliance)
+    assert aml.total_suspicious == aml.summary['total_suspicious'][0] > 0
+    assert report['monthly_trends'].months is report['monthly_trends']['months']
+    assert not report['suspicious_activity_detection'].ranked_by_score
+    assert set(report.timings()) == set(BankTransactionAnalyzer.SECTIONS)
+    # Готовый результат не оборачивается повторно
+    assert section_result('aml_compliance_check', aml) is aml
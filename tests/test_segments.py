@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from conftest import assert_reports_equal
+from segments import Segment
+from sql import BankTransactionAnalyzer
+from storage import write_parquet_dataset
+
+
+@pytest.fixture(scope='module')
+def analyzer(make_csv):
+    analyzer = BankTransactionAnalyzer(make_csv('basic'))
+    yield analyzer
+    analyzer.conn.close()
+
+
+def _count(analyzer, mode, segment):
+    return analyzer.analyze(mode, sections=['basic_statistics'], segment=segment)[
+        'basic_statistics']['summary']['total_transactions'][0]
+
+
+@pytest.mark.parametrize('bounds', [
+    lambda ts: {'start': ts},
+    lambda ts: {'end': ts},
+    lambda ts: {'start': ts + pd.Timedelta(microseconds=1)},
+    lambda ts: {'start': ts - pd.Timedelta(seconds=1), 'end': ts - pd.Timedelta(microseconds=1)},
+])
+def test_sql_bounds_keep_microseconds(analyzer, bounds):
+    timestamp = analyzer.df['transaction_date'].sort_values().iloc[len(analyzer.df) // 2]
+    assert timestamp.microsecond
+    segment = Segment.of(bounds(timestamp))
+    expected = len(segment.apply(analyzer.df))
+    assert _count(analyzer, 'sql', segment) == _count(analyzer, 'fused', segment) == expected
+
+
+def test_sql_bound_text_matches_stored_rows(analyzer):
+    stored = analyzer.conn.execute('SELECT transaction_date FROM transactions LIMIT 1').fetchone()[0]
+    _, params = Segment(start=stored).sql()
+    assert params == [stored]
+
+
+@pytest.fixture(scope='module')
+def bank_sources(make_csv, tmp_path_factory):
+    """SQL-анализатор по CSV схемы bank и потоковый по тому же CSV в Parquet-датасете по месяцам"""
+    csv_file = make_csv('bank')
+    dataset = write_parquet_dataset(csv_file, str(tmp_path_factory.mktemp('parquet') / 'dataset'), chunksize=5000)
+    sql, streaming = BankTransactionAnalyzer(csv_file), BankTransactionAnalyzer(dataset, out_of_core=True)
+    yield sql, streaming
+    sql.conn.close()
+
+
+@pytest.mark.parametrize('segment, scanned', [
+    ({'start': '2026-08-10', 'end': '2026-08-16'}, 1),
+    ({'start': '2026-08-28', 'end': '2026-09-03'}, 2),
+    ({'start': '2026-08-01', 'end': '2026-08-31', 'locations': ['City_3', 'City_8']}, 1),
+    ({'start': '2026-09-15'}, 2),
+    ({'merchants': 'Uber'}, 4),
+])
+def test_parquet_slice_prunes_month_partitions(bank_sources, segment, scanned):
+    sql, streaming = bank_sources
+    report = streaming.analyze(segment=segment)
+    assert report.mode == 'fused'
+    expected = {'partitions': 4, 'scanned': scanned, 'pruned': 4 - scanned}
+    assert streaming.scan_stats == expected
+    assert report.meta['scan'] == expected
+    assert_reports_equal(report, sql.analyze('sql', segment=segment))
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from service import ReportService
+
+
+class _Writer:
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def _request(service, path):
+    reader, writer = asyncio.StreamReader(), _Writer()
+    reader.feed_data(f'GET {path} HTTP/1.1\r\n\r\n'.encode())
+    reader.feed_eof()
+    await service._handle(reader, writer)
+    head, body = writer.data.split(b'\r\n\r\n', 1)
+    return int(head.split(b' ', 2)[1]), body
+
+
+def _status(service, path):
+    return asyncio.run(_request(service, path))[0]
+
+
+def _concurrent(service, paths):
+    async def requests():
+        return await asyncio.gather(*(_request(service, path) for path in paths))
+
+    return asyncio.run(requests())
+
+
+@pytest.fixture(scope='module')
+def service(make_csv):
+    service = ReportService(make_csv('bank'), workers=2)
+    yield service
+    service.close()
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/sections/basic_statistics', 200),
+    ('/unknown', 404),
+    ('/sections/unknown', 404),
+    ('/charts/unknown.png', 404),
+    ('/sections/basic_statistics?start=not-a-date', 400),
+])
+def test_status_codes(service, path, status):
+    assert _status(service, path) == status
+
+
+def test_internal_key_error_is_server_error(service, monkeypatch):
+    def broken(*args, **kwargs):
+        raise KeyError('transaction_date')
+
+    monkeypatch.setattr(service.analyzer, 'section', broken)
+    assert _status(service, '/sections/category_analysis') == 500
+
+
+def test_full_reports_do_not_overlap(make_csv, tmp_path, monkeypatch):
+    # С файловой базой запросы разделов идут на нескольких потоках, а отчеты целиком - по одному
+    service = ReportService(make_csv('bank'), db_file=str(tmp_path / 'service.db'), workers=4)
+    analyze, active, overlaps = service.analyzer.analyze, [], []
+    lock = threading.Lock()
+
+    def tracked(*args, **kwargs):
+        with lock:
+            active.append(1)
+            overlaps.append(len(active))
+        try:
+            time.sleep(0.05)
+            return analyze(*args, **kwargs)
+        finally:
+            with lock:
+                active.pop()
+
+    monkeypatch.setattr(service.analyzer, 'analyze', tracked)
+    days = [f'2026-08-{day:02d}' for day in range(10, 16)]
+    try:
+        responses = _concurrent(service, [f'/report?mode=fused&start={day}&end={day}' for day in days]
+                                + ['/report?mode=incremental', '/sections/basic_statistics'])
+        expected = [json.loads(analyze('fused', segment={'start': day, 'end': day}).to_json()) for day in days]
+    finally:
+        service.close()
+    assert [status for status, _ in responses] == [200] * len(responses)
+    assert max(overlaps) == 1
+    for (_, body), report in zip(responses, expected):
+        assert [section['tables'] for section in json.loads(body)['sections']] == \
+            [section['tables'] for section in report['sections']]
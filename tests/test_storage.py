@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import assert_tables_equal
+from storage import (DICTIONARY_COLUMNS, compact_frame, concat_frames, iter_transactions, memory_footprint,
+                     read_transactions, scan_plan, write_parquet_dataset)
+
+MONTHS = ['month=2026-07', 'month=2026-08', 'month=2026-09', 'month=2026-10']
+
+
+@pytest.fixture(scope='module')
+def dataset(make_csv, tmp_path_factory):
+    """CSV схемы bank и тот же CSV в Parquet-датасете по месяцам"""
+    csv_file = make_csv('bank')
+    path = write_parquet_dataset(csv_file, str(tmp_path_factory.mktemp('parquet') / 'dataset'), chunksize=5000)
+    return csv_file, path
+
+
+def _by_id(df):
+    return df.sort_values('transaction_id').reset_index(drop=True)
+
+
+def test_parquet_dataset_round_trip(dataset):
+    csv_file, path = dataset
+    assert sorted(os.listdir(path)) == MONTHS
+    stored, source = read_transactions(path), read_transactions(csv_file)
+    # Колонка партиции в кадр не попадает, словарные колонки читаются как category
+    assert list(stored.columns) == list(source.columns)
+    assert isinstance(stored['merchant'].dtype, pd.CategoricalDtype)
+    assert_tables_equal(_by_id(stored), _by_id(source))
+
+
+def test_parquet_projection_and_filters(dataset):
+    csv_file, path = dataset
+    columns = ['transaction_id', 'amount']
+    filters = [('category', '==', 'food'), ('month', '==', '2026-08')]
+    stored = read_transactions(path, columns=columns, filters=filters)
+    assert list(stored.columns) == columns
+    assert len(stored)
+    assert_tables_equal(_by_id(stored), _by_id(read_transactions(csv_file, columns=columns, filters=filters)))
+    assert scan_plan(path, filters)['scanned'] == 1
+
+
+def test_parquet_chunks_cover_dataset(dataset):
+    csv_file, path = dataset
+    filters = [('transaction_date', '>=', pd.Timestamp('2026-09-15'))]
+    chunks = list(iter_transactions(path, filters=filters, chunksize=1000))
+    assert max(len(chunk) for chunk in chunks) <= 1000
+    assert_tables_equal(_by_id(concat_frames(chunks)), _by_id(read_transactions(csv_file, filters=filters)))
+
+
+def test_compact_schema_narrows_types(make_csv):
+    csv_file = make_csv('bank')
+    df, raw = read_transactions(csv_file), pd.read_csv(csv_file)
+    for column in DICTIONARY_COLUMNS:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype), column
+    assert df['transaction_id'].dtype == np.uint16 and df['user_id'].dtype == np.uint8
+    assert df['amount'].dtype == np.float64
+    assert pd.api.types.is_datetime64_any_dtype(df['transaction_date'])
+    assert df['is_suspicious'].dtype == bool
+    assert memory_footprint(df) < memory_footprint(raw) / 2
+    # Значения не меняются, меняются только типы
+    assert_tables_equal(df, raw.assign(transaction_date=pd.to_datetime(raw['transaction_date'])))
+
+
+def test_compact_float32_only_when_lossless(make_csv):
+    narrow, wide = read_transactions(make_csv('bank'), float32=True), read_transactions(make_csv('bank'))
+    assert narrow['amount'].dtype == np.float32
+    np.testing.assert_array_equal(np.round(narrow['amount'].astype(float), 2), wide['amount'])
+    # Копейки сумм от миллиона float32 не хранит: amount остается float64
+    wide = compact_frame(pd.DataFrame({'amount': [1234567.89, 0.01]}), float32=True)
+    assert wide['amount'].dtype == np.float64
+
+
+def test_compact_flags_and_signed_ids():
+    df = compact_frame(pd.DataFrame({'user_id': [-5, 300], 'is_suspicious': ['True', 'false']}))
+    assert df['user_id'].dtype == np.int16
+    assert df['is_suspicious'].tolist() == [True, False]
+    flags = compact_frame(pd.DataFrame({'is_suspicious': [' yes', '0']}))['is_suspicious']
+    assert flags.dtype == bool and flags.tolist() == [True, False]
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from conftest import assert_reports_equal
+from sql import BankTransactionAnalyzer
+
+
+def _monthly(analyzer):
+    return analyzer.analyze('sql', sections=['monthly_trends'])
+
+
+@pytest.fixture
+def history(make_csv, tmp_path):
+    """Первые 15000 строк CSV схемы basic как история и остаток как пачка для append()"""
+    source = pd.read_csv(make_csv('basic'))
+    csv_file = tmp_path / 'history.csv'
+    source.iloc[:15000].to_csv(csv_file, index=False)
+    return str(csv_file), source.iloc[15000:]
+
+
+def test_rollup_monthly_trends_match_sql(history):
+    csv_file, batch = history
+    rollups, plain = BankTransactionAnalyzer(csv_file), BankTransactionAnalyzer(csv_file)
+    rollups.time_rollups()
+    assert_reports_equal(_monthly(rollups), _monthly(plain))
+
+    rollups.append(batch)
+    plain.append(batch)
+    assert_reports_equal(_monthly(rollups), _monthly(plain))
+
+
+def test_rollup_monthly_trends_round_half_away_from_zero(history):
+    csv_file, batch = history
+    # Средние месяцев 0.125 и 1.005: SQLite ROUND дает 0.13 и 1.01, numpy - 0.12 и 1.0
+    ties = batch.head(4).assign(amount=[0.12, 0.13, 1.00, 1.01],
+                                transaction_date=['2030-01-05 10:00:00', '2030-01-06 11:00:00',
+                                                  '2030-02-05 10:00:00', '2030-02-06 11:00:00'])
+    rollups, plain = BankTransactionAnalyzer(csv_file), BankTransactionAnalyzer(csv_file)
+    rollups.time_rollups()
+    rollups.append(ties)
+    plain.append(ties)
+    months = _monthly(rollups)['monthly_trends']['months'].set_index('month')
+    assert months.loc[['2030-01', '2030-02'], 'avg_monthly_transaction'].tolist() == [0.13, 1.01]
+    assert_reports_equal(_monthly(rollups), _monthly(plain))
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from conftest import assert_reports_equal
+from sql import BankTransactionAnalyzer
+
+
+def _top_users(analyzer):
+    return analyzer.analyze('sql', sections=['user_behavior_analysis'])
+
+
+@pytest.fixture
+def history(make_csv, tmp_path):
+    source = pd.read_csv(make_csv('basic'))
+    csv_file = tmp_path / 'history.csv'
+    source.iloc[:15000].to_csv(csv_file, index=False)
+    return str(csv_file), source.iloc[15000:]
+
+
+def test_store_top_users_match_sql_after_append(history, tmp_path):
+    csv_file, batch = history
+    store_path = str(tmp_path / 'features.db')
+    featured, plain = BankTransactionAnalyzer(csv_file), BankTransactionAnalyzer(csv_file)
+    featured.user_features(store_path)
+    assert_reports_equal(_top_users(featured), _top_users(plain))
+
+    for part in (batch.iloc[:2500], batch.iloc[2500:]):
+        featured.append(part)
+        plain.append(part)
+        assert_reports_equal(_top_users(featured), _top_users(plain))
+
+    # Сохраненное хранилище построено по тем же данным и используется повторно
+    assert featured.features.get_meta('fingerprint') == featured._fingerprint
+
+
+def test_profile_dates_match_transactions_table(history):
+    csv_file, _ = history
+    analyzer = BankTransactionAnalyzer(csv_file)
+    store = analyzer.user_features()
+    expected = pd.read_sql_query('SELECT user_id, MIN(transaction_date) AS first_seen, '
+                                 'MAX(transaction_date) AS last_seen, COUNT(*) AS n '
+                                 'FROM transactions GROUP BY user_id', analyzer.conn).set_index('user_id')
+    for user_id in expected.index[:20]:
+        profile = store.profile(user_id)
+        assert (profile['first_seen'], profile['last_seen']) == \
+            tuple(expected.loc[user_id, ['first_seen', 'last_seen']])
+        assert profile['transaction_count'] == expected.loc[user_id, 'n']
+    # Даты схемы basic - с микросекундами, и профиль их сохраняет
+    assert '.' in store.profile(expected.index[0])['last_seen']
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from conftest import assert_chart_data_equal
+from visualization import BankDataVisualizer, _pyplot
+
+
+@pytest.fixture(scope='module')
+def visualizer(make_csv):
+    return BankDataVisualizer(make_csv('bank'))
+
+
+def test_segment_chart_data_matches_filtered(make_csv, visualizer):
+    segments = visualizer.segment_chart_data('location')
+    assert sorted(segments) == sorted(visualizer.df['location'].unique())
+    for city in sorted(segments)[:3]:
+        assert_chart_data_equal(segments[city], visualizer.filtered(locations=[city]).chart_data())
+    # Потоковый режим раскладывает чанки по кубам сегментов с тем же результатом
+    streaming = BankDataVisualizer(make_csv('bank'), out_of_core=True, chunksize=3000)
+    assert_chart_data_equal(streaming.segment_chart_data('location'), segments)
+
+
+def test_render_segments_headless(visualizer, tmp_path):
+    results = visualizer.render_segments('transaction_type', output_dir=str(tmp_path), formats=('png', 'svg'),
+                                         workers=2, dpi=20)
+    assert sorted(results) == ['credit', 'debit']
+    for name, (paths, timings) in results.items():
+        assert paths == [str(tmp_path / f'dashboard_{name}.png'), str(tmp_path / f'dashboard_{name}.svg')]
+        with open(paths[0], 'rb') as f:
+            assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+        with open(paths[1]) as f:
+            assert '<svg' in f.read()
+        assert set(timings) == set(BankDataVisualizer.PANELS) | {'savefig'}
+
+
+def test_headless_dashboard_closes_figure(visualizer, tmp_path):
+    plt = _pyplot()
+    plt.close('all')
+    output = str(tmp_path / 'dashboard.png')
+    assert visualizer.create_comprehensive_dashboard(output, show=False, dpi=20) == [output]
+    assert os.path.getsize(output) > 0
+    assert plt.get_fignums() == []
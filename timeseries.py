@@ -0,0 +1,200 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from storage import sqlite_round
+
+# Уровни временных сверток от мелкого к крупному
+LEVELS = ('hour', 'day', 'week', 'month')
+
+MEASURES = {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}
+
+# Потолок точек временного ряда на графике
+MAX_POINTS = 500
+
+
+def _period_start(index, level):
+    """Начало периода уровня level для меток index (начала часов)"""
+    if level == 'hour':
+        return index
+    days = index.normalize()
+    if level == 'day':
+        return days
+    if level == 'week':
+        # Неделя начинается с понедельника
+        return days - pd.to_timedelta(days.dayofweek, unit='D')
+    return pd.DatetimeIndex(days.values.astype('datetime64[M]').astype('datetime64[ns]'))
+
+
+def _combine(total, part):
+    """Слияние свертки с агрегатами чанка: пересчитываются только периоды, которые есть в чанке.
+
+    Уже известные периоды обновляются на месте, новые дописываются; вся свертка
+    пересобирается, только если новые периоды легли внутрь нее, а не после конца.
+    """
+    if total is None:
+        return part.sort_index()
+    positions = total.index.get_indexer(part.index)
+    known = positions >= 0
+    if known.any():
+        rows, old, new = positions[known], total.iloc[positions[known]], part[known]
+        merged = {
+            'count': old['count'].to_numpy() + new['count'].to_numpy(),
+            'sum': old['sum'].to_numpy() + new['sum'].to_numpy(),
+            'min': np.minimum(old['min'].to_numpy(), new['min'].to_numpy()),
+            'max': np.maximum(old['max'].to_numpy(), new['max'].to_numpy()),
+        }
+        for column, values in merged.items():
+            total.iloc[rows, total.columns.get_loc(column)] = values
+    added = part[~known]
+    if len(added) == 0:
+        return total
+    added = added.sort_index()
+    combined = pd.concat([total, added])
+    return combined if added.index[0] > total.index[-1] else combined.sort_index()
+
+
+def lttb(x, y, threshold):
+    """Индексы точек ряда (x, y), отобранных Largest-Triangle-Three-Buckets.
+
+    Первая и последняя точки сохраняются, из каждой из остальных threshold - 2
+    корзин берется точка, образующая наибольший треугольник с уже выбранной
+    точкой и средним следующей корзины. Пики и провалы ряда сохраняются.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = int(i * every) + 1, int((i + 1) * every) + 1
+        next_stop = max(min(int((i + 2) * every) + 1, n), stop + 1)
+        avg_x, avg_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_buckets(y, buckets):
+    """Индексы минимума и максимума в каждой из buckets корзин (не больше 2 * buckets точек)"""
+    n = len(y)
+    if 2 * buckets >= n:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    selected = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        values = y[start:stop]
+        selected.extend(sorted({start + int(values.argmin()), start + int(values.argmax())}))
+    return np.array(selected, dtype=np.int64)
+
+
+DOWNSAMPLERS = {
+    'lttb': lambda x, y, points: lttb(x, y, points),
+    'minmax': lambda x, y, points: minmax_buckets(y, points // 2),
+}
+
+
+class TimeRollups:
+    """Иерархические временные свертки транзакций: час, день, неделя, месяц.
+
+    update() учитывает чанк: строки сворачиваются до часов, а почасовые
+    агрегаты (count, sum, min, max) - до остальных уровней, так что размер
+    работы зависит от чанка, а не от истории. series() отдает ряд для
+    графика с ограниченным числом точек при любом диапазоне дат.
+    """
+
+    def __init__(self):
+        self.levels = dict.fromkeys(LEVELS)
+        self.fingerprint = None
+
+    def update(self, chunk):
+        """Учет чанка транзакций (transaction_date, amount)"""
+        if len(chunk) == 0:
+            return self
+        dates = pd.to_datetime(chunk['transaction_date'])
+        frame = pd.DataFrame({'period': dates.dt.floor('h').to_numpy(),
+                              'amount': chunk['amount'].to_numpy(dtype=float)})
+        hours = frame.groupby('period').agg(count=('amount', 'size'), sum=('amount', 'sum'),
+                                            min=('amount', 'min'), max=('amount', 'max'))
+        return self.add_hourly(hours)
+
+    def add_hourly(self, hours):
+        """Учет почасовых агрегатов: индекс - начала часов, колонки count, sum, min, max"""
+        if len(hours) == 0:
+            return self
+        hours = hours[list(MEASURES)]
+        for level in LEVELS:
+            part = hours if level == 'hour' else hours.groupby(_period_start(hours.index, level)).agg(MEASURES)
+            self.levels[level] = _combine(self.levels[level], part)
+        return self
+
+    def merge(self, other):
+        """Объединение со свертками другой части данных"""
+        if other.levels['hour'] is not None:
+            self.add_hourly(other.levels['hour'])
+        return self
+
+    def rollup(self, level, start=None, end=None):
+        """Свертка уровня level за [start, end]: count, sum, min, max, mean по началам периодов"""
+        if level not in LEVELS:
+            raise ValueError(f"Уровень должен быть одним из: {', '.join(LEVELS)}")
+        frame = self.levels[level]
+        if frame is None:
+            return pd.DataFrame(columns=list(MEASURES) + ['mean'], index=pd.DatetimeIndex([], name='period'))
+        if start is not None or end is not None:
+            # Период попадает в диапазон, если пересекается с ним
+            first = _period_start(pd.DatetimeIndex([pd.Timestamp(start).floor('h')]), level)[0] \
+                if start is not None else None
+            frame = frame.loc[first:end]
+        frame = frame.copy()
+        frame['count'] = frame['count'].astype('int64')
+        frame['mean'] = frame['sum'] / frame['count']
+        frame.index.name = 'period'
+        return frame
+
+    def choose_level(self, start=None, end=None, max_points=MAX_POINTS):
+        """Самый мелкий уровень, ряд которого за [start, end] не длиннее max_points"""
+        for level in LEVELS:
+            if len(self.rollup(level, start, end)) <= max_points:
+                return level
+        return LEVELS[-1]
+
+    def series(self, start=None, end=None, max_points=MAX_POINTS, level=None, measure='sum', method='lttb'):
+        """Ряд для графика: (уровень, свертка), не больше max_points точек.
+
+        Уровень без явного level выбирается по диапазону; если и месячный ряд
+        длиннее max_points, он прореживается по measure методом method
+        ('lttb' или 'minmax').
+        """
+        level = level or self.choose_level(start, end, max_points)
+        frame = self.rollup(level, start, end)
+        if len(frame) > max_points:
+            x = frame.index.asi8.astype(float)
+            frame = frame.iloc[DOWNSAMPLERS[method](x, frame[measure].to_numpy(), max_points)]
+        return level, frame
+
+    def monthly_trends(self):
+        """Помесячные итоги в формате раздела месячных трендов"""
+        months = self.rollup('month')
+        return pd.DataFrame({
+            'month': months.index.strftime('%Y-%m'),
+            'transaction_count': months['count'].to_numpy(),
+            'monthly_volume': sqlite_round(months['sum'].to_numpy(dtype=float)),
+            'avg_monthly_transaction': sqlite_round(months['mean'].to_numpy(dtype=float)),
+        })
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
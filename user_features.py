@@ -0,0 +1,233 @@
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import sqlite_datetime_text, sqlite_round
+
+HOURS = 24
+_HOUR_COLUMNS = [f'hour_{h:02d}' for h in range(HOURS)]
+
+# Колонки, по которым top_users отдает топ-K по индексу, без полной сортировки
+TOP_K_INDEXES = {
+    'total_amount': 'idx_user_features_total',
+    'transaction_count': 'idx_user_features_count',
+}
+
+_SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS user_features (
+        user_id INTEGER PRIMARY KEY,
+        transaction_count INTEGER NOT NULL,
+        total_amount REAL NOT NULL,
+        amount_sumsq REAL NOT NULL,
+        min_amount REAL,
+        max_amount REAL,
+        distinct_categories INTEGER NOT NULL DEFAULT 0,
+        distinct_merchants INTEGER NOT NULL DEFAULT 0,
+        first_seen TEXT,
+        last_seen TEXT,
+        {', '.join(f'{c} INTEGER NOT NULL DEFAULT 0' for c in _HOUR_COLUMNS)}
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_categories (
+        user_id INTEGER, category TEXT, transaction_count INTEGER, total_amount REAL,
+        PRIMARY KEY (user_id, category)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS user_merchants (
+        user_id INTEGER, merchant TEXT, transaction_count INTEGER,
+        PRIMARY KEY (user_id, merchant)) WITHOUT ROWID""",
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    *(f'CREATE INDEX IF NOT EXISTS {name} ON user_features ({column} DESC)'
+      for column, name in TOP_K_INDEXES.items()),
+]
+
+_FEATURE_INSERT = f"""
+INSERT INTO user_features (user_id, transaction_count, total_amount, amount_sumsq, min_amount, max_amount,
+                           first_seen, last_seen, {', '.join(_HOUR_COLUMNS)})
+VALUES ({', '.join('?' * (8 + HOURS))})
+ON CONFLICT (user_id) DO UPDATE SET
+    transaction_count = transaction_count + excluded.transaction_count,
+    total_amount = total_amount + excluded.total_amount,
+    amount_sumsq = amount_sumsq + excluded.amount_sumsq,
+    min_amount = MIN(min_amount, excluded.min_amount),
+    max_amount = MAX(max_amount, excluded.max_amount),
+    first_seen = MIN(first_seen, excluded.first_seen),
+    last_seen = MAX(last_seen, excluded.last_seen),
+    {', '.join(f'{c} = {c} + excluded.{c}' for c in _HOUR_COLUMNS)}
+"""
+
+_CATEGORY_INSERT = """
+INSERT INTO user_categories (user_id, category, transaction_count, total_amount) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id, category) DO UPDATE SET
+    transaction_count = transaction_count + excluded.transaction_count,
+    total_amount = total_amount + excluded.total_amount
+"""
+
+_MERCHANT_INSERT = """
+INSERT INTO user_merchants (user_id, merchant, transaction_count) VALUES (?, ?, ?)
+ON CONFLICT (user_id, merchant) DO UPDATE SET
+    transaction_count = transaction_count + excluded.transaction_count
+"""
+
+_DISTINCT_UPDATE = """
+UPDATE user_features SET
+    distinct_categories = (SELECT COUNT(*) FROM user_categories c WHERE c.user_id = user_features.user_id),
+    distinct_merchants = (SELECT COUNT(*) FROM user_merchants m WHERE m.user_id = user_features.user_id)
+WHERE user_id IN (SELECT user_id FROM temp.touched_users)
+"""
+
+
+def _rows(frame):
+    """Строки кадра в виде питоновских значений для sqlite3"""
+    return frame.to_numpy(dtype=object).tolist()
+
+
+class UserFeatureStore:
+    """Персистентные признаки пользователей с инкрементальным обновлением (SQLite).
+
+    По каждому user_id хранятся число операций, сумма и сумма квадратов
+    (среднее и дисперсия), min/max, число различных категорий и мерчантов,
+    гистограмма активности по часам, первое и последнее появление.
+    update() добавляет чанк транзакций за время, пропорциональное его размеру;
+    profile() - поиск по первичному ключу, top_users() - по индексу.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self.conn.execute(statement)
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS touched_users (user_id INTEGER PRIMARY KEY)')
+        self.conn.commit()
+
+    def update(self, chunk):
+        """Учет чанка транзакций (user_id, amount, transaction_date; category и merchant - если есть)"""
+        if len(chunk) == 0:
+            return self
+        dates = pd.to_datetime(chunk['transaction_date'])
+        amount = chunk['amount'].to_numpy(dtype=float)
+        frame = pd.DataFrame({
+            'user_id': chunk['user_id'].to_numpy(dtype=np.int64),
+            'amount': amount,
+            'amount_sq': amount * amount,
+            'hour': dates.dt.hour.to_numpy(),
+            # Текст дат - как в таблице transactions: сравнения с ней и с границами срезов совпадают
+            'date': sqlite_datetime_text(dates).to_numpy(),
+        })
+
+        users = frame.groupby('user_id', sort=False).agg(
+            transaction_count=('amount', 'size'), total_amount=('amount', 'sum'),
+            amount_sumsq=('amount_sq', 'sum'), min_amount=('amount', 'min'), max_amount=('amount', 'max'),
+            first_seen=('date', 'min'), last_seen=('date', 'max'))
+        hours = frame.groupby(['user_id', 'hour']).size().unstack(fill_value=0)
+        hours = hours.reindex(index=users.index, columns=range(HOURS), fill_value=0)
+        features = pd.concat([users, hours.set_axis(_HOUR_COLUMNS, axis=1)], axis=1).reset_index()
+
+        with self._lock:
+            self.conn.executemany(_FEATURE_INSERT, _rows(features))
+            if 'category' in chunk.columns:
+                pairs = frame.assign(category=chunk['category'].astype(str).to_numpy())
+                pairs = pairs.groupby(['user_id', 'category']).agg(
+                    transaction_count=('amount', 'size'), total_amount=('amount', 'sum')).reset_index()
+                self.conn.executemany(_CATEGORY_INSERT, _rows(pairs))
+            if 'merchant' in chunk.columns:
+                pairs = frame.assign(merchant=chunk['merchant'].astype(str).to_numpy())
+                pairs = pairs.groupby(['user_id', 'merchant']).size().reset_index()
+                self.conn.executemany(_MERCHANT_INSERT, _rows(pairs))
+
+            # Число различных категорий и мерчантов пересчитывается только у затронутых пользователей
+            self.conn.execute('DELETE FROM temp.touched_users')
+            self.conn.executemany('INSERT INTO temp.touched_users VALUES (?)',
+                                  [(user_id,) for user_id in features['user_id'].tolist()])
+            self.conn.execute(_DISTINCT_UPDATE)
+            self.conn.commit()
+        return self
+
+    def profile(self, user_id):
+        """Профиль пользователя или None, если операций не было"""
+        with self._lock:
+            cursor = self.conn.execute('SELECT * FROM user_features WHERE user_id = ?', (int(user_id),))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            names = [d[0] for d in cursor.description]
+            categories = self.conn.execute(
+                'SELECT category, transaction_count, total_amount FROM user_categories WHERE user_id = ?',
+                (int(user_id),)).fetchall()
+            merchants = self.conn.execute(
+                'SELECT merchant, transaction_count FROM user_merchants WHERE user_id = ?',
+                (int(user_id),)).fetchall()
+
+        values = dict(zip(names, row))
+        count = values['transaction_count']
+        mean = values['total_amount'] / count
+        variance = (values['amount_sumsq'] - count * mean * mean) / (count - 1) if count > 1 else 0.0
+        return {
+            'user_id': values['user_id'],
+            'transaction_count': count,
+            'total_amount': sqlite_round(values['total_amount']),
+            'mean_amount': sqlite_round(mean),
+            'variance': max(variance, 0.0),
+            'std_amount': sqlite_round(max(variance, 0.0) ** 0.5),
+            'min_amount': values['min_amount'],
+            'max_amount': values['max_amount'],
+            'distinct_categories': values['distinct_categories'],
+            'distinct_merchants': values['distinct_merchants'],
+            'first_seen': values['first_seen'],
+            'last_seen': values['last_seen'],
+            'hour_histogram': [values[c] for c in _HOUR_COLUMNS],
+            'categories': {category: {'count': n, 'amount': sqlite_round(total)} for category, n, total in categories},
+            'merchants': dict(merchants),
+        }
+
+    def top_users(self, k=10, by='total_amount'):
+        """Топ-K пользователей по by (колонка из TOP_K_INDEXES) в формате раздела поведения пользователей"""
+        if by not in TOP_K_INDEXES:
+            raise ValueError(f"Топ-K доступен только по {', '.join(TOP_K_INDEXES)}")
+        query = f"""
+        SELECT user_id, transaction_count,
+               ROUND(total_amount, 2) as total_volume,
+               ROUND(total_amount / transaction_count, 2) as avg_transaction,
+               distinct_categories as unique_categories
+        FROM user_features INDEXED BY {TOP_K_INDEXES[by]}
+        ORDER BY {by} DESC
+        LIMIT ?
+        """
+        with self._lock:
+            return pd.read_sql_query(query, self.conn, params=(k,))
+
+    def frame(self):
+        """Признаки всех пользователей одним кадром"""
+        with self._lock:
+            df = pd.read_sql_query('SELECT * FROM user_features ORDER BY user_id', self.conn)
+        df['mean_amount'] = df['total_amount'] / df['transaction_count']
+        variance = (df['amount_sumsq'] - df['transaction_count'] * df['mean_amount'] ** 2) \
+            / (df['transaction_count'] - 1).where(df['transaction_count'] > 1)
+        df['std_amount'] = np.sqrt(variance.clip(lower=0)).fillna(0.0)
+        return df
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM user_features').fetchone()[0]
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            for table in ('user_features', 'user_categories', 'user_merchants', 'meta'):
+                self.conn.execute(f'DELETE FROM {table}')
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
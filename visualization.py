@@ -1,24 +1,78 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import numpy as np
 
-# Настройка стиля для профессиональных графиков
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
-plt.rcParams['figure.figsize'] = [12, 8]
+from aggregates import AggregateCube
+from instrumentation import NULL_TRACER
+from segments import Segment
+from storage import (DEFAULT_CHUNKSIZE, chunksize_for_memory, iter_transactions, memory_footprint,
+                     read_transactions, scan_plan, source_fingerprint)
+
+_style_applied = False
+
+
+def _pyplot():
+    """matplotlib.pyplot с настроенным стилем.
+
+    matplotlib и seaborn импортируются при первом обращении, а не при
+    импорте модуля: задачам без графиков они не нужны.
+    """
+    global _style_applied
+    import matplotlib.pyplot as plt
+    if not _style_applied:
+        import seaborn as sns
+        # Настройка стиля для профессиональных графиков
+        plt.style.use('seaborn-v0_8')
+        sns.set_palette("husl")
+        plt.rcParams['figure.figsize'] = [12, 8]
+        _style_applied = True
+    return plt
+
+# Длина ряда динамики, до которой точки рисуются маркерами
+MARKER_POINTS = 100
+
+LEVEL_TITLES = {'hour': 'ЧАСАМ', 'day': 'ДНЯМ', 'week': 'НЕДЕЛЯМ', 'month': 'МЕСЯЦАМ'}
 
 
 class BankDataVisualizer:
-    def __init__(self, csv_file='data/transactions.csv'):
-        self.df = pd.read_csv(csv_file)
-        self.df['transaction_date'] = pd.to_datetime(self.df['transaction_date'])
-        print("Данные загружены для визуализации")
+    def __init__(self, csv_file='data/transactions.csv', columns=None, filters=None,
+                 out_of_core=False, chunksize=DEFAULT_CHUNKSIZE, memory_limit_mb=None,
+                 cube_file=None, relative_accuracy=0.01, tracer=None):
+        # csv_file может быть и Parquet-датасетом или хранилищем memmap; columns/filters проталкиваются в чтение.
+        # Все графики строятся из AggregateCube; cube_file - где хранить его между запусками.
+        # tracer - instrumentation.Tracer для интервалов загрузки, куба и панелей
+        self.source = csv_file
+        self.columns = columns
+        self.filters = filters
+        self.out_of_core = out_of_core
+        self.chunksize = chunksize_for_memory(csv_file, memory_limit_mb) if memory_limit_mb else chunksize
+        self.cube_file = cube_file
+        self.relative_accuracy = relative_accuracy
+        self._cube = None
+        self._chart_data = None
+        self.panel_timings = {}
+        self.tracer = tracer or NULL_TRACER
+        # Отсечение партиций при построении куба среза (см. filtered)
+        self.scan_stats = None
+
+        if out_of_core:
+            # Данные не загружаются целиком: входы графиков считаются потоково по чанкам
+            self.df = None
+            print("Потоковый режим визуализации: данные читаются чанками")
+            return
+
+        with self.tracer.span('load.read', 'load', source=csv_file) as span:
+            self.df = read_transactions(csv_file, columns=columns, filters=filters)
+            span.set(rows=len(self.df))
 
         # Добавляем недостающие колонки если их нет
         self._add_missing_columns()
+        print(f"Данные загружены для визуализации: {len(self.df)} строк, "
+              f"{memory_footprint(self.df):.1f} МБ в памяти")
 
     def _add_missing_columns(self):
         """Добавляем недостающие колонки для визуализации"""
@@ -26,65 +80,251 @@ class BankDataVisualizer:
             # Создаем случайные локации
             cities = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань',
                       'Нижний Новгород', 'Челябинск', 'Самара', 'Омск', 'Ростов-на-Дону']
-            self.df['location'] = np.random.choice(cities, len(self.df))
+            self.df['location'] = pd.Categorical(np.random.choice(cities, len(self.df)), categories=cities)
             print("Добавлена колонка 'location'")
 
         if 'merchant' not in self.df.columns:
             # Создаем случайных мерчантов
             merchants = ['Amazon', 'OZON', 'Wildberries', 'McDonalds', 'KFC',
                          'Uber', 'Taxi', 'Metro', 'Pharmacy', 'Restaurant']
-            self.df['merchant'] = np.random.choice(merchants, len(self.df))
+            self.df['merchant'] = pd.Categorical(np.random.choice(merchants, len(self.df)), categories=merchants)
             print(" Добавлена колонка 'merchant'")
 
-    def create_comprehensive_dashboard(self):
-        """Создание комплексного дашборда"""
+    def _source_fingerprint(self):
+        return json.dumps([os.path.abspath(self.source), source_fingerprint(self.source),
+                           self.columns, self.filters, self.relative_accuracy], default=str)
+
+    def cube(self):
+        """Куб агрегатов для графиков: из cube_file, если он актуален, иначе за один проход"""
+        if self._cube is not None:
+            return self._cube
+        fingerprint = self._source_fingerprint()
+        if self.cube_file and os.path.exists(self.cube_file):
+            with self.tracer.span('cube.load', 'cube', path=self.cube_file):
+                cube = AggregateCube.load(self.cube_file)
+            if cube.fingerprint == fingerprint:
+                self._cube = cube
+                return cube
+
+        cube = AggregateCube(self.relative_accuracy)
+        with self.tracer.span('cube.build', 'cube') as span:
+            if self.out_of_core:
+                rows = 0
+                chunks = iter_transactions(self.source, self.columns, self.filters, self.chunksize)
+                for chunk in self.tracer.iterate(chunks, 'load.read_chunk'):
+                    with self.tracer.span('cube.update', 'cube', rows=len(chunk)):
+                        cube.update(chunk)
+                    rows += len(chunk)
+                span.set(rows=rows)
+            else:
+                cube.update(self.df)
+                span.set(rows=len(self.df))
+        cube.fingerprint = fingerprint
+        if self.cube_file:
+            with self.tracer.span('cube.save', 'cube', path=self.cube_file):
+                cube.save(self.cube_file)
+        self._cube = cube
+        return cube
+
+    def chart_data(self):
+        """Входные данные всех графиков, считаются один раз"""
+        if self._chart_data is None:
+            cube = self.cube()
+            with self.tracer.span('chart_data', 'cube'):
+                self._chart_data = cube.chart_data()
+        return self._chart_data
+
+    def filtered(self, start=None, end=None, categories=None, transaction_types=None, user_ids=None,
+                 locations=None, merchants=None):
+        """Визуализатор для среза данных (см. segments.Segment).
+
+        Срез по дате, категориям и типам считается из куба. Для пользователей,
+        городов и мерчантов, которых в кубе нет, строится куб среза: фильтры
+        проталкиваются в чтение, и Parquet-датасет читает только партиции-месяцы
+        из диапазона дат (статистика отсечения - в scan_stats визуализатора среза).
+        """
+        segment = Segment(start, end, user_ids, categories, locations, merchants, transaction_types)
+        if segment.cube_only:
+            cube = self.cube()
+            with self.tracer.span('chart_data', 'cube', filtered=True):
+                chart_data = cube.chart_data(start=start, end=end, categories=categories,
+                                             transaction_types=transaction_types)
+            return BankDataVisualizer.from_chart_data(chart_data, self.tracer)
+
+        cube = AggregateCube(self.relative_accuracy or 0.01)
+        scan_stats = None
+        with self.tracer.span('cube.build', 'cube', segment=segment.to_dict()) as span:
+            if self.df is not None:
+                cube.update(segment.apply(self.df))
+            else:
+                filters = (self.filters or []) + segment.filters()
+                plan = scan_plan(self.source, filters)
+                scan_stats = {key: plan[key] for key in ('partitions', 'scanned', 'pruned')}
+                span.set(**scan_stats)
+                chunks = iter_transactions(self.source, self.columns, filters, self.chunksize)
+                for chunk in self.tracer.iterate(chunks, 'load.read_chunk'):
+                    cube.update(chunk)
+        if cube.frame('cells') is None:
+            raise ValueError(f"В срез не попало ни одной транзакции: {segment.to_dict()}")
+        with self.tracer.span('chart_data', 'cube', filtered=True):
+            chart_data = cube.chart_data()
+        visualizer = BankDataVisualizer.from_chart_data(chart_data, self.tracer)
+        visualizer.scan_stats = scan_stats
+        return visualizer
+
+    def approximate(self, sample_file=None, capacity=None, per_stratum=None):
+        """Визуализатор по стратифицированной выборке (approximate.StratifiedSample).
+
+        Выборка берется из sample_file (если построена по тем же данным) или
+        строится за один проход и сохраняется туда. Счетчики и суммы графиков -
+        оценки по всей совокупности, динамика и топ пользователей рисуются с
+        доверительными интервалами. per_stratum - сколько строк каждой страты
+        использовать (по умолчанию все).
+        """
+        from approximate import DEFAULT_CAPACITY, StratifiedSample
+        capacity = capacity or DEFAULT_CAPACITY
+        fingerprint = self._source_fingerprint()
+        sample = None
+        if sample_file and os.path.exists(sample_file):
+            sample = StratifiedSample.load(sample_file)
+            if sample.fingerprint != fingerprint or sample.capacity != capacity:
+                sample = None
+        if sample is None:
+            sample = StratifiedSample(capacity=capacity)
+            with self.tracer.span('sample.build', 'cube') as span:
+                chunks = [self.df] if self.df is not None else \
+                    iter_transactions(self.source, self.columns, self.filters, self.chunksize)
+                for chunk in self.tracer.iterate(chunks, 'load.read_chunk'):
+                    sample.update(chunk)
+                span.set(sample_rows=len(sample))
+            sample.fingerprint = fingerprint
+            if sample_file:
+                sample.save(sample_file)
+        with self.tracer.span('chart_data', 'cube', approximate=True):
+            chart_data = sample.chart_data(per_stratum)
+        return BankDataVisualizer.from_chart_data(chart_data, self.tracer)
+
+    # Панели дашборда в порядке сетки 2x4
+    PANELS = (
+        '_plot_category_distribution',  # 1. Распределение транзакций по категориям
+        '_plot_amount_distribution',  # 2. Распределение сумм транзакций
+        '_plot_top_users',  # 3. Топ пользователи по объему операций
+        '_plot_temporal_trends',  # 4. Динамика транзакций по времени
+        '_plot_correlation_heatmap',  # 5. Heatmap корреляций
+        '_plot_suspicious_activity',  # 6. Подозрительные операции
+        '_plot_debit_vs_credit',  # 7. Сравнение дебет/кредит
+        '_plot_category_boxplot',  # 8. Boxplot сумм по категориям
+    )
+
+    @classmethod
+    def from_chart_data(cls, chart_data, tracer=None):
+        """Визуализатор поверх готовых входов графиков (без загрузки данных)"""
+        visualizer = cls.__new__(cls)
+        visualizer.source = None
+        visualizer.columns = None
+        visualizer.filters = None
+        visualizer.out_of_core = False
+        visualizer.chunksize = DEFAULT_CHUNKSIZE
+        visualizer.df = None
+        visualizer.cube_file = None
+        visualizer.relative_accuracy = None
+        visualizer._cube = None
+        visualizer._chart_data = chart_data
+        visualizer.panel_timings = {}
+        visualizer.scan_stats = None
+        visualizer.tracer = tracer or NULL_TRACER
+        return visualizer
+
+    def create_comprehensive_dashboard(self, output='data/banking_dashboard.png', show=True,
+                                       formats=None, dpi=300):
+        """Создание комплексного дашборда
+
+        show=False - headless-режим: окно не открывается, фигура закрывается
+        после сохранения. formats - расширения ('png', 'svg'), в которые
+        сохраняется output. Время отрисовки панелей - в panel_timings.
+        """
         print(" СОЗДАНИЕ ДАШБОРДА АНАЛИТИКИ...")
-
-        # Создаем сетку графиков (2x4 вместо 3x3)
-        fig = plt.figure(figsize=(20, 12))
-
-        # 1. Распределение транзакций по категориям
-        ax1 = plt.subplot(2, 4, 1)
-        self._plot_category_distribution(ax1)
-
-        # 2. Распределение сумм транзакций
-        ax2 = plt.subplot(2, 4, 2)
-        self._plot_amount_distribution(ax2)
-
-        # 3. Топ пользователи по объему операций
-        ax3 = plt.subplot(2, 4, 3)
-        self._plot_top_users(ax3)
-
-        # 4. Динамика транзакций по времени
-        ax4 = plt.subplot(2, 4, 4)
-        self._plot_temporal_trends(ax4)
-
-        # 5. Heatmap корреляций
-        ax5 = plt.subplot(2, 4, 5)
-        self._plot_correlation_heatmap(ax5)
-
-        # 6. Подозрительные операции
-        ax6 = plt.subplot(2, 4, 6)
-        self._plot_suspicious_activity(ax6)
-
-        # 7. Сравнение дебет/кредит
-        ax7 = plt.subplot(2, 4, 7)
-        self._plot_debit_vs_credit(ax7)
-
-        # 8. Boxplot сумм по категориям
-        ax8 = plt.subplot(2, 4, 8)
-        self._plot_category_boxplot(ax8)
-
-        plt.tight_layout(pad=3.0)
-        plt.savefig('data/banking_dashboard.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        plt = _pyplot()
+
+        with self.tracer.span('dashboard', 'chart', output=output):
+            # Входы всех панелей считаются до отрисовки и не попадают в их время
+            self.chart_data()
+
+            # Создаем сетку графиков (2x4 вместо 3x3)
+            fig = plt.figure(figsize=(20, 12))
+
+            self.panel_timings = {}
+            for position, panel in enumerate(self.PANELS, start=1):
+                ax = plt.subplot(2, 4, position)
+                with self.tracer.span(f'panel.{panel[len("_plot_"):]}', 'chart'):
+                    start = time.perf_counter()
+                    getattr(self, panel)(ax)
+                    self.panel_timings[panel] = time.perf_counter() - start
+
+            paths = _dashboard_paths(output, formats)
+            with self.tracer.span('savefig', 'chart', paths=paths, dpi=dpi):
+                start = time.perf_counter()
+                plt.tight_layout(pad=3.0)
+                for path in paths:
+                    plt.savefig(path, dpi=dpi, bbox_inches='tight')
+                self.panel_timings['savefig'] = time.perf_counter() - start
+
+        if show:
+            plt.show()
+        else:
+            plt.close(fig)
+        return paths
+
+    def save_panel(self, panel, output, dpi=100, figsize=(8, 6), format=None):
+        """Одна панель дашборда ('temporal_trends' или '_plot_temporal_trends') в файл или буфер output"""
+        name = panel if panel.startswith('_plot_') else f'_plot_{panel}'
+        if name not in self.PANELS:
+            raise KeyError(f"Неизвестный график: {panel}")
+        plt = _pyplot()
+        fig, ax = plt.subplots(figsize=figsize)
+        try:
+            with self.tracer.span(f'panel.{name[len("_plot_"):]}', 'chart'):
+                getattr(self, name)(ax)
+            fig.savefig(output, format=format, dpi=dpi, bbox_inches='tight')
+        finally:
+            plt.close(fig)
+        return output
+
+    def segment_chart_data(self, column='location'):
+        """Входы графиков для каждого значения column (например, по городам).
+
+        В потоковом режиме чанки источника раскладываются по кубам сегментов за один проход.
+        """
+        if self.df is not None:
+            chunks = [self.df]
+        elif self.source is not None:
+            chunks = self.tracer.iterate(iter_transactions(self.source, self.columns, self.filters, self.chunksize),
+                                         'load.read_chunk')
+        else:
+            raise ValueError("Визуализатор построен из готовых входов графиков: строк для сегментов нет")
+        cubes = {}
+        with self.tracer.span('cube.build', 'cube', segments=column) as span:
+            for chunk in chunks:
+                if column not in chunk.columns:
+                    raise ValueError(f"Колонки '{column}' нет в данных источника")
+                for segment, frame in chunk.groupby(column, observed=True):
+                    if str(segment) not in cubes:
+                        cubes[str(segment)] = AggregateCube(self.relative_accuracy)
+                    cubes[str(segment)].update(frame)
+            span.set(segments=len(cubes))
+        return {segment: cube.chart_data() for segment, cube in cubes.items()}
+
+    def render_segments(self, column='location', output_dir='data/dashboards', formats=('png',),
+                        workers=1, dpi=300):
+        """Пакетная headless-отрисовка дашбордов по сегментам column в пуле процессов"""
+        return render_dashboards(self.segment_chart_data(column), output_dir, formats, workers, dpi)
 
     def _plot_category_distribution(self, ax):
         """Распределение транзакций по категориям"""
-        category_stats = self.df['category'].value_counts()
+        category_stats = self.chart_data()['category_distribution']
 
-        colors = plt.cm.Set3(np.linspace(0, 1, len(category_stats)))
-        bars = ax.bar(category_stats.index, category_stats.values, color=colors)
+        colors = _pyplot().cm.Set3(np.linspace(0, 1, len(category_stats)))
+        bars = ax.bar(category_stats.index.astype(str), category_stats.values, color=colors)
 
         ax.set_title('РАСПРЕДЕЛЕНИЕ ПО КАТЕГОРИЯМ', fontsize=12, fontweight='bold')
         ax.set_ylabel('Количество транзакций')
@@ -98,14 +338,15 @@ class BankDataVisualizer:
 
     def _plot_amount_distribution(self, ax):
         """Распределение сумм транзакций"""
-        # Исключаем выбросы для лучшей визуализации
-        amounts = self.df[self.df['amount'] < self.df['amount'].quantile(0.95)]['amount']
+        # Гистограмма сумм ниже 95-го перцентиля (выбросы исключены)
+        data = self.chart_data()['amount_distribution']
+        edges = data['edges']
 
-        ax.hist(amounts, bins=30, alpha=0.7, color='skyblue', edgecolor='black')
-        ax.axvline(amounts.mean(), color='red', linestyle='--', linewidth=2,
-                   label=f'Среднее: {amounts.mean():.2f} руб')
-        ax.axvline(amounts.median(), color='green', linestyle='--', linewidth=2,
-                   label=f'Медиана: {amounts.median():.2f} руб')
+        ax.hist(edges[:-1], bins=edges, weights=data['counts'], alpha=0.7, color='skyblue', edgecolor='black')
+        ax.axvline(data['mean'], color='red', linestyle='--', linewidth=2,
+                   label=f'Среднее: {data["mean"]:.2f} руб')
+        ax.axvline(data['median'], color='green', linestyle='--', linewidth=2,
+                   label=f'Медиана: {data["median"]:.2f} руб')
 
         ax.set_title('РАСПРЕДЕЛЕНИЕ СУММ ТРАНЗАКЦИЙ', fontsize=12, fontweight='bold')
         ax.set_xlabel('Сумма (руб)')
@@ -115,16 +356,13 @@ class BankDataVisualizer:
 
     def _plot_top_users(self, ax):
         """Топ-10 пользователей по объему операций"""
-        user_stats = self.df.groupby('user_id').agg({
-            'amount': 'sum',
-            'transaction_id': 'count'
-        }).round(2)
-
-        user_stats.columns = ['total_amount', 'transaction_count']
-        top_users = user_stats.nlargest(10, 'total_amount')
+        top_users = self.chart_data()['top_users']
 
         y_pos = np.arange(len(top_users))
-        bars = ax.barh(y_pos, top_users['total_amount'], color='lightcoral')
+        # Приближенные данные (см. approximate) рисуются с доверительными интервалами
+        errors = self.chart_data().get('top_users_ci')
+        bars = ax.barh(y_pos, top_users['total_amount'], xerr=errors, capsize=3 if errors is not None else 0,
+                       color='lightcoral')
 
         ax.set_yticks(y_pos)
         ax.set_yticklabels([f'User {uid}' for uid in top_users.index], fontsize=8)
@@ -139,16 +377,19 @@ class BankDataVisualizer:
 
     def _plot_temporal_trends(self, ax):
         """Динамика транзакций по времени"""
-        self.df['date'] = self.df['transaction_date'].dt.date
-        daily_stats = self.df.groupby('date').agg({
-            'amount': 'sum',
-            'transaction_id': 'count'
-        }).reset_index()
-
-        ax.plot(daily_stats['date'], daily_stats['amount'],
-                marker='o', linewidth=2, markersize=3, color='purple', alpha=0.7)
-
-        ax.set_title('ДИНАМИКА ТРАНЗАКЦИЙ ПО ДНЯМ', fontsize=12, fontweight='bold')
+        chart_data = self.chart_data()
+        trend = chart_data['temporal_trends']
+        level = chart_data.get('temporal_level', 'day')
+
+        # Маркеры только на коротких рядах: на длинных они сливаются и замедляют отрисовку
+        marker = 'o' if len(trend) <= MARKER_POINTS else None
+        ax.plot(trend['date'], trend['amount'],
+                marker=marker, linewidth=2 if marker else 1, markersize=3, color='purple', alpha=0.7)
+        if 'temporal_ci' in chart_data:
+            ci = chart_data['temporal_ci']
+            ax.fill_between(trend['date'], trend['amount'] - ci, trend['amount'] + ci, color='purple', alpha=0.15)
+
+        ax.set_title(f'ДИНАМИКА ТРАНЗАКЦИЙ ПО {LEVEL_TITLES[level]}', fontsize=12, fontweight='bold')
         ax.set_xlabel('Дата')
         ax.set_ylabel('Сумма (руб)')
         ax.tick_params(axis='x', rotation=45)
@@ -157,14 +398,7 @@ class BankDataVisualizer:
     def _plot_correlation_heatmap(self, ax):
         """Тепловая карта корреляций"""
         try:
-            # Создаем числовые признаки для корреляции
-            numeric_df = self.df.copy()
-            numeric_df['is_debit'] = (numeric_df['transaction_type'] == 'debit').astype(int)
-            numeric_df['is_suspicious_num'] = numeric_df['is_suspicious'].astype(int)
-            numeric_df['hour'] = numeric_df['transaction_date'].dt.hour
-
-            correlation_data = numeric_df[['amount', 'is_debit', 'is_suspicious_num', 'hour', 'user_id']]
-            corr_matrix = correlation_data.corr()
+            corr_matrix = self.chart_data()['correlation']
 
             im = ax.imshow(corr_matrix, cmap='coolwarm', aspect='auto', vmin=-1, vmax=1)
 
@@ -187,18 +421,12 @@ class BankDataVisualizer:
 
     def _plot_suspicious_activity(self, ax):
         """Визуализация подозрительной активности"""
-        # Проверяем есть ли колонка is_suspicious
-        if 'is_suspicious' in self.df.columns:
-            suspicious = self.df[self.df['is_suspicious'] == True]
-        else:
-            # Создаем подозрительные операции на основе суммы
-            suspicious = self.df[self.df['amount'] > 30000]
-
-        if len(suspicious) > 0:
-            suspicious_by_category = suspicious['category'].value_counts()
+        # По флагу is_suspicious, а если его нет - по сумме > 30000
+        suspicious_by_category = self.chart_data()['suspicious_activity']
 
+        if len(suspicious_by_category) > 0:
             colors = ['red' if x > 0 else 'lightgray' for x in suspicious_by_category.values]
-            bars = ax.bar(suspicious_by_category.index, suspicious_by_category.values, color=colors)
+            bars = ax.bar(suspicious_by_category.index.astype(str), suspicious_by_category.values, color=colors)
 
             ax.set_title( 'ПОДОЗРИТЕЛЬНЫЕ ОПЕРАЦИИ', fontsize=12, fontweight='bold')
             ax.set_ylabel('Количество операций')
@@ -217,19 +445,17 @@ class BankDataVisualizer:
 
     def _plot_debit_vs_credit(self, ax):
         """Сравнение дебетовых и кредитовых операций"""
-        type_stats = self.df.groupby('transaction_type').agg({
-            'amount': ['sum', 'count', 'mean']
-        }).round(2)
+        type_stats = self.chart_data()['debit_vs_credit']
 
-        types = type_stats.index
-        sums = type_stats[('amount', 'sum')]
-        counts = type_stats[('amount', 'count')]
+        types = type_stats.index.astype(str)
+        sums = type_stats['sum']
+        counts = type_stats['count']
 
         x = np.arange(len(types))
         width = 0.35
 
-        bars1 = ax.bar(x - width / 2, sums, width, label='Общая сумма', color=['red', 'green'])
-        bars2 = ax.bar(x + width / 2, counts, width, label='Количество', color=['lightcoral', 'lightgreen'])
+        bars1 = ax.bar(x - width / 2, sums, width, label='Общая сумма', color=['red', 'green'][:len(types)])
+        bars2 = ax.bar(x + width / 2, counts, width, label='Количество', color=['lightcoral', 'lightgreen'][:len(types)])
 
         ax.set_xlabel('Тип операции')
         ax.set_ylabel('Значения')
@@ -242,10 +468,13 @@ class BankDataVisualizer:
     def _plot_category_boxplot(self, ax):
         """Boxplot сумм по категориям"""
         try:
-            # Исключаем выбросы для лучшей визуализации
-            filtered_df = self.df[self.df['amount'] < self.df['amount'].quantile(0.95)]
+            # Статистики по суммам ниже 95-го перцентиля (выбросы исключены)
+            boxes = self.chart_data()['category_boxplot']
 
-            sns.boxplot(data=filtered_df, x='category', y='amount', ax=ax)
+            import seaborn as sns
+            artists = ax.bxp(boxes, patch_artist=True, showfliers=True)
+            for patch, color in zip(artists['boxes'], sns.color_palette(n_colors=len(boxes))):
+                patch.set_facecolor(color)
             ax.set_title('РАСПРЕДЕЛЕНИЕ СУММ ПО КАТЕГОРИЯМ', fontsize=12, fontweight='bold')
             ax.set_xlabel('Категория')
             ax.set_ylabel('Сумма (руб)')
@@ -257,22 +486,24 @@ class BankDataVisualizer:
 
     def create_simple_report(self):
         print(" СОЗДАНИЕ УПРОЩЕННОГО ОТЧЕТА...")
+        data = self.chart_data()['simple_report']
+        plt = _pyplot()
 
         fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
 
         # 1. Категории
-        category_stats = self.df['category'].value_counts()
-        ax1.pie(category_stats.values, labels=category_stats.index, autopct='%1.1f%%')
+        category_stats = data['categories']
+        ax1.pie(category_stats.values, labels=category_stats.index.astype(str), autopct='%1.1f%%')
         ax1.set_title('Распределение по категориям')
 
         # 2. Типы операций
-        type_stats = self.df['transaction_type'].value_counts()
-        ax2.bar(type_stats.index, type_stats.values, color=['red', 'green'])
+        type_stats = data['types']
+        ax2.bar(type_stats.index.astype(str), type_stats.values, color=['red', 'green'][:len(type_stats)])
         ax2.set_title('Типы операций')
         ax2.set_ylabel('Количество')
 
         # 3. Топ пользователи
-        user_stats = self.df.groupby('user_id')['amount'].sum().nlargest(5)
+        user_stats = data['top_users']
         ax3.bar(range(len(user_stats)), user_stats.values, color='orange')
         ax3.set_title('Топ-5 пользователей по объему')
         ax3.set_ylabel('Сумма (руб)')
@@ -280,7 +511,9 @@ class BankDataVisualizer:
         ax3.set_xticklabels([f'User {uid}' for uid in user_stats.index])
 
         # 4. Распределение сумм
-        ax4.hist(self.df['amount'], bins=50, alpha=0.7, color='purple', edgecolor='black')
+        edges = data['amounts']['edges']
+        ax4.hist(edges[:-1], bins=edges, weights=data['amounts']['counts'],
+                 alpha=0.7, color='purple', edgecolor='black')
         ax4.set_title('Распределение сумм транзакций')
         ax4.set_xlabel('Сумма (руб)')
         ax4.set_ylabel('Частота')
@@ -290,6 +523,54 @@ class BankDataVisualizer:
         plt.show()
 
 
+def _dashboard_paths(output, formats):
+    if not formats:
+        return [output]
+    stem = os.path.splitext(output)[0]
+    return [f'{stem}.{fmt}' for fmt in formats]
+
+
+def _render_dashboard_task(task):
+    """Отрисовка одного дашборда в процессе пула (без окна)"""
+    name, job, output, formats, dpi = task
+    _pyplot().switch_backend('Agg')
+    if isinstance(job, str):
+        # Путь к набору данных: входы графиков считаются в самом процессе
+        visualizer = BankDataVisualizer(job)
+    else:
+        visualizer = BankDataVisualizer.from_chart_data(job)
+    paths = visualizer.create_comprehensive_dashboard(output, show=False, formats=formats, dpi=dpi)
+    return name, paths, visualizer.panel_timings
+
+
+def render_dashboards(jobs, output_dir='data/dashboards', formats=('png',), workers=1, dpi=300):
+    """Пакетная headless-отрисовка дашбордов.
+
+    jobs - {имя: входы графиков (chart_data) или путь к набору данных}.
+    Возвращает {имя: (пути файлов, время панелей)} и печатает суммарное
+    время по панелям, чтобы было видно самый медленный _plot_*.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(name, job, os.path.join(output_dir, f'dashboard_{name}.png'), formats, dpi)
+             for name, job in jobs.items()]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render_dashboard_task, tasks))
+    else:
+        results = [_render_dashboard_task(task) for task in tasks]
+
+    totals = {}
+    for _, _, timings in results:
+        for panel, seconds in timings.items():
+            totals[panel] = totals.get(panel, 0.0) + seconds
+    print(" Время отрисовки по панелям, с:")
+    for panel, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"   {panel}: {seconds:.3f}")
+
+    return {name: (paths, timings) for name, paths, timings in results}
+
+
 # Запуск визуализации
 if __name__ == "__main__":
     print("ЗАПУСК ВИЗУАЛИЗАЦИИ ДАННЫХ...")